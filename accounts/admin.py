@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DefaultUserAdmin
-from .models import User, UserProfile
+from .models import EmailDelivery, User, UserProfile
 
 @admin.register(User)
 class UserAdmin(DefaultUserAdmin):
@@ -15,4 +15,11 @@ class UserAdmin(DefaultUserAdmin):
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'first_name', 'last_name', 'notifications')
-    search_fields = ('user__username', 'user__email')
\ No newline at end of file
+    search_fields = ('user__username', 'user__email')
+
+
+@admin.register(EmailDelivery)
+class EmailDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('email', 'template', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'template')
+    search_fields = ('email',)
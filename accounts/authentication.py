@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# Seconds a user record may be served from this process's memory. Kept short
+# because other processes cannot invalidate it.
+LOCAL_TTL = getattr(settings, 'AUTH_USER_LOCAL_CACHE_TTL', 5)
+# Seconds a user record may be served from the shared Django cache, which is
+# invalidated whenever a User is saved or deleted.
+SHARED_TTL = getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+LOCAL_MAX_ENTRIES = getattr(settings, 'AUTH_USER_LOCAL_CACHE_SIZE', 10000)
+
+_local_users = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def _cached_field_names():
+    # The password hash is deliberately left out of the cache; it is loaded
+    # lazily from the database if anything ever asks for it.
+    return [f.attname for f in get_user_model()._meta.concrete_fields if f.attname != 'password']
+
+
+def _cache_key(user_id):
+    return f'accounts:auth-user:{user_id}'
+
+
+def _local_get(user_id, now):
+    with _local_lock:
+        entry = _local_users.get(user_id)
+        if entry is not None and entry[0] > now:
+            _local_users.move_to_end(user_id)
+            return entry[1]
+    return None
+
+
+def _local_set(user_id, values, now):
+    with _local_lock:
+        _local_users[user_id] = (now + LOCAL_TTL, values)
+        _local_users.move_to_end(user_id)
+        while len(_local_users) > LOCAL_MAX_ENTRIES:
+            _local_users.popitem(last=False)
+
+
+def get_cached_user(user_id):
+    """
+    Return the user with ``USER_ID_FIELD == user_id``, or None.
+
+    Looks in process memory, then the shared cache, then the database. A new
+    model instance is built for every call so per-request state (such as a
+    cached ``user.profile``) never leaks between requests.
+    """
+    User = get_user_model()
+    field_names = _cached_field_names()
+    now = time.monotonic()
+
+    values = _local_get(user_id, now)
+    if values is None:
+        values = cache.get(_cache_key(user_id))
+        if values is None:
+            values = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values_list(*field_names).first()
+            if values is None:
+                return None
+            cache.set(_cache_key(user_id), values, SHARED_TTL)
+        _local_set(user_id, values, now)
+
+    return User.from_db('default', field_names, values)
+
+
+async def aget_cached_user(user_id):
+    """get_cached_user() for async views, through the async cache and ORM APIs."""
+    User = get_user_model()
+    field_names = _cached_field_names()
+    now = time.monotonic()
+
+    values = _local_get(user_id, now)
+    if values is None:
+        values = await cache.aget(_cache_key(user_id))
+        if values is None:
+            values = await User.objects.filter(
+                **{api_settings.USER_ID_FIELD: user_id}).values_list(*field_names).afirst()
+            if values is None:
+                return None
+            await cache.aset(_cache_key(user_id), values, SHARED_TTL)
+        _local_set(user_id, values, now)
+
+    return User.from_db('default', field_names, values)
+
+
+def invalidate_cached_user(user):
+    """Drop ``user`` from both cache tiers of this process and the shared cache."""
+    user_id = getattr(user, api_settings.USER_ID_FIELD)
+    # Token claims may carry the id as a string or an int; clear both.
+    for key in {user_id, str(user_id)}:
+        with _local_lock:
+            _local_users.pop(key, None)
+        cache.delete(_cache_key(key))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user through a short-lived
+    two-tier cache instead of loading the User row on every request.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Revocation compares the password hash, which is never cached.
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        return user
+
+
+async def authenticate_async(request):
+    """
+    Resolve the request's bearer token the way CachedJWTAuthentication does,
+    for async views outside DRF. Returns None when no token is sent; raises
+    the same AuthenticationFailed/InvalidToken errors for a bad one.
+    """
+    authenticator = CachedJWTAuthentication()
+    header = authenticator.get_header(request)
+    raw_token = header and authenticator.get_raw_token(header)
+    if raw_token is None:
+        return None
+    validated_token = authenticator.get_validated_token(raw_token)
+    if api_settings.CHECK_REVOKE_TOKEN:
+        return await sync_to_async(authenticator.get_user)(validated_token)
+
+    try:
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_('Token contained no recognizable user identification'))
+
+    user = await aget_cached_user(user_id)
+    if user is None:
+        raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+    if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+    return user
@@ -0,0 +1,49 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.provisioning import DEFAULT_BATCH_SIZE, parse_rows, provision_users
+
+
+class Command(BaseCommand):
+    help = 'Bulk-create pupil accounts from a CSV or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON file of users, or - for stdin')
+        parser.add_argument('--format', choices=['csv', 'json'], help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=None, help='Password hashing processes (default: CPU count)')
+        parser.add_argument('--tokens', action='store_true', help='Issue one-time login tokens')
+        parser.add_argument('--output', help='Write created users and errors as JSON lines to this file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('json' if path.lower().endswith('.json') else 'csv')
+        try:
+            if path == '-':
+                data = sys.stdin.read()
+            else:
+                with open(path, encoding='utf-8-sig') as f:
+                    data = f.read()
+            rows = parse_rows(data, fmt)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {path}: {e}')
+
+        output = open(options['output'], 'w') if options['output'] else None
+        try:
+            for event in provision_users(rows, batch_size=options['batch_size'], workers=options['workers'],
+                                         issue_tokens=options['tokens']):
+                if event['event'] == 'progress':
+                    self.stdout.write(f"Processed {event['processed']}/{event['total']}")
+                elif event['event'] == 'error':
+                    self.stderr.write(f"Row {event['row']}: {event['errors']}")
+                elif event['event'] == 'done':
+                    self.stdout.write(self.style.SUCCESS(
+                        f"Created {event['created']} users, {event['failed']} rows failed"
+                    ))
+                if output and event['event'] in ('created', 'error'):
+                    output.write(json.dumps(event) + '\n')
+        finally:
+            if output:
+                output.close()
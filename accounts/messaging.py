@@ -0,0 +1,233 @@
+"""
+Outgoing SMS and email.
+
+Each SMS provider in ``settings.SMS_GATEWAYS`` gets one ``SMSGateway`` per
+process holding a pooled ``requests.Session`` (so TCP and TLS are set up once),
+a rate limiter and retry with exponential backoff. Messages with the same body
+are sent to many recipients in a single gateway call. ``EmailDispatcher``
+does the same for mail: one SMTP connection reused across messages.
+"""
+import logging
+import smtplib
+import threading
+import time
+import uuid
+
+import requests
+from django.conf import settings
+from django.core import mail
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+GATEWAY_DEFAULTS = {
+    'URL': '',
+    'AUTH_TOKEN': '',
+    'SENDER_MASK': '',
+    'BATCH_SIZE': 100,      # recipients per gateway call
+    'RATE_LIMIT': 10,       # gateway calls per second
+    'TIMEOUT': 10,          # seconds
+    'MAX_RETRIES': 3,
+    'BACKOFF': 0.5,         # seconds, doubled on every retry
+    'POOL_SIZE': 10,        # pooled connections per host
+}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DISCONNECTED = (smtplib.SMTPServerDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class MessagingError(Exception):
+    pass
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` acquisitions per second with bursts of up to ``burst``."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class SMSGateway:
+    def __init__(self, name, config):
+        self.name = name
+        self.config = {**GATEWAY_DEFAULTS, **config}
+        self.limiter = RateLimiter(self.config['RATE_LIMIT'])
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.config['POOL_SIZE'])
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'Authorization': self.config['AUTH_TOKEN'],
+        })
+
+    def post(self, payload):
+        """POST one payload, retrying connection errors, 429 and 5xx with exponential backoff."""
+        retries = self.config['MAX_RETRIES']
+        for attempt in range(retries + 1):
+            self.limiter.acquire()
+            delay = self.config['BACKOFF'] * 2 ** attempt
+            try:
+                response = self.session.post(self.config['URL'], json=payload, timeout=self.config['TIMEOUT'])
+            except requests.RequestException as e:
+                error = e
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    if response.status_code >= 400:
+                        raise MessagingError(f'{self.name} rejected message: HTTP {response.status_code} {response.text[:200]}')
+                    return response.json() if response.content else {}
+                error = f'HTTP {response.status_code}'
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+            if attempt < retries:
+                logger.warning('%s gateway call failed (%s), retrying in %.1fs', self.name, error, delay)
+                time.sleep(delay)
+        raise MessagingError(f'{self.name} gateway call failed after {retries + 1} attempts: {error}')
+
+    def send(self, recipients, body, priority='high'):
+        """Send ``body`` to ``recipients`` in as few gateway calls as BATCH_SIZE allows."""
+        results = []
+        batch_size = self.config['BATCH_SIZE']
+        for start in range(0, len(recipients), batch_size):
+            results.append(self.post({
+                # The id lets the gateway drop duplicates when a retried call did get through.
+                'id': uuid.uuid4().hex,
+                'to': list(recipients[start:start + batch_size]),
+                'sender_mask': self.config['SENDER_MASK'],
+                'body': body,
+                'priority': priority,
+            }))
+        return results
+
+    def send_many(self, messages):
+        """Send ``(phone, body)`` pairs, sharing one gateway call per distinct body."""
+        by_body = {}
+        for phone, body in messages:
+            by_body.setdefault(body, []).append(phone)
+        return [result for body, phones in by_body.items() for result in self.send(phones, body)]
+
+    def close(self):
+        self.session.close()
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_sms_gateway(name=None):
+    """The process-wide gateway for provider ``name`` (default: SMS_DEFAULT_GATEWAY)."""
+    name = name or settings.SMS_DEFAULT_GATEWAY
+    with _gateways_lock:
+        if name not in _gateways:
+            _gateways[name] = SMSGateway(name, settings.SMS_GATEWAYS[name])
+        return _gateways[name]
+
+
+class EmailDispatcher:
+    """
+    Sends EmailMessages over one reused backend connection, in rate-limited
+    chunks, and reconnects once per chunk if the server dropped the
+    connection, resending only the messages that weren't sent.
+    """
+
+    def __init__(self, chunk_size=100, rate_limit=0):
+        self.chunk_size = chunk_size
+        self.limiter = RateLimiter(rate_limit)
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def _open(self):
+        if self.connection is None:
+            self.connection = mail.get_connection(fail_silently=False)
+            self.connection.open()
+        return self.connection
+
+    def _discard(self):
+        """Close a dropped connection; its socket may already be dead, so errors are ignored."""
+        connection, self.connection = self.connection, None
+        if connection is not None:
+            try:
+                connection.close()
+            except (smtplib.SMTPException, OSError):
+                pass
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                try:
+                    self.connection.close()
+                finally:
+                    self.connection = None
+
+    def send_messages(self, messages):
+        sent = 0
+        with self.lock:
+            for start in range(0, len(messages), self.chunk_size):
+                chunk = messages[start:start + self.chunk_size]
+                self.limiter.acquire()
+                # One message per call, so after a drop only the unsent ones are sent again
+                done = 0
+                try:
+                    for message in chunk:
+                        sent += self._open().send_messages([message]) or 0
+                        done += 1
+                except DISCONNECTED:
+                    # Stale pooled connection: reconnect once and send the rest of this chunk.
+                    self._discard()
+                    for message in chunk[done:]:
+                        sent += self._open().send_messages([message]) or 0
+        return sent
+
+    def send_each(self, messages):
+        """
+        Send messages one at a time over the shared connection so each gets its
+        own outcome. Returns an error string per message, None when it was sent.
+        """
+        errors = []
+        with self.lock:
+            for message in messages:
+                self.limiter.acquire()
+                try:
+                    try:
+                        sent = self._open().send_messages([message])
+                    except DISCONNECTED:
+                        self._discard()
+                        sent = self._open().send_messages([message])
+                except (smtplib.SMTPException, OSError) as e:
+                    if isinstance(e, DISCONNECTED):
+                        self._discard()
+                    errors.append(f'{type(e).__name__}: {e}')
+                else:
+                    errors.append(None if sent else 'Not sent: no valid recipients')
+        return errors
+
+
+_email_dispatcher = None
+_email_dispatcher_lock = threading.Lock()
+
+
+def get_email_dispatcher():
+    global _email_dispatcher
+    with _email_dispatcher_lock:
+        if _email_dispatcher is None:
+            _email_dispatcher = EmailDispatcher(
+                chunk_size=getattr(settings, 'EMAIL_BATCH_SIZE', 100),
+                rate_limit=getattr(settings, 'EMAIL_RATE_LIMIT', 0),
+            )
+        return _email_dispatcher
@@ -1,9 +1,12 @@
 # Generated by Django 5.1.1 on 2024-10-14 06:25
 
-from django.db import migrations, models
+from django.db import migrations
 
 
 class Migration(migrations.Migration):
+    # 0002_initial already adds UserProfile.badges and 0003 renames its
+    # related_name, so applying this AddField again made fresh databases fail
+    # with "table accounts_userprofile_badges already exists".
 
     dependencies = [
         ('accounts', '0001_initial'),
@@ -11,9 +14,4 @@ class Migration(migrations.Migration):
     ]
 
     operations = [
-        migrations.AddField(
-            model_name='userprofile',
-            name='badges',
-            field=models.ManyToManyField(blank=True, related_name='user_badges', to='game.badge'),
-        ),
     ]
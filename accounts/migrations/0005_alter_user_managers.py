@@ -0,0 +1,20 @@
+# Generated by Django 5.1.1 on 2026-10-19 18:24
+
+import accounts.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_merge_20241028_0709'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', accounts.models.AccountUserManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+def generate_thumbnails(apps, schema_editor):
+    # The thumbnail specs are generated when a photo is saved (the Optimistic
+    # strategy) and never when their URL is read, so photos uploaded before
+    # that need theirs generated once. Files that fail are reported and
+    # skipped; rerun "manage.py generateimages accounts:userprofile" for them.
+    call_command('generateimages', 'accounts:userprofile')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_emaildelivery'),
+    ]
+
+    operations = [
+        migrations.RunPython(generate_thumbnails, migrations.RunPython.noop, elidable=True),
+    ]
@@ -1,9 +1,9 @@
 import datetime
-from django.db import models
+from django.db import models, transaction
 from datetime import date
 from django.contrib.auth.models import AbstractUser, UserManager, Group, Permission
 from django.core.validators import RegexValidator
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 from sorl.thumbnail import ImageField
@@ -13,6 +13,35 @@ from imagekit.processors import ResizeToFill
 from game.models import Badge  # Ensure this import is correct based on your project structure
 
 
+class AccountUserManager(UserManager):
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        bulk_create() skips post_save, so create the matching profiles here to
+        keep the one-profile-per-user guarantee for bulk user creation paths.
+        A profile assigned to an unsaved user (``user.profile = UserProfile(...)``)
+        is inserted as given.
+        """
+        objs = list(objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            users = super().bulk_create(objs, *args, **kwargs)
+            profile_rel = User.profile.related
+            profiles = []
+            for user in users:
+                if user.pk is None:
+                    continue
+                profile = profile_rel.get_cached_value(user) if profile_rel.is_cached(user) else UserProfile()
+                profile.user = user
+                profiles.append(profile)
+            # Only tolerate existing profiles when the caller tolerates existing
+            # users; otherwise keep conflicts loud and get the new profile ids back.
+            UserProfile.objects.using(self.db).bulk_create(
+                profiles,
+                batch_size=kwargs.get('batch_size'),
+                ignore_conflicts=bool(kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts')),
+            )
+        return users
+
+
 class User(AbstractUser):
     email = models.EmailField(unique=True)
     phone_regex = RegexValidator(
@@ -29,7 +58,7 @@ class User(AbstractUser):
     )
     
     REQUIRED_FIELDS = ['email', 'phone']
-    objects = UserManager()
+    objects = AccountUserManager()
     
     # Define related_name to avoid clashes
     groups = models.ManyToManyField(
@@ -59,13 +88,19 @@ class UserProfile(models.Model):
         source='entry_thumbnail',
         processors=[ResizeToFill(160, 160)],
         format='JPEG',
-        options={'quality': 60}
+        options={'quality': 60},
+        # Generated when the photo is uploaded, so reading .url never renders;
+        # backfill with "manage.py generateimages accounts:userprofile"
+        cachefile_strategy='imagekit.cachefiles.strategies.Optimistic',
     )
     post_thumb = ImageSpecField(
         source='entry_thumbnail',
         processors=[ResizeToFill(200, 200)],
         format='JPEG',
-        options={'quality': 60}
+        options={'quality': 60},
+        # Generated when the photo is uploaded, so reading .url never renders;
+        # backfill with "manage.py generateimages accounts:userprofile"
+        cachefile_strategy='imagekit.cachefiles.strategies.Optimistic',
     )
     high_scores = models.JSONField(default=dict)
     badges = models.ManyToManyField(Badge, blank=True, related_name="user_badges")  # Corrected 'user_adges' to 'user_badges'
@@ -73,9 +108,44 @@ class UserProfile(models.Model):
     def __str__(self):  # __unicode__ for Python 2
         return self.user.username
 
-# Signals to create or update UserProfile automatically
+class EmailDelivery(models.Model):
+    """One templated email queued for sending, with its delivery status."""
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='email_deliveries')
+    email = models.EmailField()
+    template = models.CharField(max_length=200)
+    context = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.template} to {self.email} ({self.status})"
+
+
+# Signal to create the UserProfile when a User is created. Later saves (logins
+# updating last_login, admin edits) leave the profile alone.
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
-    if created:
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
         UserProfile.objects.create(user=instance)
-    instance.profile.save()
+
+
+# Keep CachedJWTAuthentication from serving stale or deactivated users
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_auth_user(sender, instance, **kwargs):
+    from .authentication import invalidate_cached_user
+    invalidate_cached_user(instance)
@@ -0,0 +1,220 @@
+"""
+Bulk provisioning of classroom accounts from CSV or JSON.
+
+``provision_users()`` validates every row, hashes the supplied passwords in a
+process pool and inserts users and profiles with ``bulk_create`` in batches.
+It is a generator of progress events so the API view can stream them and the
+management command can print them as they happen.
+"""
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .models import User, UserProfile
+from .token_generators import one_time_login_token_generator
+
+FIELDS = ('username', 'email', 'phone', 'password', 'first_name', 'last_name')
+DEFAULT_BATCH_SIZE = 500
+# Below this many passwords a process pool costs more to start than it saves.
+POOL_THRESHOLD = 32
+
+
+def parse_rows(data, fmt):
+    """Parse CSV text or a JSON list (optionally wrapped as ``{"users": [...]}``) into row dicts."""
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(data))
+        return [{k.strip().lower(): (v or '').strip() for k, v in row.items() if k} for row in reader]
+    if fmt == 'json':
+        rows = json.loads(data) if isinstance(data, (str, bytes)) else data
+        if isinstance(rows, dict):
+            rows = rows.get('users', [])
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError('Expected a list of user objects.')
+        return rows
+    raise ValueError(f'Unsupported format: {fmt}')
+
+
+class PasswordHasher:
+    """
+    Hashes passwords with the configured hasher, spreading large batches over
+    a process pool that is started on first use and reused across batches.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.pool = None
+
+    def hash(self, passwords):
+        if self.workers <= 1 or len(passwords) < POOL_THRESHOLD:
+            return [make_password(p) for p in passwords]
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self.pool.map(make_password, passwords, chunksize=chunksize))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+def login_token(user):
+    """One-time token a provisioned user can exchange for JWTs at /api/accounts/token-login/."""
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    return f'{uid}.{one_time_login_token_generator.make_token(user)}'
+
+
+def build_user(values):
+    """Unsaved User for a cleaned row, with its UserProfile attached for bulk_create."""
+    user = User(
+        username=values['username'],
+        email=values['email'],
+        phone=values['phone'] or None,
+        first_name=values['first_name'],
+        last_name=values['last_name'],
+    )
+    user.profile = UserProfile(first_name=values['first_name'] or None, last_name=values['last_name'] or None)
+    return user
+
+
+def clean_row(row):
+    """Normalise one input row and return ``(values, user, errors)``."""
+    values = {field: str(row.get(field) or '').strip() for field in FIELDS}
+    values['email'] = values['email'].lower()
+    errors = {}
+    for required in ('username', 'email'):
+        if not values[required]:
+            errors[required] = ['This field is required.']
+
+    user = build_user(values)
+    checks = (
+        (user, ['password', *errors]),
+        (user.profile, [f.name for f in UserProfile._meta.fields if f.name not in ('first_name', 'last_name')]),
+    )
+    for instance, exclude in checks:
+        try:
+            instance.clean_fields(exclude=exclude)
+        except ValidationError as e:
+            for field, messages in e.message_dict.items():
+                errors.setdefault(field, []).extend(m for m in messages if m not in errors.get(field, []))
+    return values, user, errors
+
+
+def existing_conflicts(rows):
+    """Return the usernames, emails and phones in ``rows`` that are already taken, with one query."""
+    usernames = {row['username'] for row in rows}
+    emails = {row['email'] for row in rows}
+    phones = {row['phone'] for row in rows if row['phone']}
+    taken = User.objects.filter(
+        Q(username__in=usernames) | Q(email__in=emails) | Q(phone__in=phones)
+    ).values_list('username', 'email', 'phone')
+    taken_usernames, taken_emails, taken_phones = set(), set(), set()
+    for username, email, phone in taken:
+        taken_usernames.add(username)
+        taken_emails.add(email)
+        taken_phones.add(phone)
+    return taken_usernames, taken_emails, taken_phones
+
+
+def provision_users(rows, batch_size=DEFAULT_BATCH_SIZE, workers=None, issue_tokens=False):
+    """
+    Create users for ``rows`` and yield progress events:
+
+    * ``{"event": "error", "row": n, "errors": {...}}`` for each rejected row
+    * ``{"event": "created", "row": n, "id": ..., "username": ...}`` for each new
+      user, with a ``login_token`` when ``issue_tokens`` is set
+    * ``{"event": "progress", "processed": n, "total": N}`` after each batch
+    * ``{"event": "done", "created": n, "failed": n, "total": N}`` at the end
+
+    Rows are numbered from 1 in input order.
+    """
+    hasher = PasswordHasher(workers)
+    try:
+        yield from _provision_batches(rows, batch_size, hasher, issue_tokens)
+    finally:
+        hasher.close()
+
+
+def _provision_batches(rows, batch_size, hasher, issue_tokens):
+    total = len(rows)
+    created = failed = 0
+    seen_usernames, seen_emails, seen_phones = set(), set(), set()
+
+    for batch_start in range(0, total, batch_size):
+        batch = []
+        for row_number, row in enumerate(rows[batch_start:batch_start + batch_size], start=batch_start + 1):
+            values, user, errors = clean_row(row)
+            # Duplicates inside the upload itself
+            if values['username'] in seen_usernames:
+                errors.setdefault('username', []).append('Duplicate username in upload.')
+            if values['email'] in seen_emails:
+                errors.setdefault('email', []).append('Duplicate email in upload.')
+            if values['phone'] and values['phone'] in seen_phones:
+                errors.setdefault('phone', []).append('Duplicate phone in upload.')
+            seen_usernames.add(values['username'])
+            seen_emails.add(values['email'])
+            if values['phone']:
+                seen_phones.add(values['phone'])
+            if errors:
+                failed += 1
+                yield {'event': 'error', 'row': row_number, 'errors': errors}
+            else:
+                batch.append((row_number, values, user))
+
+        if batch:
+            taken_usernames, taken_emails, taken_phones = existing_conflicts([values for _, values, _ in batch])
+            accepted = []
+            for row_number, values, user in batch:
+                errors = {}
+                if values['username'] in taken_usernames:
+                    errors['username'] = ['A user with that username already exists.']
+                if values['email'] in taken_emails:
+                    errors['email'] = ['A user with that email already exists.']
+                if values['phone'] and values['phone'] in taken_phones:
+                    errors['phone'] = ['A user with that phone already exists.']
+                if errors:
+                    failed += 1
+                    yield {'event': 'error', 'row': row_number, 'errors': errors}
+                else:
+                    accepted.append((row_number, values, user))
+
+            with_password = [values['password'] for _, values, _ in accepted if values['password']]
+            hashes = iter(hasher.hash(with_password))
+            users = []
+            for _, values, user in accepted:
+                if values['password']:
+                    user.password = next(hashes)
+                else:
+                    # Pupils without a password sign in with their one-time token.
+                    user.set_unusable_password()
+                users.append(user)
+
+            try:
+                with transaction.atomic():
+                    User.objects.bulk_create(users, batch_size=batch_size)
+            except IntegrityError:
+                # Another request claimed one of these names since the conflict check.
+                for row_number, _, _ in accepted:
+                    failed += 1
+                    yield {'event': 'error', 'row': row_number,
+                           'errors': {'non_field_errors': ['Conflicts with an account created concurrently.']}}
+            else:
+                for row_number, _, user in accepted:
+                    created += 1
+                    event = {'event': 'created', 'row': row_number, 'id': user.pk, 'username': user.username}
+                    if issue_tokens:
+                        event['login_token'] = login_token(user)
+                    yield event
+
+        yield {'event': 'progress', 'processed': min(batch_start + batch_size, total), 'total': total}
+
+    yield {'event': 'done', 'created': created, 'failed': failed, 'total': total}
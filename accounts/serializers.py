@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import User, UserProfile
 from game.models import Badge  # Ensure correct import
+from truthquest.fieldsets import SparseFieldsSerializerMixin
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -12,11 +13,18 @@ class BadgeSerializer(serializers.ModelSerializer):
         model = Badge
         fields = ['id', 'name', 'description', 'image']
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.EmailField(source='user.email', read_only=True)
     badges = BadgeSerializer(many=True, read_only=True)
-    
+    image_thumbnail = serializers.SerializerMethodField()
+    post_thumb = serializers.SerializerMethodField()
+
+    field_columns = {
+        'image_thumbnail': ['entry_thumbnail'],
+        'post_thumb': ['entry_thumbnail'],
+    }
+
     class Meta:
         model = UserProfile
         fields = [
@@ -31,4 +39,18 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'post_thumb',
             'high_scores',
             'badges'
-        ]
\ No newline at end of file
+        ]
+
+    def spec_url(self, profile, spec):
+        # Thumbnails are generated on upload, so this only builds the URL.
+        if not profile.entry_thumbnail:
+            return None
+        request = self.context.get('request')
+        url = getattr(profile, spec).url
+        return request.build_absolute_uri(url) if request else url
+
+    def get_image_thumbnail(self, profile):
+        return self.spec_url(profile, 'image_thumbnail')
+
+    def get_post_thumb(self, profile):
+        return self.spec_url(profile, 'post_thumb')
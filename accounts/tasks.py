@@ -1,37 +1,52 @@
 # coding=utf-8
 from __future__ import absolute_import, unicode_literals
 from celery import shared_task
-import logging, requests
-from time import sleep
-from django.core.mail import send_mail
-from .models import PhoneOTP, User
+import logging
+from django.conf import settings
+from django.core.mail import EmailMessage
+from .messaging import get_email_dispatcher, get_sms_gateway
+from .utils import send_deliveries
 
 __author__ = 'kwameboame'
 logger = logging.getLogger(__name__)
 
-@shared_task
-def send_otp_email_task(user_email, key):
-    """Sends an email when the feedback form has been submitted."""
-    # sleep(20)  # Simulate expensive operation(s) that freeze Django
-    send_mail(
+
+def otp_email(user_email, key):
+    return EmailMessage(
         "TruthQuest OTP",
         f"Your OTP is {str(key)}. Thank you!".lstrip(),
-        "info@penplusbytes.org",
+        settings.DEFAULT_FROM_EMAIL,
         [user_email],
-        fail_silently=False,
     )
 
 
+@shared_task
+def send_otp_email_task(user_email, key):
+    """Sends an OTP email over the worker's shared SMTP connection."""
+    get_email_dispatcher().send_messages([otp_email(user_email, key)])
+
+
+@shared_task
+def send_otp_email_batch_task(items):
+    """Sends OTP emails for a list of ``[email, key]`` pairs in one SMTP session."""
+    return get_email_dispatcher().send_messages([otp_email(email, key) for email, key in items])
+
+
 @shared_task
 def send_otp_sms_task(phone, key):
-    url = "https://konnect.kirusa.com/api/v1/Accounts/GW55n_YxMLKmuwJLWEigyA==/Messages"
-    payload = "{\r\"id\":\"your_unique_id_for_request\",\r\"to\":[\"" + phone + "\"],\r\"sender_mask\":\"GHFootball\",\r\"body\":\"Your OTP is " + str(
-        key) + "\",\r\"priority\": \"high\"\r}\r"
-    headers = {
-        'Content-Type': "application/json",
-        'Authorization': "kkkk"
-    }
-    res = requests.request("POST", url, data=payload, headers=headers)
-    data = res.json()
-
-    return data
+    return get_sms_gateway().send([phone], f"Your OTP is {key}")
+
+
+@shared_task
+def send_sms_batch_task(messages, gateway=None):
+    """
+    Sends a list of ``[phone, body]`` pairs through one pooled gateway,
+    grouping recipients that share a body into a single API call.
+    """
+    return get_sms_gateway(gateway).send_many(messages)
+
+
+@shared_task
+def send_mail_deliveries_task(delivery_ids):
+    """Renders and sends queued EmailDelivery rows over one mail connection, recording each outcome."""
+    return send_deliveries(delivery_ids)
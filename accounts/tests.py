@@ -1,3 +1,308 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import shutil
+import smtplib
+import socket
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.core import mail
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from benchmarks.gateway_stub import SMSGatewayStub, SMTPSink
+
+from .messaging import EmailDispatcher, MessagingError, RateLimiter, SMSGateway
+from .models import EmailDelivery, User, UserProfile
+from .provisioning import POOL_THRESHOLD, PasswordHasher
+from .utils import queue_confirmation_mails, send_deliveries
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='ama', email='ama@example.com', password='pass12345')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_cached_user_skips_user_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/accounts/user/').status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/accounts/user/')
+        self.assertEqual(response.json(), {'username': 'ama', 'email': 'ama@example.com'})
+
+    def test_user_save_invalidates_cache(self):
+        self.client.get('/api/accounts/user/')
+        self.user.email = 'ama@school.example'
+        self.user.save()
+        self.assertEqual(self.client.get('/api/accounts/user/').json()['email'], 'ama@school.example')
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get('/api/accounts/user/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/accounts/user/').status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        self.client.get('/api/accounts/user/')
+        self.user.delete()
+        self.assertEqual(self.client.get('/api/accounts/user/').status_code, 401)
+
+
+class UserProfileSignalTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='kofi', email='kofi@example.com', password='pass12345')
+
+    def test_profile_created_with_user(self):
+        self.assertTrue(UserProfile.objects.filter(user=self.user).exists())
+
+    def test_login_does_not_touch_profile(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().post('/api/accounts/login/', {'username_or_email': 'kofi', 'password': 'pass12345'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q['sql'] for q in queries if 'accounts_userprofile' in q['sql']])
+        # SELECT user, UPDATE last_login and the session round trips; the
+        # profile SELECT + UPDATE the old receiver added are gone.
+        self.assertEqual(len(queries), 9)
+
+    def test_user_save_does_not_touch_profile(self):
+        with self.assertNumQueries(1):
+            self.user.first_name = 'Kofi'
+            self.user.save(update_fields=['first_name'])
+
+    def test_bulk_create_creates_profiles(self):
+        users = User.objects.bulk_create([
+            User(username=f'pupil{i}', email=f'pupil{i}@example.com') for i in range(3)
+        ])
+        self.assertEqual(UserProfile.objects.filter(user__in=users).count(), 3)
+
+
+class ThumbnailBackfillTests(TestCase):
+    def test_migration_generates_missing_thumbnails(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        storages = {'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+        with override_settings(MEDIA_ROOT=root, STORAGES=storages):
+            # A photo uploaded before thumbnails were generated on upload: stored, no thumbnails
+            buffer = io.BytesIO()
+            Image.new('RGB', (400, 300), 'red').save(buffer, 'JPEG')
+            name = default_storage.save('profile_photos/ama.jpg', buffer)
+            user = User.objects.create_user(username='ama', email='ama@example.com', password=None)
+            UserProfile.objects.filter(user=user).update(entry_thumbnail=name)
+            profile = UserProfile.objects.get(user=user)
+            self.assertFalse(default_storage.exists(profile.image_thumbnail.name))
+
+            migration = importlib.import_module('accounts.migrations.0007_backfill_profile_thumbnails')
+            with mock.patch('sys.stdout', io.StringIO()):
+                migration.generate_thumbnails(None, None)
+            self.assertTrue(default_storage.exists(profile.image_thumbnail.name))
+            self.assertTrue(default_storage.exists(profile.post_thumb.name))
+
+
+class BulkProvisioningTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='teacher', email='teacher@example.com', password='pass12345',
+                                              is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def provision(self, **data):
+        response = self.client.post('/api/accounts/provision/', data, format='json')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_creates_users_and_profiles_and_reports_row_errors(self):
+        events = self.provision(users=[
+            {'username': 'pupil1', 'email': 'P1@example.com', 'first_name': 'Akua', 'password': 'secret-1'},
+            {'username': 'pupil2', 'email': 'p2@example.com'},
+            {'username': 'pupil1', 'email': 'p3@example.com'},
+            {'username': 'teacher', 'email': 'p4@example.com'},
+            {'username': '', 'email': 'not-an-email'},
+        ])
+        errors = {e['row']: e['errors'] for e in events if e['event'] == 'error'}
+        self.assertEqual(set(errors), {3, 4, 5})
+        self.assertIn('Duplicate username in upload.', errors[3]['username'])
+        self.assertIn('username', errors[4])
+        self.assertEqual(set(errors[5]), {'username', 'email'})
+        self.assertEqual(events[-1], {'event': 'done', 'created': 2, 'failed': 3, 'total': 5})
+
+        pupil1 = User.objects.get(username='pupil1')
+        self.assertEqual(pupil1.email, 'p1@example.com')
+        self.assertTrue(pupil1.check_password('secret-1'))
+        self.assertEqual(pupil1.profile.first_name, 'Akua')
+        self.assertFalse(User.objects.get(username='pupil2').has_usable_password())
+
+    def test_one_time_login_token(self):
+        events = self.provision(users=[{'username': 'pupil1', 'email': 'p1@example.com'}], tokens=True)
+        token = next(e['login_token'] for e in events if e['event'] == 'created')
+        client = APIClient()
+        response = client.post('/api/accounts/token-login/', {'token': token}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.json())
+        # The token is spent once used.
+        self.assertEqual(client.post('/api/accounts/token-login/', {'token': token}, format='json').status_code, 401)
+
+    def test_csv_upload(self):
+        upload = SimpleUploadedFile('class.csv', b'Username,Email,Password\npupil1,p1@example.com,x1\npupil2,p2@example.com,\n')
+        response = self.client.post('/api/accounts/provision/', {'file': upload}, format='multipart')
+        events = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(events[-1]['created'], 2)
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.post('/api/accounts/provision/', {'users': []}, format='json').status_code, 401)
+
+    def test_parallel_hashing_matches_serial(self):
+        hasher = PasswordHasher(workers=2)
+        try:
+            hashes = hasher.hash([f'pw{i}' for i in range(POOL_THRESHOLD)])
+        finally:
+            hasher.close()
+        self.assertTrue(all(check_password(f'pw{i}', h) for i, h in enumerate(hashes)))
+
+
+class SMSGatewayTests(SimpleTestCase):
+    def setUp(self):
+        self.stub = SMSGatewayStub().start()
+        self.addCleanup(self.stub.stop)
+        self.gateway = SMSGateway('stub', {'URL': self.stub.url, 'AUTH_TOKEN': 'key', 'BATCH_SIZE': 2,
+                                           'RATE_LIMIT': 0, 'BACKOFF': 0.01})
+        self.addCleanup(self.gateway.close)
+
+    def test_pooled_connection_and_batching(self):
+        self.gateway.send_many([('0241', 'Your OTP is 1'), ('0242', 'Hello'), ('0243', 'Hello'), ('0244', 'Hello')])
+        # One call for the OTP, two for the three "Hello" recipients, over one TCP connection.
+        self.assertEqual([call['payload']['to'] for call in self.stub.calls], [['0241'], ['0242', '0243'], ['0244']])
+        self.assertEqual(self.stub.connections, 1)
+        self.assertEqual(self.stub.calls[0]['authorization'], 'key')
+
+    def test_retries_unavailable_gateway(self):
+        self.stub.fail_next = 2
+        with self.assertLogs('accounts.messaging', 'WARNING'):
+            self.gateway.send(['0241'], 'Hi')
+        self.assertEqual(len(self.stub.calls), 1)
+
+    def test_gives_up_after_max_retries(self):
+        self.stub.fail_next = 10
+        with self.assertRaises(MessagingError), self.assertLogs('accounts.messaging', 'WARNING'):
+            self.gateway.send(['0241'], 'Hi')
+        self.assertEqual(self.stub.fail_next, 10 - 4)
+
+    def test_client_errors_are_not_retried(self):
+        self.stub.fail_next, self.stub.fail_status = 10, 400
+        with self.assertRaises(MessagingError):
+            self.gateway.send(['0241'], 'Hi')
+        self.assertEqual(self.stub.fail_next, 9)
+
+    def test_rate_limit(self):
+        self.gateway.limiter = RateLimiter(20, burst=1)
+        self.gateway.send(['1', '2', '3', '4', '5', '6'], 'Hi')
+        times = [call['time'] for call in self.stub.calls]
+        self.assertGreaterEqual(times[-1] - times[0], 0.09)
+
+
+class EmailDispatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.sink = SMTPSink().start()
+        self.addCleanup(self.sink.stop)
+        overrides = override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                                      EMAIL_HOST=self.sink.host, EMAIL_PORT=self.sink.port,
+                                      EMAIL_USE_TLS=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_reuses_one_connection(self):
+        dispatcher = EmailDispatcher(chunk_size=3)
+        messages = [EmailMessage('OTP', f'Your OTP is {i}', to=[f'p{i}@example.com']) for i in range(7)]
+        self.assertEqual(dispatcher.send_messages(messages), 7)
+        self.assertEqual(dispatcher.send_messages(messages[:2]), 2)
+        dispatcher.close()
+        self.assertEqual(len(self.sink.messages), 9)
+        self.assertEqual(self.sink.connections, 1)
+
+    def test_reconnects_after_disconnect(self):
+        dispatcher = EmailDispatcher()
+        dispatcher.send_messages([EmailMessage('a', 'b', to=['x@example.com'])])
+        # The server drops the idle connection.
+        dispatcher.connection.connection.sock.shutdown(socket.SHUT_RDWR)
+        self.assertEqual(dispatcher.send_messages([EmailMessage('a', 'b', to=['y@example.com'])]), 1)
+        dispatcher.close()
+        self.assertEqual(self.sink.connections, 2)
+
+    def test_drop_mid_chunk_resends_only_unsent(self):
+        delivered = []
+
+        class Dropping:
+            # Delivers two messages, then the server goes away
+            def send_messages(self, messages):
+                if len(delivered) == 2:
+                    raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+                delivered.extend(messages)
+                return len(messages)
+
+            def close(self):
+                self.closed = True
+                raise smtplib.SMTPServerDisconnected('please run connect() first')
+
+        dropping = Dropping()
+        dispatcher = EmailDispatcher(chunk_size=5)
+        dispatcher.connection = dropping
+        messages = [EmailMessage('OTP', f'Your OTP is {i}', to=[f'p{i}@example.com']) for i in range(5)]
+        self.assertEqual(dispatcher.send_messages(messages), 5)
+        dispatcher.close()
+        self.assertTrue(dropping.closed)
+        self.assertEqual(len(delivered), 2)
+        self.assertEqual(len(self.sink.messages), 3)
+
+
+class BulkMailTests(TestCase):
+    def setUp(self):
+        self.users = User.objects.bulk_create([
+            User(username=f'pupil{i}', email=f'pupil{i}@example.com', first_name=f'Pupil {i}') for i in range(5)
+        ])
+
+    def test_queue_and_send_with_locmem(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            deliveries = queue_confirmation_mails(self.users)
+        self.assertEqual(len(callbacks), 1)
+        ids = [d.pk for d in deliveries]
+        # Select + bulk update per chunk, whatever the number of recipients.
+        with self.assertNumQueries(4):
+            self.assertEqual(send_deliveries(ids, chunk_size=3), {'sent': 5, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].subject, 'Confirm your email')
+        self.assertIn('Pupil 0', mail.outbox[0].body)
+        self.assertIn(f'{settings.WEBSITE_BASE_URL}/confirm-account/', mail.outbox[0].body)
+        self.assertFalse(EmailDelivery.objects.exclude(status=EmailDelivery.SENT).exists())
+        # Sent rows are not sent again.
+        self.assertEqual(send_deliveries(ids), {'sent': 0, 'failed': 0})
+
+    def test_smtp_session_and_failures(self):
+        sink = SMTPSink().start()
+        self.addCleanup(sink.stop)
+        sink.rejected.add('pupil2@example.com')
+        deliveries = queue_confirmation_mails(self.users)
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                               EMAIL_HOST=sink.host, EMAIL_PORT=sink.port, EMAIL_USE_TLS=False,
+                               EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD=''):
+            result = send_deliveries([d.pk for d in deliveries], chunk_size=2)
+        self.assertEqual(result, {'sent': 4, 'failed': 1})
+        self.assertEqual(sink.connections, 1)
+        self.assertEqual(len(sink.messages), 4)
+        failed = EmailDelivery.objects.get(status=EmailDelivery.FAILED)
+        self.assertEqual(failed.email, 'pupil2@example.com')
+        self.assertIn('SMTPRecipientsRefused', failed.error)
+        self.assertEqual(failed.attempts, 1)
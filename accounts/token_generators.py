@@ -8,3 +8,14 @@ class ConfirmEmailTokenGenerator(PasswordResetTokenGenerator):
 
 
 confirm_email_token_generator = ConfirmEmailTokenGenerator()
+
+
+class OneTimeLoginTokenGenerator(PasswordResetTokenGenerator):
+    """
+    Login links for provisioned pupils. The hash covers the password and
+    last_login, so a token stops working as soon as it has been used to sign in.
+    """
+    key_salt = 'accounts.token_generators.OneTimeLoginTokenGenerator'
+
+
+one_time_login_token_generator = OneTimeLoginTokenGenerator()
@@ -1,5 +1,6 @@
 from django.urls import path
-from .views import LoginView, LogoutView, UserView, CSRFTokenView, register_user, login_user
+from .views import (LoginView, LogoutView, UserView, CSRFTokenView, register_user, login_user,
+                    bulk_provision_users, token_login)
 
 urlpatterns = [
     path('login/', LoginView.as_view(), name='api_login'),
@@ -8,4 +9,6 @@ urlpatterns = [
     path('csrf-token/', CSRFTokenView.as_view(), name='api_csrf_token'),
     path('register/', register_user, name='api_register'),
     path('login-user/', login_user, name='api_login_user'),  # Additional API endpoint for login
+    path('provision/', bulk_provision_users, name='api_bulk_provision'),  # Bulk classroom account creation
+    path('token-login/', token_login, name='api_token_login'),  # One-time login tokens from provisioning
 ]
\ No newline at end of file
@@ -1,34 +1,110 @@
 from django.conf import settings
 
+from django.contrib.auth.tokens import default_token_generator
 from django.core import mail
-from django.template.loader import render_to_string
+from django.db import transaction
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
 
+from .messaging import EmailDispatcher
+from .models import EmailDelivery
 
-def send_confirmation_mail(user, token, uid):
-    activate_url = f'{settings.WEBSITE_BASE_URL}/confirm-account/{uid}/{token}'
-    ctx = {
+CONFIRMATION_TEMPLATE = 'accounts/emails/email_confirmation'
+
+
+class MailTemplate:
+    """The subject and HTML body templates for ``template_prefix``, loaded and compiled once."""
+
+    def __init__(self, template_prefix):
+        self.subject = get_template('{0}_subject.txt'.format(template_prefix))
+        self.body = get_template('{0}_message.{1}'.format(template_prefix, 'html'))
+
+    def render(self, email, context):
+        subject = " ".join(self.subject.render(context).splitlines()).strip()
+        msg = mail.EmailMessage(subject=subject,
+                                body=self.body.render(context).strip(),
+                                to=[email])
+        msg.content_subtype = 'html'
+        return msg
+
+
+def confirmation_context(user, token, uid):
+    return {
         'user': user.first_name,
-        'activate_url': activate_url,
+        'activate_url': f'{settings.WEBSITE_BASE_URL}/confirm-account/{uid}/{token}',
     }
 
-    email_template = 'accounts/emails/email_confirmation'
 
-    msg = render_mail(email_template, user.email, ctx)
+def send_confirmation_mail(user, token, uid):
+    msg = render_mail(CONFIRMATION_TEMPLATE, user.email, confirmation_context(user, token, uid))
     msg.send()
 
 
 def render_mail(template_prefix, email, context):
-    subject = render_to_string('{0}_subject.txt'.format(template_prefix),
-                               context)
+    return MailTemplate(template_prefix).render(email, context)
+
+
+def queue_mail(template_prefix, recipients):
+    """
+    Record one pending EmailDelivery per ``(user, email, context)`` in
+    ``recipients`` and hand them to a single Celery task once the transaction
+    commits. ``context`` must be JSON serialisable.
+    """
+    deliveries = EmailDelivery.objects.bulk_create([
+        EmailDelivery(user=user, email=email, template=template_prefix, context=context)
+        for user, email, context in recipients
+    ], batch_size=500)
+    ids = [delivery.pk for delivery in deliveries]
+    if ids:
+        from .tasks import send_mail_deliveries_task
+        transaction.on_commit(lambda: send_mail_deliveries_task.delay(ids))
+    return deliveries
+
+
+def queue_confirmation_mails(users):
+    """Queue account confirmation emails for many users, e.g. a newly onboarded school."""
+    return queue_mail(CONFIRMATION_TEMPLATE, [
+        (user, user.email, confirmation_context(user, default_token_generator.make_token(user),
+                                                urlsafe_base64_encode(force_bytes(user.pk))))
+        for user in users
+    ])
+
 
-    subject = " ".join(subject.splitlines()).strip()
+def send_deliveries(delivery_ids, chunk_size=None):
+    """
+    Render and send the given EmailDelivery rows over one mail connection,
+    ``chunk_size`` at a time, and record each outcome. Rows already sent are
+    skipped, so a retried task only resends what failed.
 
-    template_name = '{0}_message.{1}'.format(template_prefix, 'html')
-    body = render_to_string(template_name,
-                            context).strip()
+    Returns ``{'sent': n, 'failed': n}``.
+    """
+    chunk_size = chunk_size or settings.EMAIL_BATCH_SIZE
+    delivery_ids = list(delivery_ids)
+    templates = {}
+    counts = {EmailDelivery.SENT: 0, EmailDelivery.FAILED: 0}
+    dispatcher = EmailDispatcher(chunk_size=chunk_size, rate_limit=settings.EMAIL_RATE_LIMIT)
+    try:
+        for start in range(0, len(delivery_ids), chunk_size):
+            deliveries = list(
+                EmailDelivery.objects.filter(pk__in=delivery_ids[start:start + chunk_size])
+                .exclude(status=EmailDelivery.SENT)
+            )
+            messages = []
+            for delivery in deliveries:
+                if delivery.template not in templates:
+                    templates[delivery.template] = MailTemplate(delivery.template)
+                messages.append(templates[delivery.template].render(delivery.email, delivery.context))
 
-    msg = mail.EmailMessage(subject=subject,
-                            body=body,
-                            to=[email])
-    msg.content_subtype = 'html'
-    return msg
+            now = timezone.now()
+            for delivery, error in zip(deliveries, dispatcher.send_each(messages)):
+                delivery.attempts += 1
+                delivery.status = EmailDelivery.FAILED if error else EmailDelivery.SENT
+                delivery.error = error or ''
+                delivery.sent_at = None if error else now
+                counts[delivery.status] += 1
+            EmailDelivery.objects.bulk_update(deliveries, ['status', 'attempts', 'error', 'sent_at'])
+    finally:
+        dispatcher.close()
+    return counts
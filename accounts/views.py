@@ -10,13 +10,21 @@ from .serializers import UserSerializer
 from django.contrib import messages
 from rest_framework import status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
 from django.db.models import Q  # Ensure this import exists
+from django.http import StreamingHttpResponse
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode
 from rest_framework.views import APIView
 from django.middleware.csrf import get_token
+import json
+from .provisioning import parse_rows, provision_users, DEFAULT_BATCH_SIZE
+from .token_generators import one_time_login_token_generator
 
 
 @api_view(['POST'])
@@ -57,6 +65,65 @@ def login_user(request):
     return Response({'error': 'Invalid Credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
 
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+@parser_classes([JSONParser, MultiPartParser, FormParser])
+def bulk_provision_users(request):
+    """
+    Create a whole class or school of accounts at once.
+
+    Send a CSV or JSON file as ``file`` (multipart) or a JSON body of
+    ``{"users": [...], "tokens": true}``. Columns: username, email, phone,
+    password, first_name, last_name. Rows without a password get an unusable
+    password; pass ``tokens`` to receive one-time login tokens for them.
+    The response streams one JSON event per line as batches complete.
+    """
+    upload = request.FILES.get('file')
+    try:
+        if upload is not None:
+            fmt = 'json' if upload.name.lower().endswith('.json') else 'csv'
+            rows = parse_rows(upload.read().decode('utf-8-sig'), fmt)
+        else:
+            rows = parse_rows(request.data, 'json')
+    except (ValueError, UnicodeDecodeError) as e:
+        return Response({'error': f'Could not read users: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    issue_tokens = str(request.data.get('tokens', request.query_params.get('tokens', ''))).lower() in ('1', 'true', 'yes')
+    try:
+        batch_size = max(1, int(request.query_params.get('batch_size', DEFAULT_BATCH_SIZE)))
+    except ValueError:
+        return Response({'error': 'batch_size must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    events = provision_users(rows, batch_size=batch_size, issue_tokens=issue_tokens)
+    return StreamingHttpResponse(
+        (json.dumps(event) + '\n' for event in events),
+        content_type='application/x-ndjson',
+    )
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def token_login(request):
+    """Exchange a one-time login token from bulk provisioning for JWTs."""
+    User = get_user_model()
+    uid, _, token = str(request.data.get('token', '')).partition('.')
+    try:
+        user = User.objects.get(pk=force_str(urlsafe_base64_decode(uid)))
+    except (ValueError, TypeError, OverflowError, User.DoesNotExist):
+        user = None
+
+    if user and user.is_active and one_time_login_token_generator.check_token(user, token):
+        # Updating last_login invalidates the token for any later attempt.
+        update_last_login(None, user)
+        refresh = RefreshToken.for_user(user)
+        return Response({
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+            'user': UserSerializer(user).data
+        })
+    return Response({'error': 'Invalid or expired token'}, status=status.HTTP_401_UNAUTHORIZED)
+
+
 class CustomLoginView(View):
     template_name = 'login.html'
 
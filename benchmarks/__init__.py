@@ -0,0 +1,7 @@
+"""
+Benchmarks for the TruthQuest backend.
+
+Run them from the repository root as modules, e.g.::
+
+    python -m benchmarks.bench_storage
+"""
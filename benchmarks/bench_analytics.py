@@ -0,0 +1,83 @@
+"""
+Answer analytics: recording answers and reading the report.
+
+Times ``POST answers/`` with answers buffered per process (the default) and
+written one by one (``ANALYTICS_FLUSH_INTERVAL=0``), then counts
+``--answers`` answers through the buffer in process and times writing them
+out, and times the staff report, uncached and cached, once the counters
+hold millions of answers. Usage::
+
+    python -m benchmarks.bench_analytics --requests 500 --answers 2000000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.utils import measure, print_table, setup_django, summarize, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--answers', type=int, default=2000000)
+    args = parser.parse_args()
+
+    setup_django(STORAGE_BACKEND='local', METRICS_ENABLED='False')
+    with test_database():
+        from django.conf import settings
+        from django.core.cache import caches
+        from django.test import Client
+        from rest_framework_simplejwt.tokens import RefreshToken
+        from accounts.models import User
+        from benchmarks.loadtest import seed
+        from game.analytics import flush, get_buffer
+        from game.models import Action, ScenarioStats
+
+        story_id = seed(1, 'analytics', 'analytics-pass', levels=10, scenarios=10, actions=4)
+        actions = list(Action.objects.filter(scenario__story_id=story_id)
+                       .values_list('pk', 'scenario_id', 'is_correct'))
+        player = User.objects.get(username='analytics0')
+        teacher = User.objects.create_user(username='teacher', email='teacher@example.com', password=None,
+                                           is_staff=True)
+        client = Client()
+        rng = random.Random(0)
+
+        def answer():
+            client.post('/api/game/answers/', {'action_id': rng.choice(actions)[0], 'time_ms': rng.randrange(20000)},
+                        content_type='application/json',
+                        HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(player).access_token}')
+
+        rows = {}
+        rows['answer, buffered'] = summarize(measure(answer, args.requests))
+        flush()
+        settings.ANALYTICS_FLUSH_INTERVAL = 0
+        rows['answer, written at once'] = summarize(measure(answer, args.requests))
+        print_table(f'Recording answers ({len(actions)} actions)', rows)
+
+        buffer = get_buffer()
+        start = time.perf_counter()
+        for _ in range(args.answers):
+            pk, scenario_id, correct = rng.choice(actions)
+            buffer.add(scenario_id, pk, correct, rng.random() < 0.3, rng.randrange(60000))
+        counted = time.perf_counter() - start
+        start = time.perf_counter()
+        flush()
+        written = time.perf_counter() - start
+        total = sum(ScenarioStats.objects.values_list('answers', flat=True))
+        print(f'\n{args.answers} answers buffered in {counted:.2f} s, written in {written * 1000:.1f} ms '
+              f'({total} answers counted)')
+
+        token = f'Bearer {RefreshToken.for_user(teacher).access_token}'
+        path = f'/api/game/analytics/scenarios/?story_id={story_id}&sort=hardest'
+
+        def uncached():
+            caches['responses'].clear()
+            client.get(path, HTTP_AUTHORIZATION=token)
+        rows = {'report, uncached': summarize(measure(uncached, args.requests // 5))}
+        rows['report, cached'] = summarize(measure(lambda: client.get(path, HTTP_AUTHORIZATION=token),
+                                                   args.requests // 5))
+        print_table(f'Report over {total} answers', rows)
+
+
+if __name__ == '__main__':
+    main()
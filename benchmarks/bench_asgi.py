@@ -0,0 +1,175 @@
+"""
+Concurrent connections per worker: WSGI with sync views against ASGI with
+the async views of game/async_views.py.
+
+Drives the real ``truthquest.wsgi`` and ``truthquest.asgi`` applications in
+process the way a server would, without the network. A WSGI worker is a
+pool of ``--threads`` threads; an ASGI worker is one event loop. Each of
+``--connections`` open connections sends ``--requests`` requests in turn,
+cycling through story bundle, level scenarios, animation lookup, top scores
+and get-progress; latency includes the time a request waits for a free
+thread. ``--db-latency`` adds that many ms to every SQL query, standing in
+for a remote database or slow storage, and ``--no-cache`` turns off the
+async views' content cache. Usage::
+
+    python -m benchmarks.bench_asgi --connections 1 16 64 --requests 20
+    python -m benchmarks.bench_asgi --connections 64 --db-latency 5 --no-cache
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from benchmarks.utils import setup_django, summarize, test_database
+
+
+def seed():
+    """Content shaped like Truth Quest plus a player with progress; returns (endpoint paths, token)."""
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from accounts.models import User
+    from benchmarks.loadtest import seed as seed_players
+    from game.models import Animation, LeaderboardEntry, Level, UserProgress
+
+    story_id = seed_players(200, 'asgi', 'asgi-pass')
+    users = list(User.objects.filter(username__startswith='asgi'))
+    LeaderboardEntry.objects.bulk_create([LeaderboardEntry(user=user, story_id=story_id, score=i * 10)
+                                          for i, user in enumerate(users)])
+    UserProgress.objects.create(user=users[0], story_id=story_id, level=1, score=30)
+    Animation.objects.create(story_id=story_id, animation_type='intro', title='Intro', mp4_file='animations/mp4/a.mp4')
+    level_id = Level.objects.filter(story_id=story_id).order_by('order').values_list('pk', flat=True).first()
+    paths = [
+        f'stories/{story_id}/',
+        f'stories/{story_id}/levels/{level_id}/scenarios/',
+        f'animations/by-type/intro/?story_id={story_id}',
+        'leaderboard/top-scores/',
+        f'user-progress/get-progress/?story_id={story_id}',
+    ]
+    return paths, str(RefreshToken.for_user(users[0]).access_token)
+
+
+def wsgi_get(application, path, token):
+    path, _, query = path.partition('?')
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+               'HTTP_AUTHORIZATION': f'Bearer {token}'}
+    setup_testing_defaults(environ)
+    statuses = []
+    result = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(result)
+    finally:
+        result.close()
+    return int(statuses[0].split()[0])
+
+
+async def asgi_get(application, path, token):
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'authorization', f'Bearer {token}'.encode())],
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 50000),
+    }
+    done = asyncio.Event()
+    sent_body = False
+    status = None
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif not message.get('more_body'):
+            done.set()
+
+    await application(scope, receive, send)
+    return status
+
+
+async def run_worker(get, paths, token, connections, requests):
+    """Open ``connections`` connections, each sending ``requests`` requests; returns (latencies, errors, elapsed)."""
+    latencies, errors = [], 0
+
+    async def connection(index):
+        nonlocal errors
+        for n in range(requests):
+            start = time.perf_counter()
+            status = await get(paths[(index + n) % len(paths)], token)
+            latencies.append(time.perf_counter() - start)
+            errors += status >= 400
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connection(i) for i in range(connections)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--requests', type=int, default=20, help='requests per connection')
+    parser.add_argument('--threads', type=int, default=8, help='threads of the WSGI worker')
+    parser.add_argument('--db-latency', type=float, default=0.0, help='ms added to every SQL query')
+    parser.add_argument('--no-cache', action='store_true', help="disable the async views' caches")
+    args = parser.parse_args()
+
+    setup_django(STORAGE_BACKEND='local', METRICS_ENABLED='False')
+    import logging
+    from django.conf import settings
+    from django.db.backends.signals import connection_created
+
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    if args.no_cache:
+        settings.ASYNC_CONTENT_CACHE_TTL = settings.TOP_SCORES_CACHE_TTL = 0
+    if args.db_latency:
+        def slow_execute(execute, sql, params, many, context):
+            time.sleep(args.db_latency / 1000)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            # Fired on every reconnect of a thread's connection object; add the wrapper once
+            if slow_execute not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_execute)
+        connection_created.connect(add_latency, weak=False)
+
+    with tempfile.TemporaryDirectory() as directory, test_database(os.path.join(directory, 'asgi.sqlite3')):
+        from django.core.cache import cache
+        from truthquest.asgi import application as asgi_application
+        from truthquest.wsgi import application as wsgi_application
+
+        paths, token = seed()
+        sync_paths = [f'/api/game/{path}' for path in paths]
+        async_paths = [f'/api/game/async/{path}' for path in paths]
+
+        print(f"\n{'connections':>11} {'worker':24} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for connections in args.connections:
+            pool = ThreadPoolExecutor(args.threads)
+
+            async def threaded_get(path, token):
+                return await asyncio.get_running_loop().run_in_executor(pool, wsgi_get, wsgi_application, path, token)
+
+            workers = {
+                f'wsgi, {args.threads} threads': (threaded_get, sync_paths),
+                'asgi, sync views': (lambda path, token: asgi_get(asgi_application, path, token), sync_paths),
+                'asgi, async views': (lambda path, token: asgi_get(asgi_application, path, token), async_paths),
+            }
+            for name, (get, worker_paths) in workers.items():
+                cache.clear()
+                latencies, errors, elapsed = asyncio.run(
+                    run_worker(get, worker_paths, token, connections, args.requests))
+                row = summarize(latencies)
+                print(f"{connections:>11} {name:24} {len(latencies) / elapsed:>8.0f} {row['p50_ms']:>9.2f} "
+                      f"{row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {errors:>7}")
+            pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
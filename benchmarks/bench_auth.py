@@ -0,0 +1,70 @@
+"""
+Per-request authentication overhead: simplejwt's JWTAuthentication versus
+accounts.authentication.CachedJWTAuthentication.
+
+Each iteration authenticates one request carrying a valid access token and
+counts the SQL queries it issued. Usage::
+
+    python -m benchmarks.bench_auth --requests 2000 --users 50
+"""
+import argparse
+import time
+
+from benchmarks.utils import print_table, setup_django, summarize, test_database
+
+
+def run(authenticator, requests):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    samples = []
+    with CaptureQueriesContext(connection) as queries:
+        for request in requests:
+            start = time.perf_counter()
+            user, _ = authenticator.authenticate(request)
+            samples.append(time.perf_counter() - start)
+    return samples, len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=50, help='distinct users the requests cycle through')
+    args = parser.parse_args()
+
+    setup_django(STORAGE_BACKEND='local')
+    with test_database():
+        from django.core.cache import cache
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from rest_framework_simplejwt.authentication import JWTAuthentication
+        from rest_framework_simplejwt.tokens import AccessToken
+        from accounts.authentication import CachedJWTAuthentication
+        from accounts.models import User
+
+        users = [
+            User.objects.create_user(username=f'bench{i}', email=f'bench{i}@example.com', password=None)
+            for i in range(args.users)
+        ]
+        factory = APIRequestFactory()
+        tokens = [str(AccessToken.for_user(user)) for user in users]
+        requests = [
+            Request(factory.get('/api/game/user-progress/', HTTP_AUTHORIZATION=f'Bearer {tokens[i % len(tokens)]}'))
+            for i in range(args.requests)
+        ]
+
+        rows = {}
+        for name, authenticator in (('JWTAuthentication', JWTAuthentication()),
+                                    ('CachedJWTAuthentication', CachedJWTAuthentication())):
+            cache.clear()
+            samples, query_count = run(authenticator, requests)
+            rows[name] = summarize(samples)
+            rows[name]['queries'] = query_count
+
+    print_table(f'Authenticating {args.requests} requests for {args.users} users', rows)
+    for name, row in rows.items():
+        print(f'{name:32} {row["queries"]} queries ({row["queries"] / args.requests:.3f} per request)')
+
+
+if __name__ == '__main__':
+    main()
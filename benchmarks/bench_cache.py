@@ -0,0 +1,107 @@
+"""
+The tiered response cache on the content endpoints.
+
+Times the story, level scenarios and power-ups-by-story endpoints with the
+response cache off, served from the shared cache (L2, the file-based
+backend here, as several workers of one host would share it) and from the
+in-process LRU (L1). Then ``--threads`` threads request a cold entry at
+once, with ``--db-latency`` ms added to each query, and the number of
+rebuilds shows the stampede protection. Usage::
+
+    python -m benchmarks.bench_cache --requests 300 --threads 32
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import measure, print_table, setup_django, summarize, test_database
+
+
+def run(args):
+    from django.conf import settings
+    from django.core.cache import caches
+    from django.db import connection
+    from django.test import Client
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from accounts.models import User
+    from benchmarks.loadtest import seed
+    from game.models import Level
+
+    story_id = seed(1, 'cache', 'cache-pass', levels=10, scenarios=10, actions=4)
+    level_id = Level.objects.filter(story_id=story_id).order_by('order').values_list('pk', flat=True).first()
+    paths = {
+        'story': f'/api/game/stories/{story_id}/',
+        'scenarios': f'/api/game/stories/{story_id}/levels/{level_id}/scenarios/',
+        'power-ups': f'/api/game/power-ups/by-story/{story_id}/',
+    }
+    client = Client()
+    token = RefreshToken.for_user(User.objects.get(username='cache0')).access_token
+    client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    cache = caches['responses']
+    ttl = settings.RESPONSE_CACHE_TTL
+
+    rows = {}
+    for name, path in paths.items():
+        settings.RESPONSE_CACHE_TTL = 0
+        rows[f'{name}, no cache'] = summarize(measure(lambda: client.get(path), args.requests))
+        settings.RESPONSE_CACHE_TTL = ttl
+        cache.clear()
+        client.get(path)
+
+        def from_l2():
+            cache.l1.clear()
+            client.get(path)
+        rows[f'{name}, L2 (file)'] = summarize(measure(from_l2, args.requests))
+        rows[f'{name}, L1 (in process)'] = summarize(measure(lambda: client.get(path), args.requests))
+    print_table('Response cache', rows)
+
+    # Stampede: every thread asks for the same cold entry while the database is slow
+    rebuilds = 0
+    lock = threading.Lock()
+
+    def slow_execute(execute, sql, params, many, context):
+        time.sleep(args.db_latency / 1000)
+        return execute(sql, params, many, context)
+
+    def request(_):
+        nonlocal rebuilds
+        with connection.execute_wrapper(slow_execute):
+            queries = len(connection.queries)
+            start = time.perf_counter()
+            client.get(paths['scenarios'])
+            elapsed = time.perf_counter() - start
+            if len(connection.queries) > queries:
+                with lock:
+                    rebuilds += 1
+        connection.close()
+        return elapsed
+
+    cache.clear()
+    settings.DEBUG = True  # count queries per thread
+    with ThreadPoolExecutor(args.threads) as pool:
+        latencies = list(pool.map(request, range(args.threads)))
+    settings.DEBUG = False
+    row = summarize(latencies)
+    print(f'\nStampede: {args.threads} concurrent requests for a cold entry, {rebuilds} rebuilt it; '
+          f"p50 {row['p50_ms']:.1f} ms, p99 {row['p99_ms']:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--db-latency', type=float, default=20.0, help='ms added to every SQL query in the stampede')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(STORAGE_BACKEND='local', METRICS_ENABLED='False', CACHE_BACKEND='file',
+                     CACHE_LOCATION=os.path.join(directory, 'cache'))
+        with test_database(os.path.join(directory, 'cache.sqlite3')):
+            run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Streaming exports as the exported table grows.
+
+Grows the game session table in steps of ``--step`` sessions and, at each
+size, streams the whole sessions export through the staff endpoint as CSV
+and as NDJSON, recording the time, rows per second and the peak memory
+allocated while streaming (tracemalloc). For comparison it loads the same
+sessions as model instances, the way the admin does. The streamed exports'
+peak stays flat, bounded by EXPORT_CHUNK_SIZE; loading the queryset grows
+with the table. Usage::
+
+    python -m benchmarks.bench_exports --steps 3 --step 100000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+
+from benchmarks.utils import setup_django, test_database
+
+
+def traced(func):
+    """Run ``func``, returning its result, the seconds it took and its peak allocation in MB."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, default=3)
+    parser.add_argument('--step', type=int, default=100000, help='sessions added per step')
+    parser.add_argument('--players', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django(STORAGE_BACKEND='local', METRICS_ENABLED='False')
+    with test_database():
+        from django.test import Client
+        from django.utils import timezone
+        from rest_framework_simplejwt.tokens import RefreshToken
+        from accounts.models import User
+        from game.models import GameSession, Story
+
+        stories = [Story.objects.create(title=f'Story {i}', description='x') for i in range(3)]
+        users = User.objects.bulk_create([User(username=f'player{i}', email=f'player{i}@example.com')
+                                          for i in range(args.players)])
+        teacher = User.objects.create_user(username='teacher', email='teacher@example.com', password=None,
+                                           is_staff=True)
+        client = Client()
+        client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(teacher).access_token}'
+        rng = random.Random(0)
+        start = timezone.now() - timedelta(days=365)
+
+        def export(fmt):
+            response = client.get('/api/game/exports/sessions/', {'as': fmt})
+            lines = sum(chunk.count(b'\n') for chunk in response.streaming_content)
+            return lines - (fmt == 'csv')  # the header
+
+        print(f"\n{'':36} {'rows':>9} {'seconds':>9} {'rows/s':>10} {'peak MB':>9}")
+        for step in range(1, args.steps + 1):
+            GameSession.objects.bulk_create([
+                GameSession(user=rng.choice(users), story=rng.choice(stories), score=rng.randrange(200),
+                            completed=rng.random() < 0.6, end_time=start + timedelta(seconds=i))
+                for i in range(args.step)
+            ], batch_size=5000)
+            total = step * args.step
+            for name, func in (('csv', lambda: export('csv')), ('ndjson', lambda: export('ndjson')),
+                               ('queryset (admin)', lambda: len(list(GameSession.objects.select_related('user'))))):
+                rows, elapsed, peak = traced(func)
+                label = f'{total} sessions, {name}'
+                print(f'{label:36} {rows:>9} {elapsed:>9.2f} {rows / elapsed:>10.0f} {peak:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Sparse fieldsets on the power-up endpoints PowerUpService.ts calls.
+
+Seeds a story with ``--power-ups`` power-ups and a player holding
+``--grants`` of them, then times ``power-ups/by-story/<id>/`` and
+``user-power-ups/active/`` in full, as the serializer loaded them before
+(every column, one query per related row), and with ``?fields=`` holding
+just what the client reads. Reports queries, bytes and latency. Usage::
+
+    python -m benchmarks.bench_fieldsets --power-ups 200 --grants 500 --requests 100
+"""
+import argparse
+from unittest import mock
+
+from benchmarks.utils import measure, print_table, setup_django, summarize, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--power-ups', type=int, default=200)
+    parser.add_argument('--grants', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=100)
+    args = parser.parse_args()
+
+    setup_django(STORAGE_BACKEND='local', METRICS_ENABLED='False')
+    with test_database():
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from rest_framework.test import APIClient
+        from rest_framework_simplejwt.tokens import RefreshToken
+        from accounts.models import User
+        from game.models import PowerUp, Story, UserPowerUp
+        from truthquest.fieldsets import SparseFieldsMixin
+
+        story = Story.objects.create(title='Truth Quest', description='Benchmark story')
+        power_ups = PowerUp.objects.bulk_create([
+            PowerUp(name=f'Power-up {i}', story=story, description='Spot the fake headline. ' * 20,
+                    image=f'powerup_images/{i}.png', required_correct_answers=i % 10)
+            for i in range(args.power_ups)
+        ])
+        user = User.objects.create_user(username='bench', email='bench@example.com', password=None)
+        UserPowerUp.objects.bulk_create([UserPowerUp(user=user, power_up=power_ups[i % len(power_ups)])
+                                         for i in range(args.grants)])
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+        cases = {
+            'power-ups by story': (f'/api/game/power-ups/by-story/{story.pk}/',
+                                   'id,name,power_up_type,required_correct_answers,bonus_lives,score_multiplier'),
+            'active user power-ups': ('/api/game/user-power-ups/active/', 'id,power_up,power_up_type,is_active'),
+        }
+        rows, stats = {}, {}
+        for name, (path, fields) in cases.items():
+            # "before": the queryset as the view builds it, without setup_queryset()
+            for label, url, sparse in ((f'{name}, before', path, False), (f'{name}, all fields', path, True),
+                                       (f'{name}, ?fields=', f'{path}?fields={fields}', True)):
+                with mock.patch.object(SparseFieldsMixin, 'sparse_queryset',
+                                       (lambda self, queryset: queryset) if not sparse else
+                                       SparseFieldsMixin.sparse_queryset):
+                    with CaptureQueriesContext(connection) as captured:
+                        response = client.get(url)
+                    stats[label] = (len(captured), len(response.content))
+                    rows[label] = summarize(measure(lambda: client.get(url), args.requests))
+
+    print_table(f'{args.power_ups} power-ups, {args.grants} grants', rows)
+    print(f"\n{'':40} {'queries':>8} {'bytes':>9}")
+    for label, (queries, size) in stats.items():
+        print(f'{label:40} {queries:>8} {size:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Challenging a class: invites made one request at a time or in bulk.
+
+Times creating ``--invites`` invites with one ``POST invites/`` each and
+with one ``POST invites/bulk/`` (a single bulk_create, streamed back), then
+resolving ``inviter-score`` for every invite of the challenge, uncached and
+cached. Usage::
+
+    python -m benchmarks.bench_invites --invites 2000
+"""
+import argparse
+import time
+
+from benchmarks.utils import measure, print_table, setup_django, summarize, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--invites', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django(STORAGE_BACKEND='local', METRICS_ENABLED='False')
+    with test_database():
+        import json
+        from django.core.cache import caches
+        from django.test import Client
+        from rest_framework_simplejwt.tokens import RefreshToken
+        from accounts.models import User
+        from game.models import Story
+
+        story = Story.objects.create(title='Truth Quest', description='x')
+        teacher = User.objects.create_user(username='teacher', email='teacher@example.com', password=None,
+                                           is_staff=True)
+        client = Client()
+        client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(teacher).access_token}'
+
+        start = time.perf_counter()
+        for _ in range(args.invites):
+            client.post('/api/game/invites/', {'story': story.pk}, content_type='application/json')
+        one_by_one = time.perf_counter() - start
+        start = time.perf_counter()
+        response = client.post('/api/game/invites/bulk/', {'story': story.pk, 'count': args.invites},
+                               content_type='application/json')
+        tokens = [json.loads(line)['token'] for line in b''.join(response.streaming_content).splitlines()[1:]]
+        bulk = time.perf_counter() - start
+        print(f'\n{args.invites} invites: {one_by_one:.2f} s one request each, {bulk * 1000:.1f} ms in bulk')
+
+        paths = iter([f'/api/game/invites/{token}/inviter-score/' for token in tokens] * 2)
+        client.defaults.pop('HTTP_AUTHORIZATION')
+        caches['responses'].clear()
+        rows = {'inviter-score, uncached': summarize(measure(lambda: client.get(next(paths)), len(tokens)))}
+        rows['inviter-score, cached'] = summarize(measure(lambda: client.get(next(paths)), len(tokens)))
+        print_table(f'Resolving the {len(tokens)} invites of a challenge', rows)
+
+
+if __name__ == '__main__':
+    main()
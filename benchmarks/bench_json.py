@@ -0,0 +1,112 @@
+"""
+JSON serialization and compression of the content endpoints.
+
+Renders the story (``/api/game/stories/<id>/``) and a level's scenarios
+(``.../levels/<id>/scenarios/``) payloads of a seeded story with DRF's
+JSONRenderer and with ORJSONRenderer, parses them back with both parsers,
+and reports bytes on the wire per coding (identity, gzip, and br when the
+``brotli`` package is installed) with what compressing costs. Finally times
+whole requests through the middleware stack with and without
+``Accept-Encoding``, the sync views against the async story bundle whose
+compressed variants are cached. Usage::
+
+    python -m benchmarks.bench_json --levels 20 --scenarios 10 --iterations 500
+"""
+import argparse
+import io
+from unittest import mock
+
+from benchmarks.utils import measure, print_table, setup_django, summarize, test_database
+
+
+def payloads(story_id):
+    """The serializer data of the story and of its first level's scenarios, as the viewsets build them."""
+    from django.test import RequestFactory
+    from game.models import Level, Scenario, Story
+    from game.serializers import ScenarioSerializer, StorySerializer
+
+    request = RequestFactory().get('/')
+    story = Story.objects.prefetch_related('levels').get(pk=story_id)
+    level = Level.objects.filter(story=story).order_by('order').first()
+    scenarios = Scenario.objects.filter(story=story, level=level).prefetch_related('actions__outcome')
+    return {
+        'story': StorySerializer(story, context={'request': request}).data,
+        'scenarios': ScenarioSerializer(scenarios, many=True, context={'request': request}).data,
+    }, level.pk
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--levels', type=int, default=20)
+    parser.add_argument('--scenarios', type=int, default=10, help='scenarios per level')
+    parser.add_argument('--actions', type=int, default=4, help='actions per scenario')
+    parser.add_argument('--iterations', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django(STORAGE_BACKEND='local', METRICS_ENABLED='False')
+    from django.core.cache import cache
+    from django.test import Client
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.views import APIView
+    from benchmarks.loadtest import seed
+    from truthquest.compression import brotli, compress, precompress
+    from truthquest.renderers import ORJSONParser, ORJSONRenderer
+
+    with test_database():
+        story_id = seed(1, 'json', 'json-pass', levels=args.levels, scenarios=args.scenarios, actions=args.actions)
+        data, level_id = payloads(story_id)
+
+        rows = {}
+        for name, payload in data.items():
+            content = JSONRenderer().render(payload)
+            assert ORJSONRenderer().render(payload) == content
+            rows[f'{name}: render, drf'] = summarize(measure(lambda: JSONRenderer().render(payload), args.iterations))
+            rows[f'{name}: render, orjson'] = summarize(
+                measure(lambda: ORJSONRenderer().render(payload), args.iterations))
+            rows[f'{name}: parse, drf'] = summarize(
+                measure(lambda: JSONParser().parse(io.BytesIO(content)), args.iterations))
+            rows[f'{name}: parse, orjson'] = summarize(
+                measure(lambda: ORJSONParser().parse(io.BytesIO(content)), args.iterations))
+        print_table('Serialization', rows)
+
+        codings = ['gzip', 'br'] if brotli is not None else ['gzip']
+        rows = {}
+        print(f"\n{'Bytes on the wire':32} {'bytes':>9} {'ratio':>7}")
+        for name, payload in data.items():
+            content = ORJSONRenderer().render(payload)
+            print(f"{name + ', identity':32} {len(content):>9} {1:>7.2f}")
+            for coding in codings:
+                compressed = compress(content, coding)
+                print(f"{name + ', ' + coding:32} {len(compressed):>9} {len(compressed) / len(content):>7.2f}")
+                rows[f'{name}: {coding}'] = summarize(measure(lambda: compress(content, coding), args.iterations))
+            rows[f'{name}: precompress (cache fill)'] = summarize(
+                measure(lambda: precompress(content), max(1, args.iterations // 10)))
+        if brotli is None:
+            print('(brotli not installed: br skipped)')
+        print_table('Compression', rows)
+
+        client = Client()
+        paths = {
+            'story': f'/api/game/stories/{story_id}/',
+            'scenarios': f'/api/game/stories/{story_id}/levels/{level_id}/scenarios/',
+            'story, async (cached)': f'/api/game/async/stories/{story_id}/',
+        }
+        rows = {}
+        for renderer, renderer_class in (('drf', JSONRenderer), ('orjson', ORJSONRenderer)):
+            # Views copy the renderer setting at import time, so swap it on the base class
+            with mock.patch.object(APIView, 'renderer_classes', [renderer_class]):
+                for name, path in paths.items():
+                    if 'async' in name and renderer == 'drf':
+                        continue
+                    for accept in ('', ', '.join(codings)):
+                        cache.clear()
+                        client.get(path, HTTP_ACCEPT_ENCODING=accept)
+                        label = f"{name}, {renderer}, {accept or 'identity'}"
+                        rows[label] = summarize(measure(lambda: client.get(path, HTTP_ACCEPT_ENCODING=accept),
+                                                        args.iterations))
+        print_table('Requests', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Login cost with and without the old per-save UserProfile write.
+
+The "legacy" run reconnects a receiver that reproduces what
+create_or_update_user_profile used to do on every User.save() (load the
+profile, then save it). Passwords use the MD5 hasher so PBKDF2 does not drown
+out the difference. Usage::
+
+    python -m benchmarks.bench_login --logins 500
+"""
+import argparse
+
+from benchmarks.utils import measure, print_table, setup_django, summarize, test_database
+
+
+def legacy_profile_save(sender, instance, created, **kwargs):
+    instance.profile.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django(STORAGE_BACKEND='local')
+    with test_database():
+        from django.db import connection
+        from django.db.models.signals import post_save
+        from django.test import override_settings
+        from django.test.utils import CaptureQueriesContext
+        from django.utils import timezone
+        from rest_framework.test import APIClient
+        from accounts.models import User
+
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            user = User.objects.create_user(username='bench', email='bench@example.com', password='pass12345')
+            payload = {'username_or_email': 'bench', 'password': 'pass12345'}
+
+            def login():
+                # A fresh client per login, like a pupil signing in on a new device
+                APIClient().post('/api/accounts/login/', payload, format='json')
+
+            def touch_last_login():
+                user.last_login = timezone.now()
+                user.save(update_fields=['last_login'])
+
+            rows = {}
+            for label, legacy in (('current', False), ('legacy', True)):
+                if legacy:
+                    post_save.connect(legacy_profile_save, sender=User)
+                try:
+                    with CaptureQueriesContext(connection) as queries:
+                        login()
+                    query_count = len(queries)
+                    rows[f'{label} login'] = summarize(measure(login, args.logins))
+                    rows[f'{label} login']['queries'] = query_count
+                    rows[f'{label} last_login save'] = summarize(measure(touch_last_login, args.logins))
+                finally:
+                    post_save.disconnect(legacy_profile_save, sender=User)
+
+    print_table(f'{args.logins} logins', rows)
+    print(f"\nqueries per login: current {rows['current login']['queries']}, legacy {rows['legacy login']['queries']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+OTP/SMS and email throughput against local stand-ins: the old one-request,
+one-connection-per-message code versus accounts.messaging's pooled gateway
+and reused SMTP connection.
+
+The SMS stub adds ``--latency`` seconds per call to mimic a remote gateway.
+Usage::
+
+    python -m benchmarks.bench_messaging --messages 500 --latency 0.005
+"""
+import argparse
+import time
+
+import requests
+
+from benchmarks.gateway_stub import SMSGatewayStub, SMTPSink
+from benchmarks.utils import setup_django
+
+
+def legacy_sms(url, phone, body):
+    """What send_otp_sms_task did before: a fresh requests.request per OTP."""
+    response = requests.request('POST', url, headers={'Content-Type': 'application/json', 'Authorization': 'key'},
+                                json={'id': 'otp', 'to': [phone], 'sender_mask': 'GHFootball', 'body': body,
+                                      'priority': 'high'})
+    response.raise_for_status()
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.005, help='simulated gateway latency per call (s)')
+    args = parser.parse_args()
+
+    setup_django(STORAGE_BACKEND='local')
+    from django.conf import settings
+    from django.core.mail import EmailMessage, send_mail
+    from accounts.messaging import EmailDispatcher, SMSGateway
+
+    stub = SMSGatewayStub(latency=args.latency).start()
+    sink = SMTPSink().start()
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    settings.EMAIL_HOST, settings.EMAIL_PORT = sink.host, sink.port
+    settings.EMAIL_USE_TLS, settings.EMAIL_HOST_USER, settings.EMAIL_HOST_PASSWORD = False, '', ''
+
+    phones = [f'+2332400{i:05d}' for i in range(args.messages)]
+    otps = [(phone, f'Your OTP is {i:06d}') for i, phone in enumerate(phones)]
+    rows = []
+    try:
+        gateway = SMSGateway('stub', {'URL': stub.url, 'AUTH_TOKEN': 'key', 'RATE_LIMIT': 0})
+
+        before = stub.connections
+        elapsed = timed(lambda: [legacy_sms(stub.url, phone, body) for phone, body in otps])
+        rows.append(('SMS OTPs, request per message', elapsed, stub.connections - before))
+
+        before = stub.connections
+        elapsed = timed(lambda: [gateway.send([phone], body) for phone, body in otps])
+        rows.append(('SMS OTPs, pooled session', elapsed, stub.connections - before))
+
+        before = stub.connections
+        elapsed = timed(lambda: gateway.send_many([(phone, 'Class starts at 9am') for phone in phones]))
+        rows.append(('SMS broadcast, batched', elapsed, stub.connections - before))
+        gateway.close()
+
+        emails = [(f'p{i}@example.com', body) for i, (_, body) in enumerate(otps)]
+        before = sink.connections
+        elapsed = timed(lambda: [send_mail('TruthQuest OTP', body, settings.DEFAULT_FROM_EMAIL, [to])
+                                 for to, body in emails])
+        rows.append(('Email, send_mail per message', elapsed, sink.connections - before))
+
+        dispatcher = EmailDispatcher(chunk_size=100)
+        before = sink.connections
+        elapsed = timed(lambda: dispatcher.send_messages([
+            EmailMessage('TruthQuest OTP', body, settings.DEFAULT_FROM_EMAIL, [to]) for to, body in emails
+        ]))
+        dispatcher.close()
+        rows.append(('Email, reused connection', elapsed, sink.connections - before))
+    finally:
+        stub.stop()
+        sink.stop()
+
+    print(f'\n{args.messages} messages, {args.latency * 1000:.1f} ms simulated gateway latency')
+    print(f"{'':32} {'seconds':>9} {'msgs/s':>9} {'connections':>12}")
+    for name, elapsed, connections in rows:
+        print(f'{name:32} {elapsed:>9.3f} {args.messages / elapsed:>9.0f} {connections:>12}')
+
+
+if __name__ == '__main__':
+    main()
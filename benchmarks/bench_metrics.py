@@ -0,0 +1,59 @@
+"""
+Overhead of truthquest.metrics.MetricsMiddleware.
+
+Times GET /api/game/stories/ through the full middleware stack with and
+without the metrics middleware, and ``observe()`` on its own. Usage::
+
+    python -m benchmarks.bench_metrics --requests 2000
+"""
+import argparse
+import shutil
+import tempfile
+
+from benchmarks.utils import measure, print_table, setup_django, summarize, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=4)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    setup_django(STORAGE_BACKEND='local', METRICS_DIR=directory)
+    try:
+        with test_database():
+            from django.conf import settings
+            from django.test import Client
+            from game.models import Story
+            from truthquest.metrics import observe
+
+            Story.objects.bulk_create([Story(title=f'Story {i}', description='x') for i in range(5)])
+            with_metrics = list(settings.MIDDLEWARE)
+            without_metrics = [m for m in with_metrics if m != 'truthquest.metrics.MetricsMiddleware']
+
+            # Alternate the two stacks over a few rounds so warm-up and noise hit both alike.
+            samples = {'without metrics': [], 'with metrics': []}
+            clients = {}
+            for name, middleware in (('without metrics', without_metrics), ('with metrics', with_metrics)):
+                settings.MIDDLEWARE = middleware
+                clients[name] = Client()
+                clients[name].get('/api/game/stories/')
+            for _ in range(args.rounds):
+                for name, client in clients.items():
+                    samples[name] += measure(lambda: client.get('/api/game/stories/'), args.requests // args.rounds)
+            rows = {name: summarize(durations) for name, durations in samples.items()}
+            settings.MIDDLEWARE = with_metrics
+            rows['observe() alone'] = summarize(measure(
+                lambda: observe('story-list', 'GET', 200, 0.004, 1, 0.0002, 512), args.requests * 10))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print_table('GET /api/game/stories/', rows)
+    overhead = rows['with metrics']['mean_ms'] - rows['without metrics']['mean_ms']
+    print(f'\nmiddleware overhead ~{overhead * 1000:.0f} us per request '
+          f"(observe() {rows['observe() alone']['mean_ms'] * 1000:.1f} us)")
+
+
+if __name__ == '__main__':
+    main()
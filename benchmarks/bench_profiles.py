@@ -0,0 +1,85 @@
+"""
+/api/game/profiles/ at scale.
+
+Creates ``--profiles`` users (and profiles), each holding a couple of badges,
+then measures the cursor-paginated list: the first page, a page deep in the
+table, and a sparse ``?fields=username,high_scores`` page. The old
+unpaginated, unprefetched listing is timed on ``--legacy-sample`` profiles
+and extrapolated to the whole table. Usage::
+
+    python -m benchmarks.bench_profiles --profiles 100000 --requests 50
+"""
+import argparse
+import time
+
+from benchmarks.utils import measure, print_table, setup_django, summarize, test_database
+
+
+def populate(count, chunk=5000):
+    from accounts.models import User, UserProfile
+    from game.models import Badge
+
+    badges = Badge.objects.bulk_create([Badge(name=f'Badge {i}', description='Earned') for i in range(5)])
+    through = UserProfile.badges.through
+    for start in range(0, count, chunk):
+        users = User.objects.bulk_create([
+            User(username=f'pupil{i}', email=f'pupil{i}@school.example', password='!')
+            for i in range(start, min(start + chunk, count))
+        ])
+        through.objects.bulk_create([
+            through(userprofile_id=user.profile.pk, badge_id=badges[(user.pk + k) % len(badges)].pk)
+            for user in users for k in range(2)
+        ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--legacy-sample', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django(STORAGE_BACKEND='local')
+    with test_database():
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from rest_framework.pagination import Cursor
+        from rest_framework.test import APIClient
+        from accounts.models import UserProfile
+        from accounts.serializers import UserProfileSerializer
+        from game.pagination import ProfileCursorPagination
+
+        start = time.perf_counter()
+        populate(args.profiles)
+        print(f'Created {args.profiles} profiles in {time.perf_counter() - start:.1f} s')
+
+        client = APIClient()
+        deep_id = UserProfile.objects.order_by('id').values_list('id', flat=True)[args.profiles * 9 // 10]
+        paginator = ProfileCursorPagination()
+        paginator.base_url = 'http://testserver/api/game/profiles/'
+        deep_url = paginator.encode_cursor(Cursor(offset=0, reverse=False, position=deep_id))
+
+        rows, queries = {}, {}
+        for name, url in (('first page', '/api/game/profiles/'),
+                          ('page at 90% depth', deep_url),
+                          ('sparse first page', '/api/game/profiles/?fields=username,high_scores')):
+            with CaptureQueriesContext(connection) as captured:
+                client.get(url)
+            queries[name] = len(captured)
+            rows[name] = summarize(measure(lambda: client.get(url), args.requests))
+
+        legacy_profiles = UserProfile.objects.all()[:args.legacy_sample]
+        with CaptureQueriesContext(connection) as captured:
+            samples = measure(lambda: UserProfileSerializer(legacy_profiles, many=True).data, 1)
+        legacy_queries = len(captured)
+
+    print_table(f'/api/game/profiles/ with {args.profiles} profiles', rows)
+    for name, count in queries.items():
+        print(f'{name:32} {count} queries')
+    per_profile = samples[0] / args.legacy_sample
+    print(f'\nOld unpaginated list: {legacy_queries / args.legacy_sample:.1f} queries per profile, '
+          f'~{per_profile * args.profiles:.1f} s for all {args.profiles} profiles (extrapolated)')
+
+
+if __name__ == '__main__':
+    main()
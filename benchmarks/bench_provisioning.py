@@ -0,0 +1,61 @@
+"""
+Bulk provisioning throughput.
+
+Provisions ``--pupils`` accounts through accounts.provisioning, once with
+one-time login tokens instead of passwords and once with a password per pupil
+hashed in a process pool, and compares with creating the same accounts one
+by one through create_user(). Usage::
+
+    python -m benchmarks.bench_provisioning --pupils 5000 --serial-sample 50
+"""
+import argparse
+import time
+
+from benchmarks.utils import setup_django, test_database
+
+
+def rows_for(prefix, count, with_password):
+    return [
+        {'username': f'{prefix}{i}', 'email': f'{prefix}{i}@school.example',
+         'password': f'pw-{prefix}-{i}' if with_password else '', 'first_name': 'Pupil', 'last_name': str(i)}
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pupils', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--serial-sample', type=int, default=50,
+                        help='accounts created one by one to extrapolate the old per-request path')
+    args = parser.parse_args()
+
+    setup_django(STORAGE_BACKEND='local')
+    with test_database():
+        from accounts.models import User
+        from accounts.provisioning import provision_users
+
+        results = {}
+        for label, prefix, with_password in (('tokens, no passwords', 'tok', False),
+                                             ('parallel password hashing', 'pw', True)):
+            start = time.perf_counter()
+            done = None
+            for event in provision_users(rows_for(prefix, args.pupils, with_password), workers=args.workers,
+                                         issue_tokens=not with_password):
+                if event['event'] == 'done':
+                    done = event
+            results[label] = (time.perf_counter() - start, done['created'])
+
+        start = time.perf_counter()
+        for i in range(args.serial_sample):
+            User.objects.create_user(username=f'serial{i}', email=f'serial{i}@school.example', password=f'pw-{i}')
+        per_user = (time.perf_counter() - start) / args.serial_sample
+
+    print(f'\nProvisioning {args.pupils} pupils')
+    for label, (elapsed, created) in results.items():
+        print(f'{label:32} {elapsed:8.2f} s  ({created / elapsed:8.0f} users/s)')
+    print(f"{'one-by-one create_user (est.)':32} {per_user * args.pupils:8.2f} s  ({1 / per_user:8.0f} users/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+The game session list and stats as session history grows.
+
+Grows the game session table in steps of ``--step`` sessions spread over
+``--players`` players, one of whom plays a tenth of them, and times that
+player's first page, a page deep in their history (following cursors) and
+``stats`` at each size. With the (user, start_time) and (user, story,
+start_time) indexes the pages stay flat. Computing stats grows with the
+player's own history only, and it is cached per player until they play
+again. Usage::
+
+    python -m benchmarks.bench_sessions --steps 3 --step 50000 --players 100
+"""
+import argparse
+import random
+from datetime import timedelta
+
+from benchmarks.utils import measure, print_table, setup_django, summarize, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, default=3)
+    parser.add_argument('--step', type=int, default=50000, help='sessions added per step')
+    parser.add_argument('--players', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    # One process, so per-user entries in the locmem cache are safe to measure
+    setup_django(STORAGE_BACKEND='local', METRICS_ENABLED='False', RESPONSE_CACHE_PER_USER='True')
+    with test_database():
+        from django.conf import settings
+        from django.test import Client
+        from django.utils import timezone
+        from rest_framework_simplejwt.tokens import RefreshToken
+        from accounts.models import User
+        from game.models import GameSession, Story
+
+        stories = [Story.objects.create(title=f'Story {i}', description='x') for i in range(3)]
+        users = User.objects.bulk_create([User(username=f'player{i}', email=f'player{i}@example.com')
+                                          for i in range(args.players)])
+        client = Client()
+        client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(users[0]).access_token}'
+        rng = random.Random(0)
+        start = timezone.now() - timedelta(days=365)
+        # Keep the start times generated below rather than "now"
+        GameSession._meta.get_field('start_time').auto_now_add = False
+
+        ttl = settings.RESPONSE_CACHE_TTL
+        rows = {}
+        for step in range(1, args.steps + 1):
+            sessions = []
+            for i in range(args.step):
+                begun = start + timedelta(seconds=rng.randrange(365 * 86400))
+                user = users[0] if i % 10 == 0 else rng.choice(users)
+                sessions.append(GameSession(user=user, story=rng.choice(stories), score=rng.randrange(200),
+                                            completed=rng.random() < 0.6, start_time=begun,
+                                            end_time=begun + timedelta(seconds=rng.randrange(60, 1800))))
+            GameSession.objects.bulk_create(sessions, batch_size=5000)
+            total = step * args.step
+
+            deep = '/api/game/game-sessions/'
+            for _ in range(10):
+                deep = client.get(deep).json()['next']
+            rows[f'{total} sessions, first page'] = summarize(
+                measure(lambda: client.get('/api/game/game-sessions/'), args.requests))
+            rows[f'{total} sessions, page 11'] = summarize(measure(lambda: client.get(deep), args.requests))
+            settings.RESPONSE_CACHE_TTL = 0
+            rows[f'{total} sessions, stats'] = summarize(
+                measure(lambda: client.get('/api/game/game-sessions/stats/'), args.requests))
+            rows[f'{total} sessions, stats of a story'] = summarize(measure(
+                lambda: client.get('/api/game/game-sessions/stats/', {'story_id': stories[0].pk}), args.requests))
+            settings.RESPONSE_CACHE_TTL = ttl
+            rows[f'{total} sessions, stats (cached)'] = summarize(
+                measure(lambda: client.get('/api/game/game-sessions/stats/'), args.requests))
+
+    print_table(f'Game sessions of one player ({args.players} players)', rows)
+
+
+if __name__ == '__main__':
+    main()
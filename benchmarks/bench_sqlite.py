@@ -0,0 +1,99 @@
+"""
+Write throughput of SQLite as concurrent players grow.
+
+Each player saves its progress ``--writes`` times the way save-progress does
+(read the row, update_or_create it), posting a leaderboard score every fifth
+save. Runs each player count against a fresh database in three modes:
+
+- default: Django's SQLite defaults (rollback journal, deferred transactions)
+- tuned: the SQLITE_TUNED profile (WAL, synchronous=NORMAL, IMMEDIATE, busy timeout)
+- tuned + queue: tuned, with writes group-committed by truthquest.sqlite.run_write
+
+Usage::
+
+    python -m benchmarks.bench_sqlite --players 1 4 16 32 --writes 100
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import setup_django, summarize, test_database
+
+
+def play(player, writes, samples, errors, lock):
+    from django.db import OperationalError, connection
+    from game.models import LeaderboardEntry, UserProgress
+    from truthquest.sqlite import run_write
+
+    try:
+        for n in range(writes):
+            start = time.perf_counter()
+            try:
+                UserProgress.objects.filter(user=player, story_id=1).first()
+                run_write(UserProgress.objects.update_or_create, user=player, story_id=1,
+                          defaults={'level': n // 10, 'score': n * 10, 'lives': 3, 'scenario_index': n % 10})
+                if n % 5 == 4:
+                    run_write(LeaderboardEntry.objects.update_or_create, user=player, story_id=1,
+                              defaults={'score': n * 10})
+                ok = True
+            except OperationalError:
+                ok = False
+            with lock:
+                samples.append(time.perf_counter() - start)
+                if not ok:
+                    errors.append(1)
+    finally:
+        connection.close()
+
+
+def run_mode(players, writes, options, use_queue, directory):
+    from django.conf import settings
+    from django.db import connection
+    from accounts.models import User
+    from game.models import Story
+    from truthquest.sqlite import close_write_queues
+
+    connection.settings_dict['OPTIONS'] = options
+    settings.SQLITE_WRITE_QUEUE = use_queue
+    path = os.path.join(directory, f'bench-{players}-{len(options)}-{use_queue}.sqlite3')
+    with test_database(path):
+        Story.objects.create(pk=1, title='Truth Quest', description='x')
+        users = User.objects.bulk_create([User(username=f'p{i}', email=f'p{i}@x.example') for i in range(players)])
+        connection.close()
+        samples, errors, lock = [], [], threading.Lock()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(players) as pool:
+            for user in users:
+                pool.submit(play, user, writes, samples, errors, lock)
+        elapsed = time.perf_counter() - start
+        close_write_queues()
+    return {**summarize(samples), 'errors': len(errors), 'saves_per_s': len(samples) / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, nargs='+', default=[1, 4, 16, 32])
+    parser.add_argument('--writes', type=int, default=100, help='saves per player')
+    args = parser.parse_args()
+
+    setup_django(STORAGE_BACKEND='local')
+    from django.conf import settings
+    tuned = settings.DATABASES['default'].get('OPTIONS') or {}
+    if not tuned:
+        parser.error('run with SQLITE_TUNED enabled')
+    modes = {'default': ({}, False), 'tuned': (tuned, False), 'tuned + queue': (tuned, True)}
+
+    print(f"\n{'players':>7} {'mode':14} {'saves/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    with tempfile.TemporaryDirectory() as directory:
+        for players in args.players:
+            for name, (options, use_queue) in modes.items():
+                row = run_mode(players, args.writes, options, use_queue, directory)
+                print(f"{players:>7} {name:14} {row['saves_per_s']:>9.0f} {row['p50_ms']:>9.2f} "
+                      f"{row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
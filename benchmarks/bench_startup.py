@@ -0,0 +1,65 @@
+"""
+Cold start time.
+
+Starts ``--runs`` fresh interpreters for each startup path in
+truthquest.importtime.TARGETS (settings import, ``django.setup()``, a web
+worker with its URLconf loaded) and for a ``manage.py check``, with the
+bare interpreter as the floor, and times them end to end. The web worker's
+median must stay within ``--budget-ms``; when it doesn't, the packages
+costing the most are listed and the exit status is 1, so CI can run it.
+The default S3 storage is profiled without any AWS configuration, as a
+fresh pod or management command sees it. Usage::
+
+    python -m benchmarks.bench_startup --runs 10 --budget-ms 600
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.utils import print_table, setup_django, summarize
+
+
+def run_cold(argv, env, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, env=env, check=True, stdout=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=600.0,
+                        help='median cold start allowed for a web worker (wsgi), interpreter included')
+    args = parser.parse_args()
+
+    env = {key: value for key, value in os.environ.items() if not key.startswith('AWS_')}
+    env.update(DJANGO_SETTINGS_MODULE='truthquest.settings', METRICS_ENABLED='False')
+    env.setdefault('STORAGE_BACKEND', 's3')
+    os.environ.update(env)
+    setup_django()
+    from truthquest.importtime import TARGETS, by_package, profile, target_code
+
+    rows = {'interpreter': summarize(run_cold([sys.executable, '-c', 'pass'], env, args.runs))}
+    for target in TARGETS:
+        rows[target] = summarize(run_cold([sys.executable, '-c', target_code(target)], env, args.runs))
+    rows['manage.py check'] = summarize(run_cold([sys.executable, 'manage.py', 'check'], env, args.runs))
+    print_table(f"Cold start, {env['STORAGE_BACKEND']} storage", rows)
+
+    median = rows['wsgi']['p50_ms']
+    if median <= args.budget_ms:
+        print(f'\nWeb worker cold start {median:.0f} ms, within the {args.budget_ms:.0f} ms budget')
+        return
+    print(f'\nWeb worker cold start {median:.0f} ms, over the {args.budget_ms:.0f} ms budget. Costliest imports:')
+    packages = sorted(by_package(profile('wsgi', env=env)).items(), key=lambda item: item[1], reverse=True)
+    for package, us in packages[:15]:
+        print(f'  {package:40} {us / 1000:>8.1f} ms')
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
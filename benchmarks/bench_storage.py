@@ -0,0 +1,106 @@
+"""
+Compare the local content-addressed media storage with S3.
+
+S3 is represented by the in-process stand-in in ``benchmarks.s3_stub`` so the
+numbers capture the cost of the boto3 request path (HEAD before every save,
+PUT, HEAD+GET on read) without network noise. Usage::
+
+    python -m benchmarks.bench_storage --files 200 --size 65536 --duplicates 0.25
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+
+from benchmarks.utils import measure, print_table, setup_django, summarize
+
+
+def build_payloads(count, size, duplicate_ratio, seed):
+    rng = random.Random(seed)
+    unique = max(1, int(count * (1 - duplicate_ratio)))
+    blobs = [rng.randbytes(size) for _ in range(unique)]
+    return [blobs[i % unique] for i in range(count)]
+
+
+def run(storage, payloads):
+    from django.core.files.base import ContentFile
+
+    names = []
+    payload_iter = iter(enumerate(payloads))
+
+    def save():
+        index, payload = next(payload_iter)
+        names.append(storage.save(f'level_images/upload-{index}.webp', ContentFile(payload)))
+
+    save_samples = measure(save, len(payloads))
+
+    name_iter = iter(names)
+
+    def read():
+        with storage.open(next(name_iter), 'rb') as f:
+            f.read()
+
+    read_samples = measure(read, len(names))
+
+    name_iter = iter(names)
+    exists_samples = measure(lambda: storage.exists(next(name_iter)), len(names))
+    return names, {
+        'save': summarize(save_samples),
+        'open+read': summarize(read_samples),
+        'exists': summarize(exists_samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--size', type=int, default=64 * 1024, help='bytes per file')
+    parser.add_argument('--duplicates', type=float, default=0.25, help='fraction of uploads repeating earlier content')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    setup_django(STORAGE_BACKEND='local')
+    from storages.backends.s3boto3 import S3Boto3Storage
+    from truthquest.local_storage import ContentAddressedStorage
+    from benchmarks.s3_stub import S3Stub
+
+    payloads = build_payloads(args.files, args.size, args.duplicates, args.seed)
+
+    root = tempfile.mkdtemp(prefix='bench-media-')
+    try:
+        local = ContentAddressedStorage(location=root, base_url='/media/')
+        local_names, local_rows = run(local, payloads)
+        disk_bytes = sum(
+            os.path.getsize(os.path.join(dirpath, f))
+            for dirpath, _, files in os.walk(root) for f in files
+        )
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    stub = S3Stub().start()
+    try:
+        s3 = S3Boto3Storage(
+            bucket_name='bench',
+            endpoint_url=stub.endpoint_url,
+            access_key='bench',
+            secret_key='bench',
+            region_name='us-east-1',
+            addressing_style='path',
+            file_overwrite=False,
+            custom_domain=None,
+        )
+        s3_names, s3_rows = run(s3, payloads)
+        s3_bytes = sum(len(obj['body']) for obj in stub.objects.values())
+    finally:
+        stub.stop()
+
+    print_table('Local content-addressed storage', local_rows)
+    print_table('S3Boto3Storage (local stand-in)', s3_rows)
+    print(f'\nuploaded: {args.files} files, {args.files * args.size} bytes')
+    print(f'local:    {len(set(local_names))} stored names, {disk_bytes} bytes on disk')
+    print(f's3:       {len(set(s3_names))} stored names, {s3_bytes} bytes in bucket')
+
+
+if __name__ == '__main__':
+    main()
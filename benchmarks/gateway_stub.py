@@ -0,0 +1,159 @@
+"""
+Local stand-ins for the SMS gateway and an SMTP server.
+
+``SMSGatewayStub`` accepts the Kirusa-style JSON ``POST`` that
+accounts.messaging sends and records every call, the TCP connections it
+arrived on and the recipients. It can be told to fail the next N calls to
+exercise retries. ``SMTPSink`` is a minimal SMTP server that accepts and
+counts messages and connections, and can refuse chosen recipients. Both run
+in a background thread.
+"""
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SMSGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; without this, delayed ACKs
+    # stall every keep-alive request by ~40 ms.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        with server.lock:
+            if server.fail_next > 0:
+                server.fail_next -= 1
+                status, reply = server.fail_status, {'error': 'unavailable'}
+            else:
+                payload = json.loads(body)
+                server.calls.append({'payload': payload, 'time': time.monotonic(),
+                                     'authorization': self.headers.get('Authorization')})
+                server.recipients += len(payload.get('to', []))
+                status, reply = 200, {'status': 'ok', 'id': payload.get('id')}
+        data = json.dumps(reply).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class SMSGatewayStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.0):
+        super().__init__(address, SMSGatewayHandler)
+        self.lock = threading.Lock()
+        self.calls = []
+        self.connections = 0
+        self.recipients = 0
+        self.fail_next = 0
+        self.fail_status = 503
+        self.latency = latency
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/api/v1/Accounts/stub/Messages'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 sink ESMTP')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                self.reply('250-sink')
+                self.reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self.reply('250 sink')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = command.split(':', 1)[1].strip().strip('<>')
+                if address in server.rejected:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(line[1:] if line.startswith(b'..') else line)
+                with server.lock:
+                    server.messages.append({'to': recipients, 'data': b''.join(data)})
+                self.reply('250 OK queued')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                # RSET, NOOP and anything else
+                self.reply('250 OK')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0)):
+        super().__init__(address, SMTPSinkHandler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.rejected = set()  # addresses answered with 550
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
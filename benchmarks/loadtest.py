@@ -0,0 +1,288 @@
+"""
+Load test replaying the API sequence of ui/components/game/StorylineGame.tsx.
+
+Each virtual player logs in, loads the story, its saved progress, the top
+scores and the story's power-ups, then plays every level: it fetches the
+level's scenarios and answers each one, saving progress after every answer.
+When it has enough correct answers it earns a power-up and uses it. At the
+end of a game it posts its score to the leaderboard and reloads the top
+scores. ``--players`` play concurrently, ``--games`` games each.
+
+By default requests go through the Django test client against a throwaway
+database seeded with a small story and the players. With ``--url`` they go
+to a running server instead; the players ``<prefix><n>`` must already exist
+there with ``--password`` (``manage.py generate_dataset`` creates
+``player<n>`` with ``player-pass``).
+
+Latency percentiles per endpoint and overall throughput are printed and
+written to ``--output`` as JSON; ``--compare`` prints the change against an
+earlier results file. Usage::
+
+    python -m benchmarks.loadtest --players 20 --games 2 --output before.json
+    python -m benchmarks.loadtest --players 20 --games 2 --output after.json --compare before.json
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --story 3 --players 50
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.utils import print_table, setup_django, summarize, test_database
+
+
+class ClientTransport:
+    """Requests through the Django test client, in process."""
+
+    def __init__(self):
+        from django.test import Client
+        self.client = Client(raise_request_exception=False)
+
+    def request(self, method, path, token=None, data=None):
+        extra = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        if method == 'GET':
+            response = self.client.get(path, **extra)
+        else:
+            response = self.client.generic(method, path, json.dumps(data or {}), 'application/json', **extra)
+        is_json = response.get('Content-Type', '').startswith('application/json')
+        return response.status_code, response.json() if is_json and response.content else None
+
+    def close(self):
+        from django.db import connection
+        connection.close()
+
+
+class HTTPTransport:
+    """Requests to a running server over one keep-alive session per player."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def request(self, method, path, token=None, data=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = self.session.request(method, self.base_url + path, headers=headers,
+                                        json=data if method != 'GET' else None, timeout=30)
+        is_json = response.headers.get('Content-Type', '').startswith('application/json')
+        return response.status_code, response.json() if is_json and response.content else None
+
+    def close(self):
+        self.session.close()
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = Counter()
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, duration, ok):
+        with self.lock:
+            self.samples[endpoint].append(duration)
+            if not ok:
+                self.errors[endpoint] += 1
+
+
+class Player:
+    def __init__(self, transport, recorder, username, password, story_id, accuracy, seed):
+        self.transport = transport
+        self.recorder = recorder
+        self.username = username
+        self.password = password
+        self.story_id = story_id
+        self.accuracy = accuracy
+        self.random = random.Random(seed)
+        self.token = None
+
+    def call(self, endpoint, method, path, data=None, expect=(200, 201)):
+        start = time.perf_counter()
+        try:
+            status, body = self.transport.request(method, path, self.token, data)
+        except requests.RequestException:
+            status, body = None, None
+        self.recorder.record(endpoint, time.perf_counter() - start, status in expect)
+        return body if status in expect else None
+
+    def login(self):
+        body = self.call('POST /api/accounts/login-user/', 'POST', '/api/accounts/login-user/',
+                         {'username_or_email': self.username, 'password': self.password})
+        self.token = body and body['access']
+        return bool(self.token)
+
+    def play_game(self):
+        story_id = self.story_id
+        story = self.call('GET /api/game/stories/{id}/', 'GET', f'/api/game/stories/{story_id}/')
+        if not story:
+            return
+        self.call('GET /api/game/user-progress/get-progress/', 'GET',
+                  f'/api/game/user-progress/get-progress/?story_id={story_id}', expect=(200, 404))
+        self.call('GET /api/game/leaderboard/top-scores/', 'GET', '/api/game/leaderboard/top-scores/')
+        power_ups = self.call('GET /api/game/power-ups/by-story/{id}/', 'GET',
+                              f'/api/game/power-ups/by-story/{story_id}/') or []
+
+        score, lives = 0, 3
+        for level_index, level in enumerate(sorted(story['levels'], key=lambda level: level['order'])):
+            scenarios = self.call('GET /api/game/stories/{id}/levels/{id}/scenarios/', 'GET',
+                                  f'/api/game/stories/{story_id}/levels/{level["id"]}/scenarios/') or []
+            correct = 0
+            earned = set()
+            for scenario_index, scenario in enumerate(scenarios):
+                actions = scenario['actions']
+                if actions:
+                    right = [action for action in actions if action['is_correct']]
+                    wrong = [action for action in actions if not action['is_correct']]
+                    if right and (not wrong or self.random.random() < self.accuracy):
+                        action = self.random.choice(right)
+                        correct += 1
+                        score += action['points']
+                    else:
+                        action = self.random.choice(wrong)
+                        lives = max(0, lives - 1)
+                self.call('POST /api/game/user-progress/save-progress/', 'POST',
+                          '/api/game/user-progress/save-progress/',
+                          {'story_id': story_id, 'level': level_index, 'score': score, 'lives': lives,
+                           'scenario_index': scenario_index})
+                for power_up in power_ups:
+                    if power_up['id'] not in earned and correct >= power_up['required_correct_answers']:
+                        earned.add(power_up['id'])
+                        grant = self.call('POST /api/game/user-power-ups/earn/', 'POST', '/api/game/user-power-ups/earn/',
+                                          {'story_id': story_id, 'power_up_id': power_up['id'],
+                                           'correct_answer_count': correct, 'level': level_index,
+                                           'scenario': scenario_index})
+                        if grant:
+                            self.call('POST /api/game/user-power-ups/{id}/use/', 'POST',
+                                      f'/api/game/user-power-ups/{grant["id"]}/use/')
+
+        self.call('POST /api/game/leaderboard/', 'POST', '/api/game/leaderboard/',
+                  {'story_id': story_id, 'score': score})
+        self.call('GET /api/game/leaderboard/top-scores/', 'GET', '/api/game/leaderboard/top-scores/')
+
+
+def seed(players, prefix, password, levels=3, scenarios=5, actions=3):
+    """A story shaped like Truth Quest, its power-ups and the players. Returns the story id."""
+    from django.contrib.auth.hashers import make_password
+    from accounts.models import User
+    from game.models import Action, Level, Outcome, PowerUp, Scenario, Story
+
+    story = Story.objects.create(title='Truth Quest', description='Load test story')
+    for level_order in range(1, levels + 1):
+        level = Level.objects.create(story=story, title=f'Level {level_order}', order=level_order)
+        for scenario_order in range(1, scenarios + 1):
+            scenario = Scenario.objects.create(story=story, level=level, order=scenario_order,
+                                               description=f'Is this headline true? ({level_order}.{scenario_order})')
+            for i in range(actions):
+                action = Action.objects.create(scenario=scenario, text=f'Answer {i}', is_correct=i == 0,
+                                               points=10 if i == 0 else 0)
+                Outcome.objects.create(action=action, text='Because the source checks out.' if i == 0 else 'No.')
+    PowerUp.objects.create(name='Extra life', story=story, description='One more life', required_correct_answers=3,
+                           bonus_lives=1)
+    PowerUp.objects.create(name='Score boost', story=story, description='Double points', power_up_type='score_boost',
+                           required_correct_answers=5, score_multiplier=2.0)
+    # Hash once: every player gets the same (real) password hash, so logins cost what they do in production.
+    password_hash = make_password(password)
+    User.objects.bulk_create([
+        User(username=f'{prefix}{i}', email=f'{prefix}{i}@load.example', password=password_hash)
+        for i in range(players)
+    ], batch_size=1000)
+    return story.pk
+
+
+def run(transport_factory, args, story_id):
+    recorder = Recorder()
+
+    def virtual_player(index):
+        transport = transport_factory()
+        try:
+            player = Player(transport, recorder, f'{args.prefix}{index}', args.password, story_id,
+                            args.accuracy, args.seed + index)
+            if player.login():
+                for _ in range(args.games):
+                    player.play_game()
+        finally:
+            transport.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.players) as pool:
+        list(pool.map(virtual_player, range(args.players)))
+    return recorder, time.perf_counter() - start
+
+
+def report(recorder, elapsed, args):
+    total = sum(len(samples) for samples in recorder.samples.values())
+    return {
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'password')},
+        'elapsed_s': round(elapsed, 3),
+        'requests': total,
+        'errors': sum(recorder.errors.values()),
+        'throughput_rps': round(total / elapsed, 1) if elapsed else 0.0,
+        'endpoints': {
+            endpoint: {**summarize(samples), 'errors': recorder.errors[endpoint]}
+            for endpoint, samples in sorted(recorder.samples.items())
+        },
+    }
+
+
+def print_comparison(results, previous):
+    print(f"\nChange against {previous['config'].get('label') or 'previous run'}")
+    width = max(map(len, results['endpoints']), default=32)
+    print(f"{'':{width}} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for endpoint, row in results['endpoints'].items():
+        before = previous['endpoints'].get(endpoint)
+        if not before:
+            continue
+        deltas = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            deltas.append(f"{(row[key] - before[key]) / before[key] * 100:+8.1f}%" if before[key] else f"{'n/a':>9}")
+        print(f'{endpoint:{width}} ' + ' '.join(deltas))
+    print(f"{'throughput':{width}} {(results['throughput_rps'] / previous['throughput_rps'] - 1) * 100:+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=10)
+    parser.add_argument('--games', type=int, default=1, help='games per player')
+    parser.add_argument('--url', help='base URL of a running server; default: in-process test client')
+    parser.add_argument('--story', type=int, help='story to play (default: 3 with --url, else the seeded story)')
+    parser.add_argument('--prefix', default='load', help='player usernames are <prefix><n>')
+    parser.add_argument('--password', default='load-test-pass')
+    parser.add_argument('--accuracy', type=float, default=0.7, help='probability of answering correctly')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--label', default='', help='name for this run in comparisons')
+    parser.add_argument('--output', default='loadtest-results.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    if args.url:
+        recorder, elapsed = run(lambda: HTTPTransport(args.url), args, args.story or 3)
+    else:
+        setup_django(STORAGE_BACKEND='local')
+        # Failed requests are counted per endpoint; don't also log each traceback.
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        with tempfile.TemporaryDirectory() as directory, test_database(os.path.join(directory, 'loadtest.sqlite3')):
+            story_id = args.story or seed(args.players, args.prefix, args.password)
+            recorder, elapsed = run(ClientTransport, args, story_id)
+
+    results = report(recorder, elapsed, args)
+    print_table(f'{args.players} players x {args.games} games ({results["requests"]} requests, '
+                f'{results["errors"]} errors, {elapsed:.1f} s)', results['endpoints'])
+    for endpoint, row in results['endpoints'].items():
+        if row['errors']:
+            print(f"{endpoint}: {row['errors']} failed")
+    print(f"\nthroughput {results['throughput_rps']} requests/s")
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'results written to {args.output}')
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
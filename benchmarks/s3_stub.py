@@ -0,0 +1,130 @@
+"""
+A minimal in-memory S3 stand-in for benchmarks.
+
+It understands the path-style PutObject, HeadObject, GetObject and
+DeleteObject calls that django-storages makes, which is enough to exercise
+``S3Boto3Storage`` end to end without AWS credentials or network access.
+"""
+import hashlib
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+
+def decode_aws_chunked(body):
+    """Strip the aws-chunked framing newer botocore versions add to uploads."""
+    data = bytearray()
+    position = 0
+    while True:
+        line_end = body.index(b'\r\n', position)
+        size = int(body[position:line_end].split(b';')[0], 16)
+        position = line_end + 2
+        if size == 0:
+            return bytes(data)
+        data += body[position:position + size]
+        position += size + 2
+
+
+class S3StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _key(self):
+        return unquote(urlsplit(self.path).path).lstrip('/')
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = bytearray()
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                body += self.rfile.read(size)
+                self.rfile.readline()
+            body = bytes(body)
+        else:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if 'aws-chunked' in self.headers.get('Content-Encoding', ''):
+            body = decode_aws_chunked(body)
+        return body
+
+    def _not_found(self, head=False):
+        body = b'' if head else b'<?xml version="1.0"?><Error><Code>NoSuchKey</Code></Error>'
+        self.send_response(404)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _object_headers(self, obj):
+        self.send_header('Content-Type', obj['content_type'])
+        self.send_header('Content-Length', str(len(obj['body'])))
+        self.send_header('ETag', obj['etag'])
+        self.send_header('Last-Modified', obj['last_modified'])
+
+    def do_PUT(self):
+        body = self._read_body()
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        with self.server.lock:
+            self.server.objects[self._key()] = {
+                'body': body,
+                'etag': etag,
+                'content_type': self.headers.get('Content-Type', 'binary/octet-stream'),
+                'last_modified': formatdate(usegmt=True),
+            }
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_HEAD(self):
+        obj = self.server.objects.get(self._key())
+        if obj is None:
+            return self._not_found(head=True)
+        self.send_response(200)
+        self._object_headers(obj)
+        self.end_headers()
+
+    def do_GET(self):
+        obj = self.server.objects.get(self._key())
+        if obj is None:
+            return self._not_found()
+        self.send_response(200)
+        self._object_headers(obj)
+        self.end_headers()
+        self.wfile.write(obj['body'])
+
+    def do_DELETE(self):
+        with self.server.lock:
+            self.server.objects.pop(self._key(), None)
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class S3Stub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0)):
+        super().__init__(address, S3StubHandler)
+        self.objects = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def endpoint_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
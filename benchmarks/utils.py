@@ -0,0 +1,74 @@
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+
+def setup_django(**env):
+    """Configure Django for a benchmark run. ``env`` provides defaults for settings read from the environment."""
+    for key, value in env.items():
+        os.environ.setdefault(key, value)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truthquest.settings')
+    import django
+    django.setup()
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Summarize a list of durations in seconds as milliseconds."""
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.mean(samples) * 1000, 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'total_s': round(sum(samples), 4),
+    }
+
+
+def measure(func, iterations):
+    """Call ``func`` ``iterations`` times and return the per-call durations."""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def print_table(title, rows):
+    """Print ``{name: summary}`` rows as an aligned table."""
+    width = max([32, *map(len, rows)])
+    print(f'\n{title}')
+    print(f"{'':{width}} {'count':>7} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, row in rows.items():
+        print(f"{name:{width}} {row['count']:>7} {row['mean_ms']:>10.3f} {row['p50_ms']:>10.3f} "
+              f"{row['p95_ms']:>10.3f} {row['p99_ms']:>10.3f}")
+
+
+@contextmanager
+def test_database(name=None):
+    """
+    Run the body against a freshly migrated throwaway database, like the test
+    runner does. Pass a file ``name`` to get an on-disk SQLite database that
+    several threads can write to (the default in-memory one cannot).
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    if name:
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = name
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
@@ -1,7 +1,8 @@
 from django.contrib import admin
+from django.db.models import Count
 from .models import (Story, Scenario, Level, Action, LeaderboardEntry, Badge, 
-                    GameSession, GameInvite, Outcome, Animation, AnimationType,
-                    UserProgress, PowerUp, PowerUpType, UserPowerUp)
+                    GameSession, GameInvite, Challenge, Outcome, Animation, AnimationType,
+                    UserProgress, PowerUp, PowerUpType, UserPowerUp, ScenarioStats)
 
 
 # Inline for Outcome within Action
@@ -139,7 +140,41 @@ class PowerUpAdmin(admin.ModelAdmin):
 # PowerUpType is a TextChoices enum, not a Django model
 # It cannot be registered with the admin site
 
+# Admin class for Badge
+@admin.register(Badge)
+class BadgeAdmin(admin.ModelAdmin):
+    list_display = ('name', 'rule', 'threshold', 'rule_story')
+    list_filter = ('rule',)
+    search_fields = ('name', 'description')
+
+# Answer counters, kept by game.analytics: read only
+@admin.register(ScenarioStats)
+class ScenarioStatsAdmin(admin.ModelAdmin):
+    list_display = ('scenario', 'answers', 'correct', 'first_answers', 'first_correct')
+    list_filter = ('scenario__story', 'scenario__level')
+    list_select_related = ('scenario__story',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+# Invites sent together (game.invites), with the score they all show
+@admin.register(Challenge)
+class ChallengeAdmin(admin.ModelAdmin):
+    list_display = ('inviter', 'story', 'inviter_score', 'invites_count', 'created_at', 'expires_at')
+    list_filter = ('story',)
+    list_select_related = ('inviter', 'story')
+    readonly_fields = ('inviter_score',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(invites_count=Count('invites'))
+
+    @admin.display(description='Invites', ordering='invites_count')
+    def invites_count(self, obj):
+        return obj.invites_count
+
 admin.site.register(LeaderboardEntry)
-admin.site.register(Badge)
 admin.site.register(GameSession)
 admin.site.register(GameInvite)
\ No newline at end of file
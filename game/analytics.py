@@ -0,0 +1,178 @@
+"""
+Answer analytics for educators.
+
+Every answer is counted into ScenarioStats (answers, correct answers, first
+tries, a time-to-answer histogram) and ActionStats (how often each action is
+chosen), so a report reads one row per scenario and action however many
+answers there have been; raw answers are neither stored nor scanned.
+
+``record_answers()`` adds answers to this process's ``AnswerBuffer``. Its
+counts are written as one ``UPDATE ... SET n = n + delta`` (F()
+increments) per scenario and action touched, all in one ``run_write()``
+transaction, on the first answer ANALYTICS_FLUSH_INTERVAL seconds after the
+last write or once ANALYTICS_FLUSH_SIZE answers are waiting, and when the
+process exits. ``scenario_report()`` turns the counters into the report.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db.models import F, Prefetch
+
+from truthquest.sqlite import run_write
+from .models import Action, ActionStats, ScenarioStats
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the time-to-answer histogram, and their ScenarioStats columns
+TIME_BUCKETS = ((2, 'time_2s'), (5, 'time_5s'), (10, 'time_10s'), (30, 'time_30s'), (60, 'time_60s'),
+                (float('inf'), 'time_longer'))
+
+
+class AnswerBuffer:
+    """Counter deltas per scenario and action, added up in memory until they're written."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.scenarios = defaultdict(Counter)
+        self.actions = defaultdict(Counter)
+        self.size = 0
+        self.started = time.monotonic()
+
+    def add(self, scenario_id, action_id, correct, first_try, time_ms=None):
+        with self.lock:
+            scenario = self.scenarios[scenario_id]
+            scenario['answers'] += 1
+            scenario['correct'] += correct
+            scenario['first_answers'] += first_try
+            scenario['first_correct'] += first_try and correct
+            if time_ms is not None:
+                scenario['time_ms_total'] += time_ms
+                scenario[next(column for bound, column in TIME_BUCKETS if time_ms <= bound * 1000)] += 1
+            action = self.actions[action_id]
+            action['chosen'] += 1
+            action['chosen_first'] += first_try
+            self.size += 1
+
+    def due(self):
+        return (self.size >= settings.ANALYTICS_FLUSH_SIZE
+                or time.monotonic() - self.started >= settings.ANALYTICS_FLUSH_INTERVAL)
+
+    def drain(self):
+        """Take the counts added so far, leaving the buffer empty."""
+        with self.lock:
+            counts = self.scenarios, self.actions, self.size
+            self._reset()
+        return counts
+
+
+def write_counts(scenarios, actions):
+    """Add ``{pk: Counter}`` deltas to the stored counters, creating the rows not counted before."""
+    ScenarioStats.objects.bulk_create([ScenarioStats(scenario_id=pk) for pk in scenarios], ignore_conflicts=True)
+    ActionStats.objects.bulk_create([ActionStats(action_id=pk) for pk in actions], ignore_conflicts=True)
+    for model, deltas in ((ScenarioStats, scenarios), (ActionStats, actions)):
+        for pk, counts in deltas.items():
+            model.objects.filter(pk=pk).update(**{name: F(name) + n for name, n in counts.items() if n})
+
+
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+
+def get_buffer():
+    """This process's buffer. Keyed by pid so forked workers start empty; flushed at exit."""
+    pid = os.getpid()
+    buffer = _buffers.get(pid)
+    if buffer is None:
+        with _buffers_lock:
+            buffer = _buffers.get(pid)
+            if buffer is None:
+                buffer = _buffers[pid] = AnswerBuffer()
+                atexit.register(flush)
+    return buffer
+
+
+def flush():
+    """Write this process's buffered counts. Returns how many answers they held."""
+    scenarios, actions, size = get_buffer().drain()
+    if size:
+        try:
+            run_write(write_counts, scenarios, actions)
+        except Exception:
+            # Analytics are best effort: the answer that triggered the write still succeeds
+            logger.exception('Dropped the counts of %d answers', size)
+    return size
+
+
+def record_answers(answers):
+    """
+    Count ``answers``, dicts of ``action_id``, ``attempt`` (1 for a first
+    try) and optionally ``time_ms``. Answers to unknown actions are skipped;
+    returns how many were counted.
+    """
+    ids = {answer['action_id'] for answer in answers}
+    actions = Action.objects.filter(pk__in=ids, scenario__isnull=False)
+    known = {pk: (scenario_id, is_correct)
+             for pk, scenario_id, is_correct in actions.values_list('pk', 'scenario_id', 'is_correct')}
+    buffer = get_buffer()
+    counted = 0
+    for answer in answers:
+        if answer['action_id'] in known:
+            scenario_id, correct = known[answer['action_id']]
+            buffer.add(scenario_id, answer['action_id'], correct, answer['attempt'] == 1, answer.get('time_ms'))
+            counted += 1
+    if settings.ANALYTICS_FLUSH_INTERVAL <= 0 or buffer.due():
+        flush()
+    return counted
+
+
+def ratio(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+def counters(obj, model):
+    """``obj.stats``, or zeros for a scenario or action nobody has answered yet."""
+    try:
+        return obj.stats
+    except model.DoesNotExist:
+        return model()
+
+
+def scenario_report(scenarios):
+    """Report rows for a Scenario queryset, read from the counters in two queries."""
+    scenarios = scenarios.select_related('stats').prefetch_related(
+        Prefetch('actions', queryset=Action.objects.select_related('stats').order_by('pk')))
+    rows = []
+    for scenario in scenarios:
+        stats = counters(scenario, ScenarioStats)
+        histogram = {column[len('time_'):]: getattr(stats, column) for _, column in TIME_BUCKETS}
+        timed = sum(histogram.values())
+        rows.append({
+            'id': scenario.pk,
+            'story': scenario.story_id,
+            'level': scenario.level_id,
+            'order': scenario.order,
+            'description': scenario.description,
+            'answers': stats.answers,
+            'accuracy': ratio(stats.correct, stats.answers),
+            'first_try_answers': stats.first_answers,
+            'first_try_accuracy': ratio(stats.first_correct, stats.first_answers),
+            'average_time_ms': round(stats.time_ms_total / timed) if timed else None,
+            'time_histogram': histogram,
+            'actions': [{
+                'id': action.pk,
+                'text': action.text,
+                'is_correct': action.is_correct,
+                'chosen': action_stats.chosen,
+                'share': ratio(action_stats.chosen, stats.answers),
+                'chosen_first_try': action_stats.chosen_first,
+            } for action in scenario.actions.all() for action_stats in [counters(action, ActionStats)]],
+        })
+    return rows
@@ -0,0 +1,143 @@
+"""
+Native async versions of the hottest read endpoints.
+
+Served under ``/api/game/async/`` with the same responses as their DRF
+counterparts, for an ASGI server (``truthquest.asgi:application``), where
+they wait on the database and the cache without holding a worker thread.
+Under WSGI they still work, run by Django's async adapter.
+
+Content payloads are cached for ``ASYNC_CONTENT_CACHE_TTL`` seconds (story
+bundles rendered and precompressed) and the top scores for
+``TOP_SCORES_CACHE_TTL`` seconds; content reads use the read replica like
+the viewsets do.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Prefetch
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+
+from accounts.authentication import authenticate_async
+from truthquest.compression import encoded_response, precompress
+from truthquest.renderers import dumps
+from truthquest.replica import areplica_reads
+from .models import Action, Animation, LeaderboardEntry, Scenario, Story, UserProgress
+from .serializers import (AnimationSerializer, ScenarioSerializer, StorySerializer, UserProgressSerializer,
+                          shuffle_actions)
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    return HttpResponse(dumps(data), status=status, content_type='application/json')
+
+
+def error_response(exc):
+    """The JSON DRF's exception handler would send for ``exc``."""
+    data = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+    response = json_response(data, status=exc.status_code)
+    if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+        response['WWW-Authenticate'] = 'Bearer realm="api"'
+    return response
+
+
+def content_cache_key(request, *parts):
+    # Payloads carry absolute media URLs, so they depend on the host they were built for
+    return ':'.join(['game:async', request.scheme, request.get_host(), *map(str, parts)])
+
+
+async def authenticate(request, required=False):
+    user = await authenticate_async(request)
+    if user is None and required:
+        raise NotAuthenticated()
+    return user
+
+
+async def story_bundle(request, story_id):
+    """GET /api/game/async/stories/<id>/: the story with its levels."""
+    try:
+        user = await authenticate(request)
+    except APIException as exc:
+        return error_response(exc)
+    key = content_cache_key(request, 'story', story_id)
+    variants = await cache.aget(key)
+    if variants is None:
+        async with areplica_reads(user):
+            story = await Story.objects.prefetch_related('levels').filter(pk=story_id).afirst()
+        if story is None:
+            return json_response({'detail': 'No Story matches the given query.'}, status=status.HTTP_404_NOT_FOUND)
+        # Cached rendered and precompressed, so a hit costs no serialization or compression
+        variants = precompress(dumps(StorySerializer(story, context={'request': request}).data))
+        await cache.aset(key, variants, settings.ASYNC_CONTENT_CACHE_TTL)
+    return encoded_response(request, variants)
+
+
+async def level_scenarios(request, story_id, level_id):
+    """GET /api/game/async/stories/<id>/levels/<id>/scenarios/: scenarios with their actions in random order."""
+    try:
+        user = await authenticate(request)
+    except APIException as exc:
+        return error_response(exc)
+    key = content_cache_key(request, 'scenarios', story_id, level_id)
+    data = await cache.aget(key)
+    if data is None:
+        queryset = Scenario.objects.filter(story_id=story_id, level_id=level_id).prefetch_related(
+            Prefetch('actions', queryset=Action.objects.select_related('outcome')))
+        async with areplica_reads(user):
+            scenarios = [scenario async for scenario in queryset]
+        data = ScenarioSerializer(scenarios, many=True, context={'request': request}).data
+        await cache.aset(key, data, settings.ASYNC_CONTENT_CACHE_TTL)
+    # Every response shuffles the answers, as ScenarioSerializer does
+    return json_response(shuffle_actions(data))
+
+
+async def animation_by_type(request, animation_type):
+    """GET /api/game/async/animations/by-type/<type>/?story_id=<id>"""
+    try:
+        user = await authenticate(request)
+    except APIException as exc:
+        return error_response(exc)
+    story_id = request.GET.get('story_id')
+    if not story_id:
+        return json_response({'error': 'story_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if not story_id.isdigit():
+        return json_response({'error': 'Story not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    async with areplica_reads(user):
+        if not await Story.objects.filter(id=story_id).aexists():
+            return json_response({'error': 'Story not found'}, status=status.HTTP_404_NOT_FOUND)
+        animation = await Animation.objects.filter(story_id=story_id, animation_type=animation_type,
+                                                   is_active=True).afirst()
+    if not animation:
+        return json_response({'error': f'No {animation_type} animation found for this story'},
+                             status=status.HTTP_404_NOT_FOUND)
+    return json_response(AnimationSerializer(animation, context={'request': request}).data)
+
+
+async def top_scores(request):
+    """GET /api/game/async/leaderboard/top-scores/: each user's best score, highest first."""
+    data = await cache.aget('game:async:top-scores')
+    if data is None:
+        rows = LeaderboardEntry.objects.values('user__username').annotate(
+            highest_score=Max('score')).order_by('-highest_score')
+        data = [{'username': row['user__username'], 'score': row['highest_score']} async for row in rows]
+        await cache.aset('game:async:top-scores', data, settings.TOP_SCORES_CACHE_TTL)
+    return json_response(data)
+
+
+async def get_progress(request):
+    """GET /api/game/async/user-progress/get-progress/?story_id=<id>: the user's saved game."""
+    try:
+        user = await authenticate(request, required=True)
+    except APIException as exc:
+        return error_response(exc)
+    story_id = request.GET.get('story_id')
+    if not story_id:
+        return json_response({'error': 'story_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    progress = None
+    if story_id.isdigit():
+        progress = await UserProgress.objects.select_related('user', 'story').filter(
+            user=user, story_id=story_id).afirst()
+    if progress is None:
+        return json_response({'message': 'No saved progress found for this story'}, status=status.HTTP_404_NOT_FOUND)
+    return json_response(UserProgressSerializer(progress).data)
@@ -0,0 +1,106 @@
+"""
+Rule-based badge awarding.
+
+Each Badge declares a BadgeRule. ``award_badges()`` runs on the hot path when
+a relevant event happens (see the receivers in game.models, and
+game.completion) and costs at most four queries plus one per rule, however
+many badges or players there are. ``backfill_badges()`` re-evaluates every
+rule for all users with set-based queries and bulk inserts into the
+profile/badge table, e.g. after a new badge is added.
+"""
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from accounts.models import UserProfile
+from .models import Badge, BadgeRule, GameSession, LeaderboardEntry, UserPowerUp
+
+ProfileBadge = UserProfile.badges.through
+
+
+def user_value(rule, user_id, badges):
+    """The value ``rule`` is checked against for one user."""
+    if rule == BadgeRule.TOTAL_SCORE:
+        return LeaderboardEntry.objects.filter(user_id=user_id).aggregate(total=Sum('score'))['total'] or 0
+    if rule == BadgeRule.STORY_COMPLETED:
+        return set(GameSession.objects.filter(
+            user_id=user_id, completed=True, story_id__in={badge.rule_story_id for badge in badges},
+        ).values_list('story_id', flat=True).distinct())
+    if rule == BadgeRule.POWER_UPS_USED:
+        return UserPowerUp.objects.filter(user_id=user_id, is_active=False).count()
+    return None
+
+
+def meets(badge, value):
+    if badge.rule == BadgeRule.STORY_COMPLETED:
+        return badge.rule_story_id in value
+    return badge.threshold is not None and value >= badge.threshold
+
+
+def qualifying_users(badge):
+    """Subquery of the ids of every user meeting ``badge``'s rule, or None for manual badges."""
+    if badge.rule == BadgeRule.TOTAL_SCORE and badge.threshold is not None:
+        return (LeaderboardEntry.objects.filter(user__isnull=False).values('user')
+                .annotate(total=Sum('score')).filter(total__gte=badge.threshold).values('user'))
+    if badge.rule == BadgeRule.STORY_COMPLETED and badge.rule_story_id is not None:
+        return GameSession.objects.filter(story_id=badge.rule_story_id, completed=True).values('user')
+    if badge.rule == BadgeRule.POWER_UPS_USED and badge.threshold is not None:
+        return (UserPowerUp.objects.filter(is_active=False).values('user')
+                .annotate(used=Count('id')).filter(used__gte=badge.threshold).values('user'))
+    return None
+
+
+def grant(pairs, batch_size=1000):
+    """Insert ``(profile_id, badge_id)`` pairs, skipping ones that already exist."""
+    ProfileBadge.objects.bulk_create(
+        [ProfileBadge(userprofile_id=profile_id, badge_id=badge_id) for profile_id, badge_id in pairs],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+
+
+def award_badges(user_id, *rules, profile_id=None):
+    """
+    Give the user every badge of ``rules`` they now qualify for and return
+    the ones they didn't hold before. Pass the user's ``profile_id`` when it
+    is known to save looking it up.
+    """
+    badges = list(Badge.objects.filter(rule__in=rules))
+    earned = []
+    for rule in rules:
+        rule_badges = [badge for badge in badges if badge.rule == rule]
+        if rule_badges:
+            value = user_value(rule, user_id, rule_badges)
+            earned.extend(badge for badge in rule_badges if meets(badge, value))
+    if earned:
+        if profile_id is None:
+            profile_id = UserProfile.objects.filter(user_id=user_id).values_list('id', flat=True).first()
+        if profile_id is None:
+            return []
+        held = set(ProfileBadge.objects.filter(userprofile_id=profile_id, badge_id__in=[badge.pk for badge in earned])
+                   .values_list('badge_id', flat=True))
+        earned = [badge for badge in earned if badge.pk not in held]
+        if earned:
+            grant((profile_id, badge.pk) for badge in earned)
+    return earned
+
+
+def backfill_badges(badges=None, batch_size=1000):
+    """
+    Award rule-based ``badges`` (default: all of them) to every user who
+    qualifies and does not have them yet. Returns ``{badge name: awarded}``.
+    """
+    if badges is None:
+        badges = Badge.objects.exclude(rule=BadgeRule.MANUAL)
+    awarded = {}
+    for badge in badges:
+        users = qualifying_users(badge)
+        if users is None:
+            continue
+        profile_ids = list(UserProfile.objects.filter(user__in=users).exclude(badges=badge)
+                           .values_list('id', flat=True))
+        with transaction.atomic():
+            for start in range(0, len(profile_ids), batch_size):
+                grant(((profile_id, badge.pk) for profile_id in profile_ids[start:start + batch_size]),
+                      batch_size=batch_size)
+        awarded[badge.name] = len(profile_ids)
+    return awarded
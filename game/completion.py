@@ -0,0 +1,96 @@
+"""
+Finishing a game session in one transaction.
+
+The client used to finish a game with separate requests (session update,
+leaderboard entry, save-progress, badge awards), each its own transaction,
+so a failure halfway left them disagreeing. ``complete_session()`` does all
+of it in one: it ends the session, keeps the best score on the leaderboard
+and in the profile's high scores, resets the player's progress and awards
+the score and story badges, in at most 12 queries (loading the session
+included) however many badges, stories or sessions there are.
+
+Completing a session that has already ended changes nothing, so a client
+can retry safely: the session is ended by an UPDATE conditional on
+``end_time`` being unset, and only the request that makes it goes on.
+"""
+from dataclasses import dataclass, field
+
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from truthquest.cache import invalidate_tags
+from .badges import award_badges
+from .models import BadgeRule, GameSession, LeaderboardEntry, UserProgress
+
+PROGRESS_FIELDS = ['level', 'score', 'lives', 'scenario_index', 'state_data', 'last_updated']
+
+
+@dataclass
+class Completion:
+    session: GameSession
+    progress: UserProgress
+    best_score: int
+    high_score: int
+    new_high_score: bool = False
+    badges: list = field(default_factory=list)
+    already_completed: bool = False
+
+
+def completed_state(session, user):
+    """The outcome of a session that had already ended, as stored."""
+    progress = UserProgress.objects.filter(user=user, story_id=session.story_id).first()
+    if progress is None:
+        progress = UserProgress(user=user, story=session.story)
+    progress.user, progress.story = user, session.story
+    best_score = (LeaderboardEntry.objects.filter(user=user, story_id=session.story_id)
+                  .values_list('score', flat=True).first())
+    high_scores = UserProfile.objects.filter(user=user).values_list('high_scores', flat=True).first() or {}
+    return Completion(session, progress, best_score or 0, high_scores.get(str(session.story_id), 0),
+                      already_completed=True)
+
+
+def complete_session(session, user, score, completed=True, level=0):
+    """
+    End ``session`` with ``score``. ``completed`` is whether the player
+    finished the story; after a game over (False) their progress restarts at
+    ``level``, the level they reached, instead of at the beginning.
+    Call it inside a transaction, e.g. through ``run_write()``.
+    """
+    if session.end_time is not None:
+        return completed_state(session, user)
+    now = timezone.now()
+    ended = GameSession.objects.filter(pk=session.pk, end_time__isnull=True).update(
+        end_time=now, completed=completed, score=score)
+    if not ended:
+        # A concurrent request for the same session got there first
+        session.refresh_from_db()
+        return completed_state(session, user)
+    session.end_time, session.completed, session.score = now, completed, score
+    story_id = session.story_id
+
+    # Leaderboard and high score keep the best run
+    previous = (LeaderboardEntry.objects.filter(user=user, story_id=story_id)
+                .values_list('score', flat=True).first())
+    best_score = score if previous is None else max(previous, score)
+    LeaderboardEntry.objects.bulk_create(
+        [LeaderboardEntry(user=user, story_id=story_id, score=best_score)],
+        update_conflicts=True, unique_fields=['user', 'story'], update_fields=['score'])
+
+    profile_id, high_scores = UserProfile.objects.filter(user=user).values_list('id', 'high_scores').get()
+    high_score = high_scores.get(str(story_id), 0)
+    new_high_score = str(story_id) not in high_scores or score > high_score
+    if new_high_score:
+        high_scores[str(story_id)] = high_score = score
+        UserProfile.objects.filter(pk=profile_id).update(high_scores=high_scores)
+
+    # The next game starts over: from the beginning once the story is done, else at the level reached
+    progress = UserProgress(user=user, story=session.story, level=0 if completed else level)
+    UserProgress.objects.bulk_create([progress], update_conflicts=True, unique_fields=['user', 'story'],
+                                     update_fields=PROGRESS_FIELDS)
+
+    rules = [BadgeRule.TOTAL_SCORE, BadgeRule.STORY_COMPLETED] if completed else [BadgeRule.TOTAL_SCORE]
+    badges = award_badges(user.pk, *rules, profile_id=profile_id)
+
+    # Bulk writes and update() send no post_save, so drop the cached responses here
+    invalidate_tags('game.leaderboardentry', f'game.userprogress:{user.pk}', f'game.gamesession:{user.pk}')
+    return Completion(session, progress, best_score, high_score, new_high_score, badges)
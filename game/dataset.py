@@ -0,0 +1,219 @@
+"""
+Seeded synthetic data at production scale, for benchmarks and index work.
+
+``generate_content()`` creates stories with levels, scenarios, actions with
+outcomes and power-ups. ``generate_players()`` creates users (with profiles)
+in chunks and, for each chunk, the leaderboard entries, progress rows, game
+sessions and power-up grants of the users who played. Every chunk draws from
+its own ``Random(seed, chunk)``, so a dataset is the same whether it was
+generated by one process or many. Rows are written with bulk_create, so no
+post_save receivers run; use ``manage.py award_badges`` afterwards if needed.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+from django.utils import timezone
+
+from accounts.models import User, UserProfile
+from .models import (Action, GameSession, LeaderboardEntry, Level, Outcome, PowerUp, PowerUpType, Scenario, Story,
+                     UserPowerUp, UserProgress)
+
+SCALES = {
+    'small': {'users': 1_000, 'stories': 3, 'levels': 3, 'scenarios': 5, 'actions': 3},
+    'medium': {'users': 100_000, 'stories': 5, 'levels': 4, 'scenarios': 8, 'actions': 3},
+    'large': {'users': 1_000_000, 'stories': 8, 'levels': 5, 'scenarios': 10, 'actions': 4},
+    'production': {'users': 3_000_000, 'stories': 10, 'levels': 6, 'scenarios': 12, 'actions': 4},
+}
+
+# How players behave
+PLAY_RATE = 0.65            # share of users who have played at all
+MAX_STORIES_PLAYED = 3
+MAX_SESSIONS_PER_STORY = 4
+COMPLETION_RATE = 0.35      # share of sessions that finish the story
+POWER_UP_USE_RATE = 0.7     # share of earned power-ups that get used
+HISTORY_DAYS = 180
+
+TOPICS = ['a viral video', 'a WhatsApp forward', 'a news headline', 'a health tip', 'an election rumour',
+          'a celebrity quote', 'a photo of a flood', 'a school closure notice', 'a football transfer story',
+          'a miracle cure advert', 'a government announcement', 'a charity appeal']
+SOURCES = ['a friend', 'an unknown number', 'a trusted newspaper', 'a blog', 'a radio host', 'a class group chat',
+           'a verified account', 'a parody page']
+CHECKS = ['check who published it first', 'look for the same story on a trusted site', 'do a reverse image search',
+          'check the date', 'ask an adult or a teacher', 'read past the headline', 'look at the web address']
+WRONG = ['share it straight away', 'believe it because many people shared it', 'forward it to the family group',
+         'ignore the date', 'trust it because it looks official', 'add a comment and repost it']
+
+
+def chunk_random(seed, kind, index):
+    return random.Random(f'{seed}:{kind}:{index}')
+
+
+@contextmanager
+def historical_timestamps():
+    """Let the generated start_time/last_updated/earned_at values through instead of now()."""
+    fields = [GameSession._meta.get_field('start_time'), UserProgress._meta.get_field('last_updated'),
+              UserPowerUp._meta.get_field('earned_at')]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def generate_content(seed, stories, levels, scenarios, actions):
+    """Create the story content and return a picklable summary the player chunks draw from."""
+    rng = chunk_random(seed, 'content', 0)
+    with transaction.atomic():
+        story_objs = Story.objects.bulk_create([
+            Story(title=f'Story {i + 1}: {rng.choice(TOPICS).capitalize()}',
+                  description=f'Help Adjoa decide what to do about {rng.choice(TOPICS)}.')
+            for i in range(stories)
+        ])
+        level_objs = Level.objects.bulk_create([
+            Level(story=story, order=order, title=f'Level {order}', intro_text=f'Watch out for {rng.choice(TOPICS)}.')
+            for story in story_objs for order in range(1, levels + 1)
+        ])
+        scenario_objs = Scenario.objects.bulk_create([
+            Scenario(story_id=level.story_id, level=level, order=order,
+                     description=f'{rng.choice(SOURCES).capitalize()} sends you {rng.choice(TOPICS)}. What do you do?')
+            for level in level_objs for order in range(1, scenarios + 1)
+        ], batch_size=1000)
+        action_objs = Action.objects.bulk_create([
+            Action(scenario=scenario, is_correct=i == 0, points=10 if i == 0 else 0,
+                   text=(rng.choice(CHECKS) if i == 0 else rng.choice(WRONG)).capitalize())
+            for scenario in scenario_objs for i in range(actions)
+        ], batch_size=1000)
+        Outcome.objects.bulk_create([
+            Outcome(action=action, text=('Well done, that is how you spot misinformation.' if action.is_correct
+                                         else 'Careful: this is how false stories spread.'))
+            for action in action_objs
+        ], batch_size=1000)
+        power_up_objs = PowerUp.objects.bulk_create([
+            PowerUp(story=story, name=name, power_up_type=kind, description=f'{name} for {story.title}',
+                    required_correct_answers=required, bonus_lives=lives, score_multiplier=multiplier)
+            for story in story_objs
+            for name, kind, required, lives, multiplier in (
+                ('Extra Life', PowerUpType.EXTRA_LIFE, 5, 1, 1.0),
+                ('Score Booster', PowerUpType.SCORE_BOOST, 3, 0, 2.0),
+                ('Hint', PowerUpType.HINT, 2, 0, 1.0),
+            )
+        ])
+    return [
+        {
+            'id': story.pk,
+            'levels': levels,
+            'max_score': levels * scenarios * 10,
+            'power_ups': [p.pk for p in power_up_objs if p.story_id == story.pk],
+        }
+        for story in story_objs
+    ]
+
+
+def build_user_chunk(seed, index, start, stop, prefix, password_hash, stories, now):
+    """Unsaved users (profiles attached) and, per user, the stories they played with their best scores."""
+    rng = chunk_random(seed, 'users', index)
+    users, played = [], []
+    for n in range(start, stop):
+        joined = now - timedelta(days=rng.uniform(0, HISTORY_DAYS), seconds=rng.randrange(86400))
+        user = User(username=f'{prefix}{n}', email=f'{prefix}{n}@players.example', password=password_hash,
+                    date_joined=joined, first_name=f'Player{n}')
+        games = []
+        if rng.random() < PLAY_RATE:
+            for story in rng.sample(stories, rng.randint(1, min(MAX_STORIES_PLAYED, len(stories)))):
+                games.append((story, int(story['max_score'] * rng.betavariate(4, 2))))
+        user.profile = UserProfile(first_name=user.first_name,
+                                   high_scores={str(story['id']): score for story, score in games})
+        users.append(user)
+        played.append(games)
+    return rng, users, played
+
+
+def write_player_chunk(seed, index, start, stop, prefix, password_hash, stories, now):
+    """Create one chunk of users and their game history. Returns the number of rows written."""
+    rng, users, played = build_user_chunk(seed, index, start, stop, prefix, password_hash, stories, now)
+    with transaction.atomic(), historical_timestamps():
+        User.objects.bulk_create(users, batch_size=1000)
+        entries, progress, sessions, session_power_ups = [], [], [], []
+        for user, games in zip(users, played):
+            for story, best in games:
+                entries.append(LeaderboardEntry(user=user, story_id=story['id'], score=best))
+                finished = False
+                started = user.date_joined
+                for _ in range(rng.randint(1, MAX_SESSIONS_PER_STORY)):
+                    started = min(now, started + timedelta(hours=rng.uniform(1, 24 * 14)))
+                    completed = rng.random() < COMPLETION_RATE
+                    finished = finished or completed
+                    sessions.append(GameSession(user=user, story_id=story['id'], completed=completed,
+                                                score=best if completed else int(best * rng.random()),
+                                                start_time=started,
+                                                end_time=started + timedelta(minutes=rng.uniform(3, 40))))
+                    session_power_ups.append((user, story, started))
+                progress.append(UserProgress(
+                    user=user, story_id=story['id'], score=0 if finished else best,
+                    level=0 if finished else rng.randrange(story['levels']), lives=rng.randint(0, 3),
+                    scenario_index=rng.randrange(5), state_data={'generated': True}, last_updated=started,
+                ))
+        LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+        UserProgress.objects.bulk_create(progress, batch_size=1000)
+        GameSession.objects.bulk_create(sessions, batch_size=1000)
+
+        grants = []
+        for session, (user, story, started) in zip(sessions, session_power_ups):
+            for power_up_id in rng.sample(story['power_ups'], rng.randint(0, min(2, len(story['power_ups'])))):
+                used = rng.random() < POWER_UP_USE_RATE
+                earned = started + timedelta(minutes=rng.uniform(1, 3))
+                grants.append(UserPowerUp(user=user, power_up_id=power_up_id, game_session=session, is_active=not used,
+                                          earned_at=earned, used_at=earned + timedelta(seconds=30) if used else None,
+                                          earned_level=rng.randrange(story['levels']),
+                                          earned_scenario=rng.randrange(5), correct_answer_count=rng.randint(2, 10)))
+        UserPowerUp.objects.bulk_create(grants, batch_size=1000)
+    # users + profiles + the rest
+    return 2 * len(users) + len(entries) + len(progress) + len(sessions) + len(grants)
+
+
+def _write_player_chunk(args):
+    # Entry point for pool workers, which must not share the parent's connection
+    try:
+        return write_player_chunk(*args)
+    finally:
+        connections.close_all()
+
+
+def generate_players(seed, users, stories, prefix='player', password='player-pass', chunk_size=5000, workers=1,
+                     progress=None):
+    """
+    Create ``users`` players named ``<prefix><n>``, all with ``password``
+    (hashed once), and their history across ``stories`` (as returned by
+    generate_content). ``progress(done_users, rows)`` is called after each chunk.
+    """
+    password_hash = make_password(password)
+    now = timezone.now()
+    chunks = [
+        (seed, index, start, min(start + chunk_size, users), prefix, password_hash, stories, now)
+        for index, start in enumerate(range(0, users, chunk_size))
+    ]
+    done = rows = 0
+    if workers <= 1:
+        results = map(lambda args: write_player_chunk(*args), chunks)
+    else:
+        import multiprocessing
+        connections.close_all()
+        pool = multiprocessing.get_context('fork').Pool(workers)
+        results = pool.imap_unordered(_write_player_chunk, chunks)
+    try:
+        for (_, _, start, stop, *_), written in zip(chunks, results):
+            done += stop - start
+            rows += written
+            if progress:
+                progress(done, rows)
+    finally:
+        if workers > 1:
+            pool.close()
+            pool.join()
+    return rows
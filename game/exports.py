@@ -0,0 +1,136 @@
+"""
+Streaming exports of player data, as CSV or NDJSON.
+
+Each export reads ``values_list()`` rows (no model instances) a page at a
+time by keyset pagination: ``WHERE pk > <last pk> ORDER BY pk LIMIT n``,
+fetched with ``iterator(chunk_size=n)``, and renders every page to one
+chunk of output before the next page is read. No query uses OFFSET or holds
+a cursor open between pages, and memory holds one page whether the export
+is a thousand rows or ten million. ``export_rows()`` is used by the staff
+endpoint (``StreamingHttpResponse``) and the ``export_data`` command alike.
+"""
+import csv
+import io
+from dataclasses import dataclass
+from datetime import datetime, time
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from truthquest.renderers import dumps
+from .models import GameSession, LeaderboardEntry, UserPowerUp, UserProgress
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+@dataclass(frozen=True)
+class Export:
+    model: type
+    columns: tuple  # (column name, values_list() lookup), id first
+    date_field: str  # filtered by since/until
+    story_field: str = 'story_id'
+
+    @property
+    def header(self):
+        return [name for name, _ in self.columns]
+
+
+EXPORTS = {
+    'progress': Export(UserProgress, (
+        ('id', 'id'), ('user_id', 'user_id'), ('username', 'user__username'), ('story_id', 'story_id'),
+        ('level', 'level'), ('score', 'score'), ('lives', 'lives'), ('scenario_index', 'scenario_index'),
+        ('last_updated', 'last_updated'),
+    ), date_field='last_updated'),
+    'sessions': Export(GameSession, (
+        ('id', 'id'), ('user_id', 'user_id'), ('username', 'user__username'), ('story_id', 'story_id'),
+        ('score', 'score'), ('completed', 'completed'), ('start_time', 'start_time'), ('end_time', 'end_time'),
+    ), date_field='start_time'),
+    'leaderboard': Export(LeaderboardEntry, (
+        ('id', 'id'), ('user_id', 'user_id'), ('username', 'user__username'), ('story_id', 'story_id'),
+        ('score', 'score'), ('created_at', 'created_at'),
+    ), date_field='created_at'),
+    'power-ups': Export(UserPowerUp, (
+        ('id', 'id'), ('user_id', 'user_id'), ('username', 'user__username'),
+        ('story_id', 'power_up__story_id'), ('power_up_id', 'power_up_id'), ('power_up', 'power_up__name'),
+        ('power_up_type', 'power_up__power_up_type'), ('game_session_id', 'game_session_id'),
+        ('is_active', 'is_active'), ('earned_at', 'earned_at'), ('used_at', 'used_at'),
+        ('earned_level', 'earned_level'), ('earned_scenario', 'earned_scenario'),
+        ('correct_answer_count', 'correct_answer_count'),
+    ), date_field='earned_at', story_field='power_up__story_id'),
+}
+
+
+def parse_moment(value, end=False):
+    """
+    An ISO date or datetime as an aware datetime; a bare date means the start
+    of that day, or with ``end`` the end of it. Raises ValueError.
+    """
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'{value!r} is not a date or datetime')
+        moment = datetime.combine(day, time.max if end else time.min)
+    if settings.USE_TZ and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def export_queryset(export, story_id=None, since=None, until=None):
+    """The export's rows as a queryset, filtered by story and by date (inclusive)."""
+    queryset = export.model.objects.all()
+    if story_id is not None:
+        queryset = queryset.filter(**{export.story_field: story_id})
+    if since is not None:
+        queryset = queryset.filter(**{f'{export.date_field}__gte': since})
+    if until is not None:
+        queryset = queryset.filter(**{f'{export.date_field}__lte': until})
+    return queryset
+
+
+def pages(queryset, columns, chunk_size):
+    """Lists of ``columns`` tuples (pk first), ``chunk_size`` at a time in pk order, by keyset pagination."""
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(pk__gt=last)
+        rows = list(page.order_by('pk').values_list(*columns)[:chunk_size].iterator(chunk_size=chunk_size))
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield rows
+        if len(rows) < chunk_size:
+            return
+
+
+def csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_rows(name, fmt='csv', story_id=None, since=None, until=None, chunk_size=None):
+    """
+    The export named ``name`` (a key of EXPORTS) rendered as ``fmt``, yielded
+    as bytes: the CSV header first, then one chunk per page of rows.
+    """
+    export = EXPORTS[name]
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown export format {fmt!r}')
+    queryset = export_queryset(export, story_id, since, until)
+    columns = [lookup for _, lookup in export.columns]
+    header = export.header
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(header)
+        yield buffer.getvalue().encode()
+    for rows in pages(queryset, columns, chunk_size or settings.EXPORT_CHUNK_SIZE):
+        if fmt == 'csv':
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([csv_value(value) for value in row] for row in rows)
+            yield buffer.getvalue().encode()
+        else:
+            yield b''.join(dumps(dict(zip(header, row))) + b'\n' for row in rows)
@@ -0,0 +1,38 @@
+"""
+Challenges: invites to one story for a whole class at once.
+
+``create_challenge()`` reads the inviter's best score once, stores it on a
+Challenge, and inserts its invites with a single ``bulk_create()``. The
+tokens are generated here (uuid4) rather than by the database, so the rows
+go out in one statement and the tokens are known without reading anything
+back. The inviter-score route serves a challenge's invites from the stored
+score, without joining the inviter's profile.
+"""
+import uuid
+
+from accounts.models import UserProfile
+from .models import Challenge, GameInvite
+
+
+def inviter_high_score(user_id, story_id):
+    """The user's best score in the story, from their profile's ``high_scores``."""
+    high_scores = UserProfile.objects.filter(user_id=user_id).values_list('high_scores', flat=True).first()
+    # high_scores is keyed by story id as a string
+    return (high_scores or {}).get(str(story_id), 0)
+
+
+def create_challenge(inviter, story, count):
+    """
+    A Challenge to ``story`` from ``inviter`` and its ``count`` invites: one
+    query for the score, one for the challenge and one ``bulk_create()``
+    (batched by the backend's parameter limit). Call it inside a
+    transaction, e.g. through ``run_write()``.
+    """
+    challenge = Challenge.objects.create(inviter=inviter, story=story,
+                                         inviter_score=inviter_high_score(inviter.pk, story.pk))
+    invites = GameInvite.objects.bulk_create([
+        GameInvite(inviter=inviter, story=story, challenge=challenge, token=uuid.uuid4(),
+                   expires_at=challenge.expires_at)
+        for _ in range(count)
+    ])
+    return challenge, invites
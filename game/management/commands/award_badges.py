@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from game.badges import backfill_badges
+from game.models import Badge, BadgeRule
+
+
+class Command(BaseCommand):
+    help = 'Awards rule-based badges to every user who qualifies for them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--badge', action='append', dest='badges', metavar='NAME',
+                            help='Only re-evaluate this badge (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        badges = Badge.objects.exclude(rule=BadgeRule.MANUAL)
+        if options['badges']:
+            badges = badges.filter(name__in=options['badges'])
+            missing = set(options['badges']) - set(badges.values_list('name', flat=True))
+            if missing:
+                raise CommandError(f"No rule-based badge named: {', '.join(sorted(missing))}")
+
+        for name, count in backfill_badges(badges, batch_size=options['batch_size']).items():
+            self.stdout.write(f"{name}: awarded to {count} user(s)")
+        self.stdout.write(self.style.SUCCESS("Badge backfill complete"))
@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from game.exports import EXPORTS, FORMATS, export_rows, parse_moment
+
+
+class Command(BaseCommand):
+    help = 'Stream player data (progress, sessions, leaderboard, power-ups) to CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=list(EXPORTS))
+        parser.add_argument('--as', dest='fmt', choices=list(FORMATS), default='csv')
+        parser.add_argument('--story', type=int, help='Only rows of this story id')
+        parser.add_argument('--since', help='Only rows from this ISO date or datetime on')
+        parser.add_argument('--until', help='Only rows up to this ISO date or datetime (inclusive)')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Rows per query (default: EXPORT_CHUNK_SIZE)')
+        parser.add_argument('--output', help='Write to this file rather than stdout')
+
+    def handle(self, *args, **options):
+        try:
+            since, until = (parse_moment(options[key], end=key == 'until') if options[key] else None
+                            for key in ('since', 'until'))
+        except ValueError as e:
+            raise CommandError(e)
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in export_rows(options['name'], options['fmt'], options['story'], since, until,
+                                     options['chunk_size']):
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Exported {options['name']} to {options['output']}"))
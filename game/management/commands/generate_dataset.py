@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from game.dataset import SCALES, generate_content, generate_players
+
+
+class Command(BaseCommand):
+    help = ('Generates a seeded synthetic dataset (stories, players and their game history) for scale testing. '
+            'Badges are not awarded; run award_badges afterwards if needed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small',
+                            help=', '.join(f"{name}: {preset['users']:,} users" for name, preset in SCALES.items()))
+        parser.add_argument('--users', type=int, help='Override the number of users of the scale')
+        parser.add_argument('--stories', type=int)
+        parser.add_argument('--levels', type=int, help='Levels per story')
+        parser.add_argument('--scenarios', type=int, help='Scenarios per level')
+        parser.add_argument('--actions', type=int, help='Actions per scenario (the first one is correct)')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Users written per transaction')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes writing user chunks; only useful on a database with concurrent writers')
+        parser.add_argument('--prefix', default='player', help='Usernames are <prefix><n>')
+        parser.add_argument('--password', default='player-pass', help='Password of every generated user')
+
+    def handle(self, *args, **options):
+        size = {key: options[key] if options[key] is not None else value
+                for key, value in SCALES[options['scale']].items()}
+        if min(size.values()) < 1 or size['actions'] < 2:
+            raise CommandError('Counts must be positive and there must be at least 2 actions per scenario')
+        if options['chunk_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--chunk-size and --workers must be positive')
+        if User.objects.filter(username=f"{options['prefix']}0").exists():
+            raise CommandError(f"Users named {options['prefix']}<n> already exist; pick another --prefix")
+
+        start = time.perf_counter()
+        stories = generate_content(options['seed'], size['stories'], size['levels'], size['scenarios'],
+                                   size['actions'])
+        self.stdout.write(f"Created {len(stories)} stories (ids {stories[0]['id']}-{stories[-1]['id']}) with "
+                          f"{size['levels']} levels x {size['scenarios']} scenarios x {size['actions']} actions")
+
+        def progress(done, rows):
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"{done:,}/{size['users']:,} users, {rows:,} rows ({rows / elapsed:,.0f} rows/s)")
+
+        rows = generate_players(options['seed'], size['users'], stories, prefix=options['prefix'],
+                                password=options['password'], chunk_size=options['chunk_size'],
+                                workers=options['workers'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {size['users']:,} users and {rows:,} rows in {time.perf_counter() - start:.1f} s"))
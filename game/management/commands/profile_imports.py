@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from truthquest.importtime import TARGETS, by_package, profile
+
+
+class Command(BaseCommand):
+    help = 'Reports what the imports of a startup path (or another management command) cost, module by module'
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', nargs='?', choices=sorted(TARGETS), default='wsgi',
+                            help='Startup path to profile (default: wsgi, a web worker up to its first request)')
+        parser.add_argument('--command', help='Profile running this management command instead')
+        parser.add_argument('--sort', choices=['self', 'cumulative'], default='cumulative')
+        parser.add_argument('--packages', action='store_true', help='Add up modules by top-level package')
+        parser.add_argument('--limit', type=int, default=30)
+
+    def handle(self, *args, **options):
+        try:
+            costs = profile(options['target'], options['command'])
+        except RuntimeError as e:
+            raise CommandError(f'The profiled process failed:\n{e}')
+        total_ms = sum(cost.self_us for cost in costs) / 1000
+
+        if options['packages']:
+            rows = sorted(by_package(costs).items(), key=lambda item: item[1], reverse=True)
+            self.stdout.write(f"{'package':50} {'ms':>9} {'share':>7}")
+            for package, us in rows[:options['limit']]:
+                self.stdout.write(f'{package:50} {us / 1000:>9.1f} {us / 1000 / total_ms:>7.1%}')
+        else:
+            key = 'self_us' if options['sort'] == 'self' else 'cumulative_us'
+            rows = sorted(costs, key=lambda cost: getattr(cost, key), reverse=True)
+            self.stdout.write(f"{'module':50} {'self ms':>9} {'cumul. ms':>9}")
+            for cost in rows[:options['limit']]:
+                self.stdout.write(f'{cost.module:50} {cost.self_us / 1000:>9.1f} {cost.cumulative_us / 1000:>9.1f}')
+
+        target = f"command {options['command']}" if options['command'] else options['target']
+        self.stdout.write(self.style.SUCCESS(f'{len(costs)} modules imported in {total_ms:.1f} ms ({target})'))
@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from truthquest.replica import replica_path, sync_replica
+
+
+class Command(BaseCommand):
+    help = 'Refreshes the local read replica (DATABASE_REPLICA) with a snapshot of the primary database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep syncing every INTERVAL seconds instead of once')
+
+    def handle(self, *args, **options):
+        if not settings.REPLICA_DATABASE:
+            raise CommandError('No replica configured; set DATABASE_REPLICA')
+        while True:
+            start = time.perf_counter()
+            sync_replica()
+            self.stdout.write(self.style.SUCCESS(
+                f'Replica {replica_path()} synced in {time.perf_counter() - start:.2f} s'))
+            if not options['interval']:
+                return
+            time.sleep(max(0.0, options['interval'] - (time.perf_counter() - start)))
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-19 18:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0014_powerup_userpowerup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='badge',
+            name='rule',
+            field=models.CharField(choices=[('manual', 'Awarded manually'), ('total_score', 'Total score of at least N'), ('story_completed', 'Story completed'), ('power_ups_used', 'At least N power-ups used')], default='manual', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='badge',
+            name='rule_story',
+            field=models.ForeignKey(blank=True, help_text='Story to complete for the story completed rule', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='badges', to='game.story'),
+        ),
+        migrations.AddField(
+            model_name='badge',
+            name='threshold',
+            field=models.PositiveIntegerField(blank=True, help_text='N for the total score and power-ups used rules', null=True),
+        ),
+    ]
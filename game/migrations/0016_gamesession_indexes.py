@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-19 19:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0015_badge_rules'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['user', 'story', 'start_time'], name='game_gamese_user_id_d7e5fc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['user', 'start_time'], name='game_gamese_user_id_b2216c_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.1 on 2026-10-19 19:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0016_gamesession_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActionStats',
+            fields=[
+                ('action', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='game.action')),
+                ('chosen', models.PositiveBigIntegerField(default=0)),
+                ('chosen_first', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Action statistics',
+                'verbose_name_plural': 'Action statistics',
+            },
+        ),
+        migrations.CreateModel(
+            name='ScenarioStats',
+            fields=[
+                ('scenario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='game.scenario')),
+                ('answers', models.PositiveBigIntegerField(default=0)),
+                ('correct', models.PositiveBigIntegerField(default=0)),
+                ('first_answers', models.PositiveBigIntegerField(default=0)),
+                ('first_correct', models.PositiveBigIntegerField(default=0)),
+                ('time_ms_total', models.PositiveBigIntegerField(default=0)),
+                ('time_2s', models.PositiveBigIntegerField(default=0)),
+                ('time_5s', models.PositiveBigIntegerField(default=0)),
+                ('time_10s', models.PositiveBigIntegerField(default=0)),
+                ('time_30s', models.PositiveBigIntegerField(default=0)),
+                ('time_60s', models.PositiveBigIntegerField(default=0)),
+                ('time_longer', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Scenario statistics',
+                'verbose_name_plural': 'Scenario statistics',
+            },
+        ),
+    ]
@@ -4,6 +4,8 @@ import uuid
 from datetime import timedelta
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 def get_expiry():
     return timezone.now() + timedelta(days=7)
@@ -70,14 +72,34 @@ class LeaderboardEntry(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.story.title}"
 
+class BadgeRule(models.TextChoices):
+    MANUAL = 'manual', 'Awarded manually'
+    TOTAL_SCORE = 'total_score', 'Total score of at least N'
+    STORY_COMPLETED = 'story_completed', 'Story completed'
+    POWER_UPS_USED = 'power_ups_used', 'At least N power-ups used'
+
+
 class Badge(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField()
     image = models.ImageField(upload_to='badge_images/', null=True, blank=True)
 
+    # Declarative award condition, evaluated by game.badges
+    rule = models.CharField(max_length=20, choices=BadgeRule.choices, default=BadgeRule.MANUAL)
+    threshold = models.PositiveIntegerField(null=True, blank=True,
+        help_text='N for the total score and power-ups used rules')
+    rule_story = models.ForeignKey(Story, null=True, blank=True, on_delete=models.CASCADE, related_name='badges',
+        help_text='Story to complete for the story completed rule')
+
     def __str__(self):
         return self.name
 
+    def clean(self):
+        if self.rule in (BadgeRule.TOTAL_SCORE, BadgeRule.POWER_UPS_USED) and self.threshold is None:
+            raise ValidationError({'threshold': 'This rule needs a threshold.'})
+        if self.rule == BadgeRule.STORY_COMPLETED and self.rule_story_id is None:
+            raise ValidationError({'rule_story': 'This rule needs a story.'})
+
 class GameSession(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     story = models.ForeignKey(Story, on_delete=models.CASCADE)
@@ -86,6 +108,13 @@ class GameSession(models.Model):
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        # A player's history, newest first, in all stories or one (the session list and stats)
+        indexes = [
+            models.Index(fields=['user', 'story', 'start_time']),
+            models.Index(fields=['user', 'start_time']),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.story.title} - {self.start_time}"
 
@@ -111,10 +140,26 @@ class UserProgress(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.story.title} - Level {self.level}"
 
+class Challenge(models.Model):
+    """
+    A batch of invites to one story sent together, e.g. to a whole class
+    (game.invites). The inviter's score is read once, when the challenge is
+    made, and every invite in it shows that score.
+    """
+    inviter = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='challenges', on_delete=models.CASCADE)
+    story = models.ForeignKey(Story, on_delete=models.CASCADE)
+    inviter_score = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=get_expiry)
+
+    def __str__(self):
+        return f"Challenge from {self.inviter.username} for story {self.story.title}"
+
 class GameInvite(models.Model):
     inviter = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='sent_invites', on_delete=models.CASCADE)
     token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     story = models.ForeignKey(Story, on_delete=models.CASCADE)
+    challenge = models.ForeignKey(Challenge, related_name='invites', null=True, blank=True, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(default=get_expiry)  # Correctly using get_expiry
     
@@ -284,4 +329,81 @@ class UserPowerUp(models.Model):
         self.is_active = False
         self.used_at = timezone.now()
         self.save()
-        return True
\ No newline at end of file
+        return True
+
+
+class ScenarioStats(models.Model):
+    """
+    How players answer a scenario, counted incrementally by game.analytics.
+    "First" counts only a player's first try at the scenario; the time_*
+    columns are a histogram of the time taken to answer.
+    """
+    scenario = models.OneToOneField(Scenario, primary_key=True, related_name='stats', on_delete=models.CASCADE)
+    answers = models.PositiveBigIntegerField(default=0)
+    correct = models.PositiveBigIntegerField(default=0)
+    first_answers = models.PositiveBigIntegerField(default=0)
+    first_correct = models.PositiveBigIntegerField(default=0)
+    time_ms_total = models.PositiveBigIntegerField(default=0)
+    time_2s = models.PositiveBigIntegerField(default=0)
+    time_5s = models.PositiveBigIntegerField(default=0)
+    time_10s = models.PositiveBigIntegerField(default=0)
+    time_30s = models.PositiveBigIntegerField(default=0)
+    time_60s = models.PositiveBigIntegerField(default=0)
+    time_longer = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Scenario statistics'
+        verbose_name_plural = 'Scenario statistics'
+
+    def __str__(self):
+        return f"Answers to {self.scenario_id}: {self.correct}/{self.answers} correct"
+
+
+class ActionStats(models.Model):
+    """How often an action is chosen, overall and on first tries (game.analytics)."""
+    action = models.OneToOneField(Action, primary_key=True, related_name='stats', on_delete=models.CASCADE)
+    chosen = models.PositiveBigIntegerField(default=0)
+    chosen_first = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Action statistics'
+        verbose_name_plural = 'Action statistics'
+
+    def __str__(self):
+        return f"Action {self.action_id} chosen {self.chosen} times"
+
+
+# Award rule-based badges as the events they depend on happen
+@receiver(post_save, sender=LeaderboardEntry)
+def award_score_badges(sender, instance, raw=False, **kwargs):
+    if not raw and instance.user_id:
+        from .badges import award_badges
+        award_badges(instance.user_id, BadgeRule.TOTAL_SCORE)
+
+
+@receiver(post_save, sender=GameSession)
+def award_story_badges(sender, instance, raw=False, **kwargs):
+    if not raw and instance.completed:
+        from .badges import award_badges
+        award_badges(instance.user_id, BadgeRule.STORY_COMPLETED)
+
+
+@receiver(post_save, sender=UserPowerUp)
+def award_power_up_badges(sender, instance, raw=False, **kwargs):
+    if not raw and not instance.is_active:
+        from .badges import award_badges
+        award_badges(instance.user_id, BadgeRule.POWER_UPS_USED)
+
+
+# Drop cached API responses (truthquest.cache) built from rows that change.
+# Content is tagged by model; a player's own data by model and user.
+@receiver([post_save, post_delete])
+def invalidate_cached_responses(sender, instance, raw=False, **kwargs):
+    if raw or sender._meta.app_label != 'game':
+        return
+    from truthquest.cache import invalidate_tags
+    tag = sender._meta.label_lower
+    if sender in (Story, Level, Scenario, Action, Outcome, Animation, PowerUp, LeaderboardEntry):
+        invalidate_tags(tag)
+    elif sender in (UserProgress, UserPowerUp, GameSession):
+        invalidate_tags(f'{tag}:{instance.user_id}')
@@ -0,0 +1,17 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ProfileCursorPagination(CursorPagination):
+    """Keyset pagination over profile ids: each page costs the same however deep it is."""
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class GameSessionCursorPagination(CursorPagination):
+    """A player's sessions, newest first, paginated on the (user, start_time) index."""
+    ordering = ('-start_time', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -1,29 +1,34 @@
 from rest_framework import serializers
 import random
+from django.conf import settings
 from .models import Story, Level, Scenario, Action, LeaderboardEntry, Badge, GameSession, GameInvite, Outcome, Animation, UserProgress, PowerUp, UserPowerUp, PowerUpType
 from accounts.models import UserProfile
+from truthquest.fieldsets import SparseFieldsSerializerMixin
 
-class OutcomeSerializer(serializers.ModelSerializer):
+class OutcomeSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Outcome
         fields = ['id', 'text']
 
-class ActionSerializer(serializers.ModelSerializer):
+class ActionSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     outcome = OutcomeSerializer(read_only=True)
     
     class Meta:
         model = Action
         fields = ['id', 'text', 'is_correct', 'points', 'outcome']
 
-class LevelSerializer(serializers.ModelSerializer):
+class LevelSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Level
         fields = ['id', 'title', 'story', 'image', 'order', 'intro_text']
 
-class ScenarioSerializer(serializers.ModelSerializer):
+class ScenarioSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     actions = serializers.SerializerMethodField()
 
+    field_columns = {'actions': []}
+    field_prefetches = {'actions': ['actions__outcome']}
+
     class Meta:
         model = Scenario
         fields = ['id', 'story', 'level', 'description', 'image', 'order', 'actions']
@@ -36,7 +41,12 @@ class ScenarioSerializer(serializers.ModelSerializer):
         # Serialize the shuffled actions
         return ActionSerializer(actions, many=True).data
 
-class StorySerializer(serializers.ModelSerializer):
+def shuffle_actions(scenarios):
+    """Serialized scenarios with their actions in a new random order, for responses served from a cache."""
+    return [{**scenario, 'actions': random.sample(scenario['actions'], len(scenario['actions']))}
+            if 'actions' in scenario else scenario for scenario in scenarios]
+
+class StorySerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     levels = LevelSerializer(many=True, read_only=True)
     scenarios = ScenarioSerializer(many=True, read_only=True)
 
@@ -44,7 +54,7 @@ class StorySerializer(serializers.ModelSerializer):
         model = Story
         fields = ['id', 'title', 'description', 'image', 'levels', 'scenarios']
 
-class LeaderboardEntrySerializer(serializers.ModelSerializer):
+class LeaderboardEntrySerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
 
     class Meta:
@@ -52,27 +62,49 @@ class LeaderboardEntrySerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'score', 'created_at']
         read_only_fields = ['user', 'created_at']
 
-class BadgeSerializer(serializers.ModelSerializer):
+class BadgeSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Badge
         fields = ['id', 'name', 'description', 'image']
 
-class GameSessionSerializer(serializers.ModelSerializer):
+class GameSessionSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = GameSession
         fields = ['id', 'user', 'story', 'score', 'completed', 'start_time', 'end_time']
 
-class GameInviteSerializer(serializers.ModelSerializer):
+class GameCompletionSerializer(serializers.Serializer):
+    """Input of ``game-sessions/<id>/complete/``; see game.completion."""
+    score = serializers.IntegerField()
+    completed = serializers.BooleanField(default=True)  # false after a game over
+    level = serializers.IntegerField(default=0, min_value=0)  # the level reached, where a game over resumes
+
+class AnswerSerializer(serializers.Serializer):
+    """An answer counted by game.analytics."""
+    action_id = serializers.IntegerField()
+    attempt = serializers.IntegerField(default=1, min_value=1)  # 1 for the player's first try at the scenario
+    time_ms = serializers.IntegerField(required=False, min_value=0)  # from showing the scenario to answering
+
+class GameInviteSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = GameInvite
-        fields = ['id', 'inviter', 'story', 'token', 'created_at', 'expires_at']
-        read_only_fields = ['id', 'inviter', 'token', 'created_at', 'expires_at']
+        fields = ['id', 'inviter', 'story', 'challenge', 'token', 'created_at', 'expires_at']
+        read_only_fields = ['id', 'inviter', 'challenge', 'token', 'created_at', 'expires_at']
 
-class AnimationSerializer(serializers.ModelSerializer):
+class ChallengeSerializer(serializers.Serializer):
+    """Input of ``invites/bulk/``; see game.invites."""
+    story = serializers.PrimaryKeyRelatedField(queryset=Story.objects.all())
+    count = serializers.IntegerField(min_value=1, max_value=settings.CHALLENGE_MAX_INVITES)
+
+class AnimationSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     file_url = serializers.SerializerMethodField()
     file_type = serializers.SerializerMethodField()
     animation_type_display = serializers.CharField(source='get_animation_type_display', read_only=True)
-    
+
+    field_columns = {
+        'file_url': ['gif_file', 'mp4_file'],
+        'file_type': ['gif_file', 'mp4_file'],
+    }
+
     class Meta:
         model = Animation
         fields = ['id', 'story', 'animation_type', 'animation_type_display', 'title', 
@@ -100,7 +132,7 @@ class AnimationSerializer(serializers.ModelSerializer):
         return None
 
 
-class UserProgressSerializer(serializers.ModelSerializer):
+class UserProgressSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     story_title = serializers.CharField(source='story.title', read_only=True)
     
@@ -111,7 +143,7 @@ class UserProgressSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'username', 'story_title', 'last_updated']
 
 
-class PowerUpSerializer(serializers.ModelSerializer):
+class PowerUpSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     story_title = serializers.CharField(source='story.title', read_only=True)
     power_up_type_display = serializers.CharField(source='get_power_up_type_display', read_only=True)
     
@@ -123,7 +155,7 @@ class PowerUpSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'story_title', 'created_at']
 
 
-class UserPowerUpSerializer(serializers.ModelSerializer):
+class UserPowerUpSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     power_up_name = serializers.CharField(source='power_up.name', read_only=True)
     power_up_type = serializers.CharField(source='power_up.power_up_type', read_only=True)
@@ -0,0 +1,84 @@
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from game.analytics import flush, get_buffer
+from game.models import Action, ActionStats, Level, Scenario, ScenarioStats, Story
+
+
+class AnswerAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.story = Story.objects.create(title='Truth Quest', description='x')
+        level = Level.objects.create(story=cls.story, title='Level 1', order=1)
+        cls.easy = Scenario.objects.create(story=cls.story, level=level, order=1, description='Easy')
+        cls.hard = Scenario.objects.create(story=cls.story, level=level, order=2, description='Hard')
+        cls.right, cls.wrong = [Action.objects.create(scenario=cls.hard, text=text, is_correct=text == 'Check')
+                                for text in ('Check', 'Share')]
+        cls.easy_right = Action.objects.create(scenario=cls.easy, text='Ask', is_correct=True)
+        cls.player = User.objects.create_user(username='ama', email='ama@example.com', password=None)
+        cls.teacher = User.objects.create_user(username='mensah', email='mensah@example.com', password=None,
+                                               is_staff=True)
+
+    def setUp(self):
+        caches['responses'].clear()
+        get_buffer().drain()
+
+    def auth(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+    def answer(self, data):
+        return self.client.post('/api/game/answers/', data, content_type='application/json', **self.auth(self.player))
+
+    def test_answers_are_buffered_then_counted_with_increments(self):
+        answers = [
+            {'action_id': self.wrong.pk, 'time_ms': 1500},
+            {'action_id': self.wrong.pk, 'time_ms': 8000},
+            {'action_id': self.right.pk, 'attempt': 2, 'time_ms': 90000},
+            {'action_id': self.easy_right.pk},
+            {'action_id': 0},
+        ]
+        self.assertEqual(self.answer(answers).json(), {'recorded': 4})
+        self.assertFalse(ScenarioStats.objects.exists())
+
+        # Two scenarios, three actions: a bulk insert and one UPDATE each, inside a savepoint
+        with self.assertNumQueries(9):
+            self.assertEqual(flush(), 4)
+        stats = ScenarioStats.objects.get(scenario=self.hard)
+        self.assertEqual((stats.answers, stats.correct, stats.first_answers, stats.first_correct), (3, 1, 2, 0))
+        self.assertEqual((stats.time_2s, stats.time_10s, stats.time_longer, stats.time_ms_total), (1, 1, 1, 99500))
+        self.assertEqual(ActionStats.objects.get(action=self.wrong).chosen_first, 2)
+
+        # Later answers add to the stored counters
+        with override_settings(ANALYTICS_FLUSH_INTERVAL=0):
+            self.answer({'action_id': self.right.pk})
+        stats.refresh_from_db()
+        self.assertEqual((stats.answers, stats.first_correct), (4, 1))
+
+    def test_report(self):
+        with override_settings(ANALYTICS_FLUSH_INTERVAL=0):
+            self.answer([{'action_id': self.wrong.pk, 'time_ms': 3000}] * 3 +
+                        [{'action_id': self.right.pk, 'time_ms': 1000}] + [{'action_id': self.easy_right.pk}])
+        path = '/api/game/analytics/scenarios/'
+        self.assertEqual(self.client.get(path, **self.auth(self.player)).status_code, 403)
+        for param in ('story_id', 'level_id'):
+            response = self.client.get(path, {param: 'abc'}, **self.auth(self.teacher))
+            self.assertEqual((response.status_code, response.json()), (400, {'error': f'{param} must be an integer.'}))
+
+        self.client.get(path, **self.auth(self.teacher))
+        # Scenarios with their counters, actions with theirs
+        caches['responses'].clear()
+        with self.assertNumQueries(2):
+            rows = self.client.get(path, {'sort': 'hardest'}, **self.auth(self.teacher)).json()
+        hard = rows[0]
+        self.assertEqual(hard['id'], self.hard.pk)
+        self.assertEqual((hard['answers'], hard['first_try_accuracy'], hard['average_time_ms']), (4, 0.25, 2500))
+        self.assertEqual(hard['time_histogram'], {'2s': 1, '5s': 3, '10s': 0, '30s': 0, '60s': 0, 'longer': 0})
+        self.assertEqual([(action['text'], action['chosen'], action['share']) for action in hard['actions']],
+                         [('Check', 1, 0.25), ('Share', 3, 0.75)])
+        self.assertEqual((rows[1]['accuracy'], rows[1]['average_time_ms']), (1.0, None))
+
+        # Served from the response cache
+        with self.assertNumQueries(0):
+            self.client.get(path, {'sort': 'hardest'}, **self.auth(self.teacher))
@@ -0,0 +1,103 @@
+import gzip
+
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from game.models import Action, Animation, LeaderboardEntry, Level, Outcome, Scenario, Story, UserProgress
+
+# Media URLs from local files, whatever STORAGE_BACKEND the settings were loaded with
+FILE_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class AsyncReadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.story = Story.objects.create(title='Truth Quest', description='x')
+        cls.level = Level.objects.create(story=cls.story, title='Level 1', order=1)
+        for order in range(3):
+            scenario = Scenario.objects.create(story=cls.story, level=cls.level, order=order, description=f'S{order}')
+            for i in range(3):
+                action = Action.objects.create(scenario=scenario, text=f'A{i}', is_correct=i == 0, points=10)
+                Outcome.objects.create(action=action, text=f'O{i}')
+        Animation.objects.create(story=cls.story, animation_type='intro', title='Intro', mp4_file='animations/mp4/a.mp4')
+        cls.user = User.objects.create_user(username='ama', email='ama@example.com', password=None)
+        LeaderboardEntry.objects.create(user=cls.user, story=cls.story, score=40)
+        UserProgress.objects.create(user=cls.user, story=cls.story, level=1, score=20)
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    def assertSameAsSync(self, sync_path, async_path, **extra):
+        expected = self.client.get(sync_path, **extra)
+        response = self.client.get(async_path, **extra)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        return response
+
+    @override_settings(STORAGES=FILE_STORAGES)
+    def test_matches_sync_endpoints(self):
+        story_id = self.story.pk
+        self.assertSameAsSync(f'/api/game/stories/{story_id}/', f'/api/game/async/stories/{story_id}/')
+        self.assertSameAsSync('/api/game/stories/999/', '/api/game/async/stories/999/')
+        self.assertSameAsSync(f'/api/game/animations/by-type/intro/?story_id={story_id}',
+                              f'/api/game/async/animations/by-type/intro/?story_id={story_id}')
+        self.assertSameAsSync(f'/api/game/animations/by-type/outro/?story_id={story_id}',
+                              f'/api/game/async/animations/by-type/outro/?story_id={story_id}')
+        self.assertSameAsSync('/api/game/leaderboard/top-scores/', '/api/game/async/leaderboard/top-scores/')
+        self.assertSameAsSync(f'/api/game/user-progress/get-progress/?story_id={story_id}',
+                              f'/api/game/async/user-progress/get-progress/?story_id={story_id}', **self.auth)
+        self.assertSameAsSync('/api/game/user-progress/get-progress/?story_id=999',
+                              '/api/game/async/user-progress/get-progress/?story_id=999', **self.auth)
+        self.assertSameAsSync(f'/api/game/user-progress/get-progress/?story_id={story_id}',
+                              f'/api/game/async/user-progress/get-progress/?story_id={story_id}')
+        self.assertSameAsSync(f'/api/game/user-progress/get-progress/?story_id={story_id}',
+                              f'/api/game/async/user-progress/get-progress/?story_id={story_id}',
+                              HTTP_AUTHORIZATION='Bearer not-a-token')
+
+    def test_scenarios_match_up_to_action_order(self):
+        path = f'stories/{self.story.pk}/levels/{self.level.pk}/scenarios/'
+        expected = self.client.get(f'/api/game/{path}').json()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/game/async/{path}')
+        self.assertLessEqual(len(queries), 2)
+        data = response.json()
+        for scenario in expected + data:
+            scenario['actions'].sort(key=lambda action: action['id'])
+        self.assertEqual(data, expected)
+
+    def test_top_scores_are_cached(self):
+        self.assertEqual(self.client.get('/api/game/async/leaderboard/top-scores/').json(),
+                         [{'username': 'ama', 'score': 40}])
+        LeaderboardEntry.objects.filter(user=self.user).update(score=90)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/game/async/leaderboard/top-scores/')
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(response.json(), [{'username': 'ama', 'score': 40}])
+
+    @override_settings(COMPRESSION_MIN_SIZE=100)
+    def test_story_bundle_is_precompressed(self):
+        path = f'/api/game/async/stories/{self.story.pk}/'
+        plain = self.client.get(path)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    async def test_served_by_asgi_handler(self):
+        response = await self.async_client.get(f'/api/game/async/stories/{self.story.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], 'Truth Quest')
+        response = await self.async_client.get(f'/api/game/async/user-progress/get-progress/?story_id={self.story.pk}',
+                                               headers={'Authorization': self.auth['HTTP_AUTHORIZATION']})
+        self.assertEqual(response.json()['score'], 20)
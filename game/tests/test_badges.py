@@ -0,0 +1,78 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from accounts.models import User
+from game.badges import award_badges, backfill_badges
+from game.models import (Badge, BadgeRule, GameSession, LeaderboardEntry, PowerUp, Story, UserPowerUp)
+
+
+class BadgeRuleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.story = Story.objects.create(title='Truth Quest', description='x')
+        cls.other_story = Story.objects.create(title='Fake or Fact', description='y')
+        cls.user = User.objects.create_user(username='ama', email='ama@example.com', password=None)
+        cls.high_scorer = Badge.objects.create(name='High scorer', description='x', rule=BadgeRule.TOTAL_SCORE,
+                                               threshold=100)
+        cls.finisher = Badge.objects.create(name='Finisher', description='x', rule=BadgeRule.STORY_COMPLETED,
+                                            rule_story=cls.story)
+        cls.power_user = Badge.objects.create(name='Power user', description='x', rule=BadgeRule.POWER_UPS_USED,
+                                              threshold=2)
+        cls.power_up = PowerUp.objects.create(name='Extra life', story=cls.story, description='x')
+
+    def badges(self, user=None):
+        return set((user or self.user).profile.badges.values_list('name', flat=True))
+
+    def test_total_score_across_stories(self):
+        LeaderboardEntry.objects.create(user=self.user, story=self.story, score=60)
+        self.assertEqual(self.badges(), set())
+        LeaderboardEntry.objects.create(user=self.user, story=self.other_story, score=40)
+        self.assertEqual(self.badges(), {'High scorer'})
+
+    def test_story_completed(self):
+        session = GameSession.objects.create(user=self.user, story=self.other_story, completed=True)
+        self.assertEqual(self.badges(), set())
+        session = GameSession.objects.create(user=self.user, story=self.story)
+        session.completed = True
+        session.save()
+        self.assertEqual(self.badges(), {'Finisher'})
+
+    def test_power_ups_used(self):
+        for _ in range(2):
+            UserPowerUp.objects.create(user=self.user, power_up=self.power_up).use()
+        self.assertEqual(self.badges(), {'Power user'})
+
+    def test_award_costs_constant_queries(self):
+        for i in range(10):
+            Badge.objects.create(name=f'Score {i}', description='x', rule=BadgeRule.TOTAL_SCORE, threshold=i)
+        LeaderboardEntry.objects.bulk_create([LeaderboardEntry(user=self.user, story=self.story, score=500)])
+        # badges, score sum, profile id, badges held, insert
+        with self.assertNumQueries(5):
+            earned = award_badges(self.user.pk, BadgeRule.TOTAL_SCORE)
+        self.assertEqual(len(earned), 11)
+        # Badges already held are neither inserted nor returned again.
+        with self.assertNumQueries(4):
+            self.assertEqual(award_badges(self.user.pk, BadgeRule.TOTAL_SCORE), [])
+
+    def test_backfill(self):
+        users = User.objects.bulk_create([User(username=f'p{i}', email=f'p{i}@example.com') for i in range(5)])
+        # Written in bulk, so no receivers ran.
+        LeaderboardEntry.objects.bulk_create([
+            LeaderboardEntry(user=user, story=self.story, score=50 * i) for i, user in enumerate(users)
+        ])
+        GameSession.objects.bulk_create([GameSession(user=users[0], story=self.story, completed=True)])
+        users[4].profile.badges.add(self.high_scorer)
+
+        self.assertEqual(backfill_badges(), {'High scorer': 2, 'Finisher': 1, 'Power user': 0})
+        self.assertEqual(self.badges(users[2]), {'High scorer'})
+        self.assertEqual(self.badges(users[0]), {'Finisher'})
+        self.assertEqual(backfill_badges(), {'High scorer': 0, 'Finisher': 0, 'Power user': 0})
+
+    def test_command(self):
+        LeaderboardEntry.objects.bulk_create([LeaderboardEntry(user=self.user, story=self.story, score=150)])
+        out = StringIO()
+        call_command('award_badges', '--badge', 'High scorer', stdout=out)
+        self.assertIn('High scorer: awarded to 1 user(s)', out.getvalue())
+        self.assertEqual(self.badges(), {'High scorer'})
@@ -0,0 +1,86 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from game.models import Badge, BadgeRule, GameSession, LeaderboardEntry, Story, UserProgress
+
+
+class CompleteSessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.story = Story.objects.create(title='Truth Quest', description='x')
+        cls.user = User.objects.create_user(username='ama', email='ama@example.com', password=None)
+        Badge.objects.create(name='High scorer', description='x', rule=BadgeRule.TOTAL_SCORE, threshold=100)
+        Badge.objects.create(name='Finisher', description='x', rule=BadgeRule.STORY_COMPLETED, rule_story=cls.story)
+        UserProgress.objects.create(user=cls.user, story=cls.story, level=2, score=90, lives=1, scenario_index=3)
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        self.session = GameSession.objects.create(user=self.user, story=self.story)
+
+    def complete(self, session=None, **data):
+        return self.client.post(f'/api/game/game-sessions/{(session or self.session).pk}/complete/', data,
+                                content_type='application/json')
+
+    def test_completion(self):
+        LeaderboardEntry.objects.create(user=self.user, story=self.story, score=80)
+        self.client.get('/api/game/game-sessions/')  # authenticated user cached
+        # Session, savepoint, its update, leaderboard read and upsert, profile read and update,
+        # progress upsert, badges, score total, stories completed, badges held, badge insert, release
+        with self.assertNumQueries(14):
+            response = self.complete(score=120)
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['session']['completed'])
+        self.assertIsNotNone(data['session']['end_time'])
+        self.assertEqual((data['best_score'], data['high_score'], data['new_high_score']), (120, 120, True))
+        self.assertEqual({badge['name'] for badge in data['badges_awarded']}, {'High scorer', 'Finisher'})
+        self.assertEqual((data['progress']['level'], data['progress']['score'], data['progress']['lives']), (0, 0, 3))
+
+        progress = UserProgress.objects.get(user=self.user, story=self.story)
+        self.assertEqual((progress.pk, progress.level, progress.scenario_index), (data['progress']['id'], 0, 0))
+        self.assertEqual(LeaderboardEntry.objects.get(user=self.user).score, 120)
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.high_scores, {str(self.story.pk): 120})
+        self.assertEqual(self.user.profile.badges.count(), 2)
+
+    def test_retry_changes_nothing(self):
+        first = self.complete(score=50).json()
+        retry = self.complete(score=500).json()
+        self.assertTrue(retry['already_completed'])
+        self.assertEqual(retry['session'], first['session'])
+        self.assertEqual((retry['best_score'], retry['badges_awarded']), (50, []))
+        self.assertEqual(GameSession.objects.get(pk=self.session.pk).score, 50)
+        self.assertEqual(LeaderboardEntry.objects.get(user=self.user).score, 50)
+
+    def test_badges_are_awarded_once(self):
+        self.assertEqual(len(self.complete(score=120).json()['badges_awarded']), 2)
+        data = self.complete(GameSession.objects.create(user=self.user, story=self.story), score=130).json()
+        self.assertEqual(data['badges_awarded'], [])
+        self.assertEqual(self.user.profile.badges.count(), 2)
+
+    def test_game_over_keeps_best_score(self):
+        self.complete(score=70)
+        data = self.complete(GameSession.objects.create(user=self.user, story=self.story),
+                             score=30, completed=False, level=1).json()
+        self.assertEqual((data['best_score'], data['high_score'], data['new_high_score']), (70, 70, False))
+        self.assertFalse(data['session']['completed'])
+        self.assertEqual(data['progress']['level'], 1)
+        self.assertEqual(data['badges_awarded'], [])
+
+    def test_failure_rolls_everything_back(self):
+        with mock.patch('game.completion.award_badges', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self.complete(score=120)
+        self.assertIsNone(GameSession.objects.get(pk=self.session.pk).end_time)
+        self.assertFalse(LeaderboardEntry.objects.exists())
+        self.assertEqual(UserProgress.objects.get(user=self.user).level, 2)
+
+    def test_validation_and_ownership(self):
+        self.assertEqual(self.complete().status_code, 400)
+        other = User.objects.create_user(username='kofi', email='kofi@example.com', password=None)
+        self.assertEqual(self.complete(GameSession.objects.create(user=other, story=self.story),
+                                       score=10).status_code, 404)
@@ -0,0 +1,53 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import User, UserProfile
+from game.dataset import build_user_chunk
+from game.models import Action, GameSession, LeaderboardEntry, Outcome, Scenario, Story, UserPowerUp, UserProgress
+
+
+class DatasetTests(TestCase):
+    def generate(self, users=60, **options):
+        call_command('generate_dataset', users=users, stories=2, levels=2, scenarios=3, actions=3, chunk_size=25,
+                     stdout=StringIO(), **options)
+
+    def test_counts_and_consistency(self):
+        self.generate()
+        self.assertEqual(Story.objects.count(), 2)
+        self.assertEqual(Scenario.objects.count(), 2 * 2 * 3)
+        self.assertEqual(Action.objects.count(), Outcome.objects.count())
+        self.assertEqual(Action.objects.filter(is_correct=True).count(), Scenario.objects.count())
+        self.assertEqual(User.objects.filter(username__startswith='player').count(), 60)
+        self.assertEqual(UserProfile.objects.count(), 60)
+
+        # Every leaderboard entry has the profile's high score, a progress row and sessions for its story
+        entries = LeaderboardEntry.objects.select_related('user__profile')
+        self.assertTrue(entries)
+        for entry in entries:
+            self.assertEqual(entry.user.profile.high_scores[str(entry.story_id)], entry.score)
+        self.assertEqual(UserProgress.objects.count(), len(entries))
+        self.assertEqual(GameSession.objects.values('user', 'story').distinct().count(), len(entries))
+        self.assertFalse(UserPowerUp.objects.filter(is_active=False, used_at__isnull=True).exists())
+        # Generated timestamps are kept rather than replaced with now()
+        self.assertLess(GameSession.objects.order_by('start_time').first().start_time,
+                        timezone.now() - timezone.timedelta(days=1))
+
+    def test_chunks_are_seeded(self):
+        stories = [{'id': 1, 'levels': 3, 'max_score': 150, 'power_ups': [1, 2]},
+                   {'id': 2, 'levels': 3, 'max_score': 150, 'power_ups': [3]}]
+        now = timezone.now()
+
+        def chunk(seed):
+            _, users, _ = build_user_chunk(seed, 3, 0, 20, 'p', 'hash', stories, now)
+            return [(user.username, user.date_joined, user.profile.high_scores) for user in users]
+
+        self.assertEqual(chunk(7), chunk(7))
+        self.assertNotEqual(chunk(7), chunk(8))
+
+    def test_existing_prefix(self):
+        User.objects.create_user(username='player0', email='p0@example.com', password=None)
+        with self.assertRaises(CommandError):
+            self.generate()
@@ -0,0 +1,71 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from game.exports import export_rows
+from game.models import GameSession, PowerUp, Story, UserPowerUp
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.story = Story.objects.create(title='Truth Quest', description='x')
+        other_story = Story.objects.create(title='Fake or Fact', description='y')
+        cls.player = User.objects.create_user(username='ama', email='ama@example.com', password=None)
+        cls.teacher = User.objects.create_user(username='mensah', email='mensah@example.com', password=None,
+                                               is_staff=True)
+        cls.sessions = [GameSession.objects.create(user=cls.player, story=cls.story, score=score)
+                        for score in range(5)]
+        GameSession.objects.create(user=cls.player, story=other_story, score=99)
+        GameSession.objects.filter(pk=cls.sessions[0].pk).update(start_time=timezone.now() - timedelta(days=30))
+        power_up = PowerUp.objects.create(name='Shield', story=cls.story, power_up_type='extra_life',
+                                          description='x')
+        UserPowerUp.objects.create(user=cls.player, power_up=power_up, game_session=cls.sessions[1])
+
+    def auth(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+    def test_pages_by_keyset(self):
+        # Five sessions two at a time: three pages, each a "pk > last" query, and the header
+        with self.assertNumQueries(3):
+            chunks = list(export_rows('sessions', story_id=self.story.pk, chunk_size=2))
+        self.assertEqual(len(chunks), 4)
+        rows = list(csv.DictReader(io.StringIO(b''.join(chunks).decode())))
+        self.assertEqual([int(row['score']) for row in rows], [0, 1, 2, 3, 4])
+        self.assertEqual((rows[0]['username'], rows[0]['completed']), ('ama', 'False'))
+
+    def test_endpoint(self):
+        path = '/api/game/exports/sessions/'
+        self.assertEqual(self.client.get(path, **self.auth(self.player)).status_code, 403)
+        self.assertEqual(self.client.get(path, {'as': 'xml'}, **self.auth(self.teacher)).status_code, 400)
+        self.assertEqual(self.client.get(path, {'since': 'May'}, **self.auth(self.teacher)).status_code, 400)
+
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        response = self.client.get(path, {'as': 'ndjson', 'story_id': self.story.pk, 'since': since},
+                                   **self.auth(self.teacher))
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="sessions-', response['Content-Disposition'])
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['score'] for row in rows], [1, 2, 3, 4])
+
+        response = self.client.get('/api/game/exports/power-ups/', **self.auth(self.teacher))
+        row, = csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode()))
+        self.assertEqual((row['power_up'], row['story_id'], row['game_session_id']),
+                         ('Shield', str(self.story.pk), str(self.sessions[1].pk)))
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sessions.csv')
+            call_command('export_data', 'sessions', '--story', str(self.story.pk), '--output', path,
+                         stdout=io.StringIO())
+            with open(path) as f:
+                self.assertEqual(len(list(csv.DictReader(f))), 5)
@@ -0,0 +1,100 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from game.models import (Action, Animation, Badge, GameInvite, GameSession, LeaderboardEntry, Level, Outcome, PowerUp,
+                         Scenario, Story, UserPowerUp, UserProgress)
+from game.serializers import (ActionSerializer, AnimationSerializer, PowerUpSerializer, StorySerializer,
+                              UserPowerUpSerializer)
+
+# Media URLs from local files, whatever STORAGE_BACKEND the settings were loaded with
+FILE_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class SparseFieldsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.story = Story.objects.create(title='Truth Quest', description='x')
+        cls.level = Level.objects.create(story=cls.story, title='Level 1', order=1)
+        scenario = Scenario.objects.create(story=cls.story, level=cls.level, order=1, description='S')
+        for i in range(3):
+            action = Action.objects.create(scenario=scenario, text=f'A{i}', is_correct=i == 0, points=10)
+            Outcome.objects.create(action=action, text=f'O{i}')
+        Animation.objects.create(story=cls.story, animation_type='intro', title='Intro', mp4_file='animations/mp4/a.mp4')
+        Badge.objects.create(name='Fact checker', description='x')
+        cls.user = User.objects.create_user(username='ama', email='ama@example.com', password=None)
+        session = GameSession.objects.create(user=cls.user, story=cls.story, score=30)
+        LeaderboardEntry.objects.create(user=cls.user, story=cls.story, score=40)
+        UserProgress.objects.create(user=cls.user, story=cls.story, level=1, score=20)
+        GameInvite.objects.create(inviter=cls.user, story=cls.story)
+        for i in range(3):
+            power_up = PowerUp.objects.create(name=f'Power {i}', story=cls.story, description='A long description')
+            UserPowerUp.objects.create(user=cls.user, power_up=power_up, game_session=session)
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+
+    @override_settings(STORAGES=FILE_STORAGES)
+    def test_full_output_unchanged(self):
+        # Without ?fields= every endpoint returns what the plain serializer renders from full rows
+        story_id = self.story.pk
+        cases = [
+            (f'/api/game/stories/{story_id}/', StorySerializer(self.story)),
+            ('/api/game/scenarios/0/actions/', ActionSerializer(Action.objects.all(), many=True)),
+            ('/api/game/animations/', AnimationSerializer(Animation.objects.all(), many=True)),
+            (f'/api/game/power-ups/by-story/{story_id}/', PowerUpSerializer(PowerUp.objects.all(), many=True)),
+            ('/api/game/user-power-ups/active/', UserPowerUpSerializer(UserPowerUp.objects.all(), many=True)),
+        ]
+        for path, serializer in cases:
+            with self.subTest(path=path):
+                serializer.context['request'] = self.client.get(path).wsgi_request
+                self.assertEqual(self.client.get(path).json(), serializer.data)
+        for path in ['leaderboard/', 'badges/', 'game-sessions/', 'invites/', 'user-progress/',
+                     f'stories/{story_id}/levels/', f'stories/{story_id}/levels/{self.level.pk}/scenarios/']:
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(f'/api/game/{path}').status_code, 200)
+
+    def test_sparse_fields_prune_columns_and_joins(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/game/power-ups/by-story/{self.story.pk}/', {'fields': 'id,name'})
+        self.assertEqual(response.json()[0], {'id': response.json()[0]['id'], 'name': 'Power 0'})
+        sql = queries[-1]['sql']
+        self.assertNotIn('description', sql)
+        self.assertNotIn('JOIN', sql)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/game/power-ups/', {'exclude': 'description,story_title'})
+        self.assertNotIn('description', response.json()[0])
+        self.assertNotIn('"description"', queries[-1]['sql'])
+
+    def test_related_fields_are_joined(self):
+        # One query for the user's power-ups with their power-up and user, however many
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/game/user-power-ups/active/')
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.json()[0]['username'], 'ama')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/game/scenarios/0/actions/', {'fields': 'text,outcome'})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('is_correct', queries[0]['sql'])
+        self.assertEqual({action['outcome']['text'] for action in response.json()}, {'O0', 'O1', 'O2'})
+
+        # Scenarios prefetch their actions and outcomes
+        path = f'/api/game/stories/{self.story.pk}/levels/{self.level.pk}/scenarios/'
+        with self.assertNumQueries(3):
+            self.client.get(path)
+        with self.assertNumQueries(1):
+            self.client.get(path, {'fields': 'id,description'})
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/game/power-ups/', {'exclude': 'secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('exclude', response.json())
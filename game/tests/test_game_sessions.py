@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from game.models import GameSession, Story
+
+
+class GameSessionListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.story = Story.objects.create(title='Truth Quest', description='x')
+        cls.other_story = Story.objects.create(title='Fake or Fact', description='y')
+        cls.user = User.objects.create_user(username='ama', email='ama@example.com', password=None)
+        other = User.objects.create_user(username='kofi', email='kofi@example.com', password=None)
+        GameSession.objects.create(user=other, story=cls.story, score=999, completed=True)
+        # Completed in 10, 20 and 30 minutes, plus one abandoned game in another story
+        for minutes, score in ((10, 40), (20, 80), (30, 60)):
+            session = GameSession.objects.create(user=cls.user, story=cls.story, score=score, completed=True)
+            session.end_time = session.start_time + timedelta(minutes=minutes)
+            session.save()
+        GameSession.objects.create(user=cls.user, story=cls.other_story, score=10)
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+
+    def test_list_is_scoped_and_paginated(self):
+        page = self.client.get('/api/game/game-sessions/', {'page_size': 3}).json()
+        self.assertEqual([session['score'] for session in page['results']], [10, 60, 80])
+        rest = self.client.get(page['next']).json()
+        self.assertEqual([session['score'] for session in rest['results']], [40])
+        self.assertIsNone(rest['next'])
+
+        stories = {session['story'] for session in
+                   self.client.get('/api/game/game-sessions/', {'story_id': self.story.pk}).json()['results']}
+        self.assertEqual(stories, {self.story.pk})
+        for path in ('/api/game/game-sessions/', '/api/game/game-sessions/stats/'):
+            response = self.client.get(path, {'story_id': 'abc'})
+            self.assertEqual((response.status_code, response.json()), (400, {'error': 'story_id must be an integer.'}))
+        self.client.defaults.pop('HTTP_AUTHORIZATION')
+        self.assertEqual(self.client.get('/api/game/game-sessions/').status_code, 401)
+
+    def test_sparse_page_loads_the_cursor_column(self):
+        self.client.get('/api/game/game-sessions/')  # authenticated user cached
+        # The cursor's start_time is loaded with the page, not per row
+        with self.assertNumQueries(1):
+            page = self.client.get('/api/game/game-sessions/', {'page_size': 2, 'fields': 'id,score'}).json()
+        self.assertEqual(set(page['results'][0]), {'id', 'score'})
+        self.assertIsNotNone(page['next'])
+
+    @override_settings(RESPONSE_CACHE_PER_USER=True)  # one process, so locmem reaches every request
+    def test_stats(self):
+        self.client.get('/api/game/game-sessions/')
+        with self.assertNumQueries(1):
+            stats = self.client.get('/api/game/game-sessions/stats/').json()
+        self.assertEqual(stats, {
+            'games_played': 4, 'games_completed': 3, 'average_score': 47.5, 'best_score': 80,
+            'total_playtime_seconds': 3600.0, 'best_time_seconds': 600.0,
+        })
+        stats = self.client.get('/api/game/game-sessions/stats/', {'story_id': self.other_story.pk}).json()
+        self.assertEqual((stats['games_played'], stats['best_time_seconds'], stats['total_playtime_seconds']),
+                         (1, None, None))
+
+        # Cached until the player's sessions change
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/game/game-sessions/stats/').json()['games_played'], 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            session = GameSession.objects.create(user=self.user, story=self.story)
+            self.client.post(f'/api/game/game-sessions/{session.pk}/complete/', {'score': 100},
+                             content_type='application/json')
+        stats = self.client.get('/api/game/game-sessions/stats/').json()
+        self.assertEqual((stats['games_played'], stats['best_score']), (5, 100))
@@ -0,0 +1,96 @@
+import json
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User, UserProfile
+from game.models import Challenge, GameInvite, Story
+
+
+class InviterScoreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.story = Story.objects.create(title='Truth Quest', description='x')
+        cls.inviter = User.objects.create_user(username='ama', email='ama@example.com', password=None)
+        UserProfile.objects.update_or_create(user=cls.inviter, defaults={'high_scores': {str(cls.story.pk): 120}})
+        cls.invite = GameInvite.objects.create(inviter=cls.inviter, story=cls.story)
+
+    def setUp(self):
+        caches['responses'].clear()
+
+    def test_resolved_by_token_in_one_query_then_cached(self):
+        path = f'/api/game/invites/{self.invite.token}/inviter-score/'
+        # Anyone holding the link may read it: no credentials needed
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(path).json(), {'username': 'ama', 'highest_score': 120})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(path).json()['highest_score'], 120)
+
+    def test_invites_are_private_to_their_inviter(self):
+        other = User.objects.create_user(username='kofi', email='kofi@example.com', password=None)
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(other).access_token}'}
+        self.assertEqual(self.client.get('/api/game/invites/', **auth).json(), [])
+        self.assertEqual(self.client.get(f'/api/game/invites/{self.invite.pk}/', **auth).status_code, 404)
+        self.assertEqual(self.client.delete(f'/api/game/invites/{self.invite.pk}/', **auth).status_code, 404)
+        self.assertTrue(GameInvite.objects.filter(pk=self.invite.pk).exists())
+
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.inviter).access_token}'}
+        tokens = [invite['token'] for invite in self.client.get('/api/game/invites/', **auth).json()]
+        self.assertEqual(tokens, [str(self.invite.token)])
+
+    def test_unknown_and_expired_invites(self):
+        other = GameInvite.objects.create(inviter=self.inviter, story=self.story,
+                                          expires_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(self.client.get(f'/api/game/invites/{other.token}/inviter-score/').status_code, 400)
+        other.delete()
+        self.assertEqual(self.client.get(f'/api/game/invites/{other.token}/inviter-score/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/game/invites/{self.invite.pk}/inviter-score/').status_code, 404)
+        for token in ('-' * 36, 'a' * 33):
+            self.assertEqual(self.client.get(f'/api/game/invites/{token}/inviter-score/').status_code, 404)
+
+
+class ChallengeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.story = Story.objects.create(title='Truth Quest', description='x')
+        cls.teacher = User.objects.create_user(username='mensah', email='mensah@example.com', password=None,
+                                               is_staff=True)
+        UserProfile.objects.update_or_create(user=cls.teacher, defaults={'high_scores': {str(cls.story.pk): 80}})
+        cls.player = User.objects.create_user(username='ama', email='ama@example.com', password=None)
+
+    def setUp(self):
+        caches['responses'].clear()
+
+    def challenge(self, user, data):
+        return self.client.post('/api/game/invites/bulk/', data, content_type='application/json',
+                                HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def test_bulk_invites_share_the_challenge_score(self):
+        self.assertEqual(self.challenge(self.player, {'story': self.story.pk, 'count': 3}).status_code, 403)
+        self.assertEqual(self.challenge(self.teacher, {'story': self.story.pk, 'count': 0}).status_code, 400)
+
+        response = self.challenge(self.teacher, {'story': self.story.pk, 'count': 300})
+        self.assertEqual(response.status_code, 201)
+        head, *lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual((head['inviter_score'], head['count'], len(lines)), (80, 300, 300))
+        self.assertEqual(GameInvite.objects.filter(challenge=head['challenge']).count(), 300)
+        self.assertEqual(len({line['token'] for line in lines}), 300)
+
+        # The score stored on the challenge, even after the teacher beats it
+        UserProfile.objects.filter(user=self.teacher).update(high_scores={str(self.story.pk): 150})
+        with self.assertNumQueries(1):
+            score = self.client.get(f"/api/game/invites/{lines[-1]['token']}/inviter-score/").json()
+        self.assertEqual(score, {'username': 'mensah', 'highest_score': 80})
+        self.assertEqual(Challenge.objects.get().invites.count(), 300)
+
+        self.teacher.is_superuser = True
+        self.teacher.save()
+        self.client.force_login(self.teacher)
+        storages = {'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+        with override_settings(STORAGES=storages):
+            self.assertContains(self.client.get('/admin/game/challenge/'),
+                                '<td class="field-invites_count">300</td>', html=True)
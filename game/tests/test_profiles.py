@@ -0,0 +1,61 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from accounts.models import User, UserProfile
+from game.models import Badge
+
+# Media URLs from local files, whatever STORAGE_BACKEND the settings were loaded with
+FILE_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class UserProfileListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([
+            User(username=f'pupil{i:02d}', email=f'pupil{i}@example.com') for i in range(12)
+        ])
+        badges = Badge.objects.bulk_create([Badge(name='Fact checker', description='x'),
+                                            Badge(name='Sharp eye', description='y')])
+        for user in users:
+            user.profile.badges.set(badges)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_cursor_pages_with_constant_queries(self):
+        # profiles page + prefetched badges, however many profiles and badges
+        with self.assertNumQueries(2):
+            first = self.client.get('/api/game/profiles/', {'page_size': 5}).json()
+        self.assertEqual([p['username'] for p in first['results']], [f'pupil{i:02d}' for i in range(5)])
+        self.assertEqual(len(first['results'][0]['badges']), 2)
+        self.assertIsNone(first['results'][0]['image_thumbnail'])
+
+        second = self.client.get(first['next']).json()
+        self.assertEqual(second['results'][0]['username'], 'pupil05')
+
+    def test_sparse_fields_limit_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/game/profiles/', {'fields': 'username,high_scores'})
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql']
+        self.assertNotIn('password', sql)
+        self.assertNotIn('entry_thumbnail', sql)
+        self.assertEqual(set(response.json()['results'][0]), {'username', 'high_scores'})
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/game/profiles/', {'fields': 'username,password'})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(STORAGES=FILE_STORAGES)
+    def test_thumbnail_url_does_not_render(self):
+        # The photo does not exist on disk; a just-in-time spec would try to render it.
+        UserProfile.objects.filter(user__username='pupil00').update(entry_thumbnail='profile_photos/pupil00.jpg')
+        response = self.client.get('/api/game/profiles/', {'fields': 'image_thumbnail,post_thumb', 'page_size': 1})
+        profile = response.json()['results'][0]
+        self.assertTrue(profile['image_thumbnail'].startswith('http://testserver/'))
+        self.assertNotEqual(profile['image_thumbnail'], profile['post_thumb'])
@@ -0,0 +1,89 @@
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from game.models import Action, Level, Outcome, Scenario, Story, UserProgress
+from truthquest.cache import response_key
+
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.story = Story.objects.create(title='Truth Quest', description='x')
+        cls.level = Level.objects.create(story=cls.story, title='Level 1', order=1)
+        scenario = Scenario.objects.create(story=cls.story, level=cls.level, order=1, description='S')
+        for i in range(4):
+            action = Action.objects.create(scenario=scenario, text=f'A{i}', is_correct=i == 0, points=10)
+            Outcome.objects.create(action=action, text=f'O{i}')
+        cls.ama = User.objects.create_user(username='ama', email='ama@example.com', password=None)
+        cls.kofi = User.objects.create_user(username='kofi', email='kofi@example.com', password=None)
+        for user, score in ((cls.ama, 20), (cls.kofi, 50)):
+            UserProgress.objects.create(user=user, story=cls.story, level=1, score=score)
+
+    def setUp(self):
+        caches['responses'].clear()
+
+    def auth(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+    def test_global_entry_invalidated_by_content_change(self):
+        path = f'/api/game/stories/{self.story.pk}/'
+        self.assertEqual(self.client.get(path).json()['title'], 'Truth Quest')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(path).json()['title'], 'Truth Quest')
+
+        # Tags are bumped once the change commits
+        with self.captureOnCommitCallbacks(execute=True):
+            Level.objects.create(story=self.story, title='Level 2', order=2)
+        self.assertEqual(len(self.client.get(path).json()['levels']), 2)
+
+    @override_settings(RESPONSE_CACHE_PER_USER=True)  # one process, so locmem reaches every request
+    def test_per_user_entries(self):
+        path = f'/api/game/user-progress/get-progress/?story_id={self.story.pk}'
+        self.assertEqual(self.client.get(path, **self.auth(self.ama)).json()['score'], 20)
+        self.assertEqual(self.client.get(path, **self.auth(self.kofi)).json()['score'], 50)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(path, **self.auth(self.ama)).json()['score'], 20)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/game/user-progress/save-progress/', {'story_id': self.story.pk, 'score': 30},
+                             content_type='application/json', **self.auth(self.ama))
+        self.assertEqual(self.client.get(path, **self.auth(self.ama)).json()['score'], 30)
+        # Kofi's entry was not invalidated by Ama's save
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(path, **self.auth(self.kofi)).json()['score'], 50)
+        # Nor are anonymous requests cached
+        self.assertEqual(self.client.get(path).status_code, 401)
+
+    @override_settings(RESPONSE_CACHE_PER_USER=False)
+    def test_per_user_entries_need_a_shared_cache(self):
+        # Another worker's copy would miss this worker's invalidation, so nothing is cached
+        path = f'/api/game/user-progress/get-progress/?story_id={self.story.pk}'
+        self.assertEqual(self.client.get(path, **self.auth(self.ama)).json()['score'], 20)
+        # update() sends no signal, so only an uncached read sees it
+        UserProgress.objects.filter(user=self.ama).update(score=25)
+        self.assertEqual(self.client.get(path, **self.auth(self.ama)).json()['score'], 25)
+
+    def test_cached_scenarios_are_reshuffled(self):
+        path = f'/api/game/stories/{self.story.pk}/levels/{self.level.pk}/scenarios/'
+        orders = {tuple(action['id'] for action in self.client.get(path).json()[0]['actions']) for _ in range(20)}
+        self.assertGreater(len(orders), 1)
+        self.assertEqual({len(order) for order in orders}, {4})
+
+    def test_stale_entry_served_while_rebuilt(self):
+        path = f'/api/game/stories/{self.story.pk}/'
+        self.client.get(path)
+        key = response_key(RequestFactory().get(path), None)
+        later = time.time() + 3600
+        cache = caches['responses']
+        # Another request is rebuilding the expired entry: serve the stale copy meanwhile
+        cache.add(f'{key}:lock', 1, 5)
+        with mock.patch('truthquest.cache.time.time', return_value=later), self.assertNumQueries(0):
+            self.assertEqual(self.client.get(path).status_code, 200)
+        cache.delete(f'{key}:lock')
+        with mock.patch('truthquest.cache.time.time', return_value=later), self.assertNumQueries(2):
+            self.client.get(path)
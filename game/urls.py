@@ -1,25 +1,37 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (StoryViewSet, LeaderboardEntryViewSet, UserProfileViewSet, 
                     LevelViewSet, ActionViewSet, BadgeViewSet, ScenarioViewSet,
                     GameSessionViewSet, GameInviteViewSet, AnimationViewSet,
-                    UserProgressViewSet, PowerUpViewSet, UserPowerUpViewSet)
+                    UserProgressViewSet, PowerUpViewSet, UserPowerUpViewSet, AnswerViewSet,
+                    ScenarioAnalyticsViewSet, ExportViewSet)
 
 router = DefaultRouter()
 router.register(r'stories', StoryViewSet)
 router.register(r'leaderboard', LeaderboardEntryViewSet)
 router.register(r'profiles', UserProfileViewSet)
 router.register(r'badges', BadgeViewSet)
-router.register(r'game-sessions', GameSessionViewSet)
+router.register(r'game-sessions', GameSessionViewSet, basename='gamesession')
 router.register(r'invites', GameInviteViewSet, basename='gameinvite')
 router.register(r'animations', AnimationViewSet, basename='animation')
 router.register(r'user-progress', UserProgressViewSet, basename='user-progress')
 router.register(r'power-ups', PowerUpViewSet, basename='power-up')
 router.register(r'user-power-ups', UserPowerUpViewSet, basename='user-power-up')
+router.register(r'answers', AnswerViewSet, basename='answer')
+router.register(r'analytics/scenarios', ScenarioAnalyticsViewSet, basename='scenario-analytics')
+router.register(r'exports', ExportViewSet, basename='export')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('stories/<int:story_id>/levels/', LevelViewSet.as_view({'get': 'list'}), name='story-levels'),
     path('stories/<int:story_id>/levels/<int:level_id>/scenarios/', ScenarioViewSet.as_view({'get': 'list'}), name='level-scenarios'),
     path('scenarios/<int:scenario_id>/actions/', ActionViewSet.as_view({'get': 'list'}), name='scenario-actions'),
-]
\ No newline at end of file
+
+    # Async (ASGI) versions of the hottest reads
+    path('async/stories/<int:story_id>/', async_views.story_bundle, name='async-story-bundle'),
+    path('async/stories/<int:story_id>/levels/<int:level_id>/scenarios/', async_views.level_scenarios, name='async-level-scenarios'),
+    path('async/animations/by-type/<str:animation_type>/', async_views.animation_by_type, name='async-animation-by-type'),
+    path('async/leaderboard/top-scores/', async_views.top_scores, name='async-top-scores'),
+    path('async/user-progress/get-progress/', async_views.get_progress, name='async-get-progress'),
+]
@@ -1,5 +1,8 @@
+import uuid
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from .models import Story, Scenario, Level, Action, LeaderboardEntry, Badge, GameSession, GameInvite, Animation, UserProgress, PowerUp, UserPowerUp, PowerUpType
 from accounts.models import UserProfile
@@ -12,20 +15,47 @@ from .serializers import (
     LeaderboardEntrySerializer,
     BadgeSerializer,
     GameSessionSerializer,
+    GameCompletionSerializer,
+    AnswerSerializer,
     GameInviteSerializer,
+    ChallengeSerializer,
     AnimationSerializer,
     UserProgressSerializer,
     PowerUpSerializer,
-    UserPowerUpSerializer
+    UserPowerUpSerializer,
+    shuffle_actions
 )
-from django.db.models import Max
-from rest_framework.permissions import IsAuthenticated
-
-class StoryViewSet(viewsets.ReadOnlyModelViewSet):
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min, Q, Sum
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from .analytics import record_answers, scenario_report
+from .completion import complete_session
+from .exports import EXPORTS, FORMATS, export_rows, parse_moment
+from .invites import create_challenge
+from .pagination import GameSessionCursorPagination, ProfileCursorPagination
+from truthquest.cache import cache_response
+from truthquest.fieldsets import SparseFieldsMixin
+from truthquest.renderers import dumps
+from truthquest.replica import ReplicaReadMixin
+from truthquest.sqlite import run_write
+
+# Response cache tags (truthquest.cache), bumped when rows of the model change; see game.models
+STORY_TAGS = ['game.story', 'game.level']
+SCENARIO_TAGS = ['game.scenario', 'game.action', 'game.outcome']
+ANIMATION_TAGS = ['game.animation', 'game.story']
+POWER_UP_TAGS = ['game.powerup', 'game.story']
+
+@method_decorator(cache_response(tags=STORY_TAGS), name='list')
+@method_decorator(cache_response(tags=STORY_TAGS), name='retrieve')
+class StoryViewSet(ReplicaReadMixin, SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Story.objects.all()
     serializer_class = StorySerializer
     
-class LevelViewSet(viewsets.ReadOnlyModelViewSet):
+@method_decorator(cache_response(tags=['game.level']), name='list')
+class LevelViewSet(ReplicaReadMixin, SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = LevelSerializer
 
     def get_queryset(self):
@@ -38,7 +68,8 @@ class LevelViewSet(viewsets.ReadOnlyModelViewSet):
         return Level.objects.none()
 
 
-class ScenarioViewSet(viewsets.ReadOnlyModelViewSet):
+@method_decorator(cache_response(tags=SCENARIO_TAGS, transform=shuffle_actions), name='list')
+class ScenarioViewSet(ReplicaReadMixin, SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = ScenarioSerializer
 
     def get_queryset(self):
@@ -48,11 +79,13 @@ class ScenarioViewSet(viewsets.ReadOnlyModelViewSet):
             return Scenario.objects.filter(story__id=story_id, level__id=level_id)
         return Scenario.objects.all()
 
-class ActionViewSet(viewsets.ReadOnlyModelViewSet):
+@method_decorator(cache_response(tags=['game.action', 'game.outcome']), name='list')
+@method_decorator(cache_response(tags=['game.action', 'game.outcome']), name='retrieve')
+class ActionViewSet(ReplicaReadMixin, SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Action.objects.all()
     serializer_class = ActionSerializer
 
-class LeaderboardEntryViewSet(viewsets.ModelViewSet):
+class LeaderboardEntryViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = LeaderboardEntry.objects.all().order_by('-score')
     serializer_class = LeaderboardEntrySerializer
 
@@ -75,21 +108,26 @@ class LeaderboardEntryViewSet(viewsets.ModelViewSet):
         except ValueError:
             return Response({'error': 'Score must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        entry, created = LeaderboardEntry.objects.update_or_create(
-            user=user,
-            story=story,
-            defaults={'score': score}
-        )
+        def record_score():
+            entry, created = LeaderboardEntry.objects.update_or_create(
+                user=user,
+                story=story,
+                defaults={'score': score}
+            )
+
+            # Update user's high score for this story
+            profile = user.profile
+            if str(story_id) not in profile.high_scores or score > profile.high_scores.get(str(story_id), 0):
+                profile.high_scores[str(story_id)] = score
+                profile.save()
+            return entry
 
-        # Update user's high score for this story
-        profile = user.profile
-        if str(story_id) not in profile.high_scores or score > profile.high_scores.get(str(story_id), 0):
-            profile.high_scores[str(story_id)] = score
-            profile.save()
+        entry = run_write(record_score)
 
         return Response(LeaderboardEntrySerializer(entry).data, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['get'], url_path='top-scores')
+    @method_decorator(cache_response(tags=['game.leaderboardentry']))
     def top_scores(self, request):
         # Aggregate the highest score per user across all stories
         top_entries = LeaderboardEntry.objects.values('user__username').annotate(highest_score=Max('score')).order_by('-highest_score')
@@ -102,11 +140,16 @@ class LeaderboardEntryViewSet(viewsets.ModelViewSet):
 
         return Response(formatted_entries, status=status.HTTP_200_OK)
 
-class UserProfileViewSet(viewsets.ModelViewSet):
+class UserProfileViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
+    """
+    Profiles, cursor-paginated. Like every viewset here, ``?fields=`` and
+    ``?exclude=`` return a sparse fieldset selecting only the columns it needs.
+    """
     queryset = UserProfile.objects.all()
     serializer_class = UserProfileSerializer
+    pagination_class = ProfileCursorPagination
 
-class BadgeViewSet(viewsets.ReadOnlyModelViewSet):
+class BadgeViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Badge.objects.all()
     serializer_class = BadgeSerializer
 
@@ -115,42 +158,155 @@ class BadgeViewSet(viewsets.ReadOnlyModelViewSet):
         user = request.user
         badge = self.get_object()
 
-        if badge in user.profile.badges.all():
+        if user.profile.badges.filter(pk=badge.pk).exists():
             return Response({'error': 'User already has this badge.'}, status=status.HTTP_400_BAD_REQUEST)
 
         user.profile.badges.add(badge)
         return Response({'success': f'Badge {badge.name} awarded to {user.username}.'})
 
-class GameSessionViewSet(viewsets.ModelViewSet):
-    queryset = GameSession.objects.all()
+class GameSessionViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
+    """
+    The player's own game sessions, newest first and cursor-paginated,
+    optionally for one story (``?story_id=``).
+    """
     serializer_class = GameSessionSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = GameSessionCursorPagination
+
+    def get_queryset(self):
+        queryset = GameSession.objects.filter(user=self.request.user)
+        story_id = self.request.query_params.get('story_id')
+        if story_id:
+            try:
+                queryset = queryset.filter(story_id=int(story_id))
+            except ValueError:
+                raise ValidationError({'error': 'story_id must be an integer.'})
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    @method_decorator(cache_response(per_user=True, tags=['game.gamesession:{user}']))
+    def stats(self, request):
+        """
+        Totals over the player's sessions (optionally ``?story_id=``),
+        aggregated in one indexed query and cached until they play again:
+        games played and completed, average and best score, total playtime
+        and the fastest completed game, in seconds. Sessions that never
+        ended don't count towards playtime.
+        """
+        duration = ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField())
+        ended = Q(end_time__isnull=False)
+        stats = self.get_queryset().aggregate(
+            games_played=Count('id'),
+            games_completed=Count('id', filter=Q(completed=True)),
+            average_score=Avg('score'),
+            best_score=Max('score'),
+            total_playtime=Sum(duration, filter=ended),
+            best_time=Min(duration, filter=ended & Q(completed=True)),
+        )
+        for name in ('total_playtime', 'best_time'):
+            stats[f'{name}_seconds'] = round(stats.pop(name).total_seconds(), 3) if stats[name] else None
+        if stats['average_score'] is not None:
+            stats['average_score'] = round(stats['average_score'], 2)
+        return Response(stats)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        run_write(serializer.save, user=self.request.user)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def complete(self, request, pk=None):
+        """
+        Finish a game in one transaction: end the session, record the score
+        on the leaderboard and high scores, reset progress and award badges.
+        Required: score. Optional: completed (false after a game over) and
+        level, the level reached. Retrying a completed session is harmless.
+        """
+        serializer = GameCompletionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            session = GameSession.objects.select_related('story').get(pk=pk, user=request.user)
+        except GameSession.DoesNotExist:
+            return Response({'error': 'Game session not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        completion = run_write(complete_session, session, request.user, **serializer.validated_data)
+        context = self.get_serializer_context()
+        return Response({
+            'session': GameSessionSerializer(completion.session, context=context).data,
+            'progress': UserProgressSerializer(completion.progress, context=context).data,
+            'best_score': completion.best_score,
+            'high_score': completion.high_score,
+            'new_high_score': completion.new_high_score,
+            'badges_awarded': BadgeSerializer(completion.badges, many=True, context=context).data,
+            'already_completed': completion.already_completed,
+        })
 
-class GameInviteViewSet(viewsets.ModelViewSet):
-    queryset = GameInvite.objects.all()
+class GameInviteViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     serializer_class = GameInviteSerializer
     permission_classes = [IsAuthenticated]
-    
+
+    def get_queryset(self):
+        # Tokens are credentials (see inviter_score): players only see and manage their own invites
+        return GameInvite.objects.filter(inviter=self.request.user)
+
     def perform_create(self, serializer):
         serializer.save(inviter=self.request.user)
-    
-    @action(detail=True, methods=['get'], url_path='inviter-score')
-    def inviter_score(self, request, pk=None):
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def bulk(self, request):
+        """
+        Challenge a class: create ``count`` invites to ``story`` at once, all
+        showing the inviter's current best score (game.invites). Streams the
+        challenge as a JSON line, then one line per invite with its token.
+        """
+        serializer = ChallengeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        challenge, invites = run_write(create_challenge, request.user, serializer.validated_data['story'],
+                                       serializer.validated_data['count'])
+        head = {'challenge': challenge.pk, 'story': challenge.story_id, 'inviter_score': challenge.inviter_score,
+                'expires_at': challenge.expires_at, 'count': len(invites)}
+        return StreamingHttpResponse(
+            (dumps(line) + b'\n' for line in [head, *({'id': invite.pk, 'token': invite.token} for invite in invites)]),
+            content_type='application/x-ndjson',
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=False, methods=['get'], url_path=r'(?P<token>[0-9a-fA-F-]{32,36})/inviter-score',
+            permission_classes=[AllowAny])
+    @method_decorator(cache_response(timeout=settings.INVITE_SCORE_CACHE_TTL))
+    def inviter_score(self, request, token=None):
+        """
+        The inviter's name and best score in the invite's story, for the page
+        a shared invite link opens. Looked up by the invite's token (the
+        link is the credential) in one query, and cached per token.
+        """
         try:
-            invite = self.get_object()
-            if invite.is_expired():
-                return Response({'error': 'Invite has expired.'}, status=status.HTTP_400_BAD_REQUEST)
-            inviter_profile = invite.inviter.profile
-            # Assuming high_scores holds story IDs as strings
-            story_id_str = str(invite.story.id)
-            highest_score = inviter_profile.high_scores.get(story_id_str, 0)
-            return Response({'username': invite.inviter.username, 'highest_score': highest_score}, status=status.HTTP_200_OK)
-        except GameInvite.DoesNotExist:
+            token = uuid.UUID(token)
+        except ValueError:
+            # The route's pattern lets through strings that aren't UUIDs, e.g. all dashes
+            invite = None
+        else:
+            invite = (GameInvite.objects.select_related('inviter__profile', 'challenge')
+                      .only('story_id', 'expires_at', 'inviter__username', 'inviter__profile__high_scores',
+                            'challenge__inviter_score')
+                      .filter(token=token).first())
+        if invite is None:
             return Response({'error': 'Invite does not exist.'}, status=status.HTTP_404_NOT_FOUND)
-
-class AnimationViewSet(viewsets.ReadOnlyModelViewSet):
+        if invite.is_expired():
+            return Response({'error': 'Invite has expired.'}, status=status.HTTP_400_BAD_REQUEST)
+        if invite.challenge is not None:
+            # The score read once for the whole challenge
+            highest_score = invite.challenge.inviter_score
+        else:
+            try:
+                high_scores = invite.inviter.profile.high_scores
+            except UserProfile.DoesNotExist:
+                high_scores = {}
+            # high_scores is keyed by story id as a string
+            highest_score = high_scores.get(str(invite.story_id), 0)
+        return Response({'username': invite.inviter.username, 'highest_score': highest_score})
+
+@method_decorator(cache_response(tags=ANIMATION_TAGS), name='list')
+@method_decorator(cache_response(tags=ANIMATION_TAGS), name='retrieve')
+class AnimationViewSet(ReplicaReadMixin, SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for retrieving animations based on story and animation type.
     Animations can be filtered by story_id and animation_type.
@@ -175,6 +331,7 @@ class AnimationViewSet(viewsets.ReadOnlyModelViewSet):
         return context
     
     @action(detail=False, methods=['get'], url_path='by-type/(?P<animation_type>[^/.]+)')
+    @method_decorator(cache_response(tags=ANIMATION_TAGS))
     def by_type(self, request, animation_type=None):
         """
         Get animations of a specific type for a story.
@@ -189,11 +346,11 @@ class AnimationViewSet(viewsets.ReadOnlyModelViewSet):
         except Story.DoesNotExist:
             return Response({'error': 'Story not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        animation = Animation.objects.filter(
+        animation = self.sparse_queryset(Animation.objects.filter(
             story_id=story_id, 
             animation_type=animation_type,
             is_active=True
-        ).first()
+        )).first()
         
         if not animation:
             return Response({'error': f'No {animation_type} animation found for this story'}, 
@@ -203,7 +360,7 @@ class AnimationViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(serializer.data)
 
 
-class UserProgressViewSet(viewsets.ModelViewSet):
+class UserProgressViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing user game progress.
     Provides endpoints to save and retrieve detailed game state.
@@ -243,7 +400,8 @@ class UserProgressViewSet(viewsets.ModelViewSet):
         state_data = request.data.get('state_data', {})
         
         # Update or create progress
-        progress, created = UserProgress.objects.update_or_create(
+        progress, created = run_write(
+            UserProgress.objects.update_or_create,
             user=request.user,
             story=story,
             defaults={
@@ -261,6 +419,7 @@ class UserProgressViewSet(viewsets.ModelViewSet):
         )
     
     @action(detail=False, methods=['get'], url_path='get-progress')
+    @method_decorator(cache_response(per_user=True, tags=['game.userprogress:{user}', 'game.story']))
     def get_progress(self, request):
         """
         Get the saved game progress for the authenticated user.
@@ -280,7 +439,9 @@ class UserProgressViewSet(viewsets.ModelViewSet):
             )
 
 
-class PowerUpViewSet(viewsets.ModelViewSet):
+@method_decorator(cache_response(tags=POWER_UP_TAGS), name='list')
+@method_decorator(cache_response(tags=POWER_UP_TAGS), name='retrieve')
+class PowerUpViewSet(ReplicaReadMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing power-ups in the game.
     Provides CRUD operations for power-ups, with filtering by story.
@@ -303,6 +464,7 @@ class PowerUpViewSet(viewsets.ModelViewSet):
         return queryset
     
     @action(detail=False, methods=['get'], url_path='by-story/(?P<story_id>[^/.]+)')
+    @method_decorator(cache_response(tags=POWER_UP_TAGS))
     def by_story(self, request, story_id=None):
         """
         Get all power-ups for a specific story.
@@ -312,12 +474,12 @@ class PowerUpViewSet(viewsets.ModelViewSet):
         except Story.DoesNotExist:
             return Response({'error': 'Story not found'}, status=status.HTTP_404_NOT_FOUND)
             
-        power_ups = PowerUp.objects.filter(story_id=story_id, is_active=True)
+        power_ups = self.sparse_queryset(PowerUp.objects.filter(story_id=story_id, is_active=True))
         serializer = self.get_serializer(power_ups, many=True)
         return Response(serializer.data)
 
 
-class UserPowerUpViewSet(viewsets.ModelViewSet):
+class UserPowerUpViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing user's power-ups.
     Provides endpoints to earn, use, and view power-ups for a user.
@@ -369,7 +531,8 @@ class UserPowerUpViewSet(viewsets.ModelViewSet):
                 return Response({'error': 'Game session not found'}, status=status.HTTP_404_NOT_FOUND)
         
         # Create the user power-up
-        user_power_up = UserPowerUp.objects.create(
+        user_power_up = run_write(
+            UserPowerUp.objects.create,
             user=request.user,
             power_up=power_up,
             game_session=game_session,
@@ -392,7 +555,7 @@ class UserPowerUpViewSet(viewsets.ModelViewSet):
                            status=status.HTTP_404_NOT_FOUND)
         
         # Mark as used
-        user_power_up.use()
+        run_write(user_power_up.use)
         
         # Return the power-up's effects
         power_up = user_power_up.power_up
@@ -410,6 +573,7 @@ class UserPowerUpViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=False, methods=['get'], url_path='active')
+    @method_decorator(cache_response(per_user=True, tags=['game.userpowerup:{user}', 'game.powerup']))
     def active_power_ups(self, request):
         """
         Get all active (unused) power-ups for the user.
@@ -421,5 +585,74 @@ class UserPowerUpViewSet(viewsets.ModelViewSet):
         if story_id:
             queryset = queryset.filter(power_up__story_id=story_id)
             
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        serializer = self.get_serializer(self.sparse_queryset(queryset), many=True)
+        return Response(serializer.data)
+
+class AnswerViewSet(viewsets.ViewSet):
+    """
+    Records which action a player chose, for the educators' analytics
+    (game.analytics). Post one answer or a list of up to 500.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def create(self, request):
+        many = isinstance(request.data, list)
+        serializer = AnswerSerializer(data=request.data, many=many, **({'max_length': 500} if many else {}))
+        serializer.is_valid(raise_exception=True)
+        counted = record_answers(serializer.validated_data if many else [serializer.validated_data])
+        return Response({'recorded': counted}, status=status.HTTP_202_ACCEPTED)
+
+
+@method_decorator(cache_response(timeout=settings.ANALYTICS_REPORT_TTL, tags=SCENARIO_TAGS), name='list')
+class ScenarioAnalyticsViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    """
+    Staff report of how players answer each scenario: accuracy overall and
+    on first tries, how often each action is chosen and how long answers
+    take. Optional query parameters: story_id, level_id, and sort=hardest
+    for the lowest first-try accuracy first.
+    """
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        scenarios = Scenario.objects.order_by('level__order', 'order', 'pk')
+        for param, lookup in (('story_id', 'story_id'), ('level_id', 'level_id')):
+            if request.query_params.get(param):
+                try:
+                    scenarios = scenarios.filter(**{lookup: int(request.query_params[param])})
+                except ValueError:
+                    raise ValidationError({'error': f'{param} must be an integer.'})
+        rows = scenario_report(scenarios)
+        if request.query_params.get('sort') == 'hardest':
+            rows.sort(key=lambda row: (row['first_try_accuracy'] is None, row['first_try_accuracy']))
+        return Response(rows)
+
+
+class ExportViewSet(viewsets.ViewSet):
+    """
+    Staff exports of player data, streamed: exports/<name>/ for each name in
+    game.exports.EXPORTS. Optional query parameters: as=csv (the default) or
+    ndjson, story_id, and since/until (ISO dates or datetimes, inclusive).
+    """
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        return Response({name: request.build_absolute_uri(f'{name}/') for name in EXPORTS})
+
+    def retrieve(self, request, pk=None):
+        if pk not in EXPORTS:
+            return Response({'error': f'Unknown export {pk!r}.'}, status=status.HTTP_404_NOT_FOUND)
+        fmt = request.query_params.get('as', 'csv')
+        if fmt not in FORMATS:
+            return Response({'error': f"as must be one of {', '.join(FORMATS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            story_id = int(request.query_params['story_id']) if request.query_params.get('story_id') else None
+            since, until = (parse_moment(request.query_params[param], end=param == 'until')
+                            if request.query_params.get(param) else None for param in ('since', 'until'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(export_rows(pk, fmt, story_id, since, until), content_type=FORMATS[fmt])
+        filename = f"{pk}-{timezone.now():%Y%m%d}.{fmt}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
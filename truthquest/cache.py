@@ -0,0 +1,236 @@
+"""
+Two-tier response caching.
+
+``TieredCache`` is a cache backend keeping recently used entries in a
+per-process LRU (L1) in front of another configured cache (L2, named by its
+LOCATION: the file-based or memcached cache the workers share). Other
+processes can't reach a worker's L1, so its entries live at most
+``L1_TIMEOUT`` seconds.
+
+``cache_response()`` caches the data of DRF views' successful responses
+there, globally or per user. Each entry records the versions of the tags it
+was built from; ``invalidate_tags()`` (wired to model signals in
+game.models) bumps them, so other workers drop their copies within
+``L1_TIMEOUT``. Against stampedes one request rebuilds an expired entry
+while the others serve the stale copy for up to ``RESPONSE_CACHE_STALE``
+seconds, or wait for the rebuild when there is none. Lookups are counted in
+``response_cache_requests_total`` by view and result (``l1_hit``,
+``l2_hit``, ``stale``, ``miss``) for hit ratios on /metrics.
+"""
+import functools
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db import transaction
+from rest_framework.response import Response
+
+from .metrics import observe_cache
+
+MISSING = object()
+
+
+class LRU:
+    """Pickled values with an expiry time, least recently used evicted first."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, now):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISSING
+            if entry[0] <= now:
+                del self.entries[key]
+                return MISSING
+            self.entries.move_to_end(key)
+        return pickle.loads(entry[1])
+
+    def set(self, key, value, expires):
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.entries[key] = (expires, pickled)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_lrus = {}
+_lrus_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.l2_alias = location or 'default'
+        self.l1_timeout = params.get('OPTIONS', {}).get('L1_TIMEOUT', 5)
+
+    @property
+    def l1(self):
+        # One LRU per process (keyed by pid, so forked workers start empty) shared by its threads
+        key = (os.getpid(), self.l2_alias, self.key_prefix)
+        lru = _lrus.get(key)
+        if lru is None:
+            with _lrus_lock:
+                lru = _lrus.setdefault(key, LRU(self._max_entries))
+        return lru
+
+    @property
+    def l2(self):
+        return caches[self.l2_alias]
+
+    def _l1_set(self, l1_key, value, timeout):
+        timeout = self.l1_timeout if timeout is None else min(self.l1_timeout, timeout)
+        if timeout > 0:
+            self.l1.set(l1_key, value, time.monotonic() + timeout)
+        else:
+            self.l1.delete(l1_key)
+
+    def get_with_tier(self, key, default=None, version=None):
+        """``(value, tier)``: tier is ``'l1'`` or ``'l2'`` where the value was found, None on a miss."""
+        l1_key = self.make_and_validate_key(key, version)
+        value = self.l1.get(l1_key, time.monotonic())
+        if value is not MISSING:
+            return value, 'l1'
+        value = self.l2.get(key, MISSING, version=version)
+        if value is MISSING:
+            return default, None
+        self._l1_set(l1_key, value, self.l1_timeout)
+        return value, 'l2'
+
+    def get(self, key, default=None, version=None):
+        return self.get_with_tier(key, default, version)[0]
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.get_backend_timeout(timeout)
+        self.l2.set(key, value, timeout, version=version)
+        self._l1_set(self.make_and_validate_key(key, version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.get_backend_timeout(timeout)
+        added = self.l2.add(key, value, timeout, version=version)
+        if added:
+            self._l1_set(self.make_and_validate_key(key, version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, self.get_backend_timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self.l1.delete(self.make_and_validate_key(key, version))
+        return self.l2.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version=version) is not MISSING
+
+    def incr(self, key, delta=1, version=None):
+        self.l1.delete(self.make_and_validate_key(key, version))
+        return self.l2.incr(key, delta, version=version)
+
+    def clear(self):
+        self.l1.clear()
+        self.l2.clear()
+
+
+def get_response_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def tag_versions(cache, tags):
+    """The current version of each tag, creating the ones never seen."""
+    keys = [f'cache-tag:{tag}' for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return tuple(versions[key] for key in keys)
+
+
+def invalidate_tags(*tags):
+    """Make responses built from ``tags`` stale everywhere, once the current transaction commits."""
+    def bump():
+        cache = get_response_cache()
+        for tag in tags:
+            cache.set(f'cache-tag:{tag}', time.time_ns(), None)
+    transaction.on_commit(bump)
+
+
+def response_key(request, user_id):
+    query = '&'.join(sorted(request.META.get('QUERY_STRING', '').split('&')))
+    # Payloads carry absolute media URLs, so they depend on the host they were built for
+    digest = hashlib.md5(f'{request.scheme}://{request.get_host()}{request.path}?{query}'.encode()).hexdigest()
+    return f'response:{digest}:{"*" if user_id is None else user_id}'
+
+
+def cache_response(timeout=None, tags=(), per_user=False, transform=None):
+    """
+    Cache a DRF view's 200 responses for ``timeout`` seconds (default
+    ``RESPONSE_CACHE_TTL``). Their data is cached, so content negotiation and
+    rendering still happen per request. ``per_user`` keys entries by the
+    requesting user (anonymous requests aren't cached), and is off unless
+    ``RESPONSE_CACHE_PER_USER``; otherwise one entry serves everybody. ``tags`` name what the response is built from, with
+    ``{user}`` standing for the user's id. ``transform(data)`` is applied to
+    every response served, e.g. to reshuffle answers.
+
+    Use ``method_decorator(cache_response(...), name='list')`` on viewsets.
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            ttl = settings.RESPONSE_CACHE_TTL if timeout is None else timeout
+            user_id = request.user.pk if per_user else None
+            if (request.method not in ('GET', 'HEAD') or not ttl
+                    or (per_user and (user_id is None or not settings.RESPONSE_CACHE_PER_USER))):
+                return view_func(request, *args, **kwargs)
+
+            cache = get_response_cache()
+            key = response_key(request, user_id)
+            versions = tag_versions(cache, [tag.format(user=user_id) for tag in tags])
+            view = request.resolver_match.view_name if request.resolver_match else view_func.__name__
+            lock_timeout = settings.RESPONSE_CACHE_LOCK_TIMEOUT
+            deadline = time.monotonic() + lock_timeout
+
+            while True:
+                entry, tier = cache.get_with_tier(key)
+                current = entry is not None and entry[0] == versions
+                if current and entry[1] > time.time():
+                    observe_cache(view, f'{tier}_hit')
+                    return Response(transform(entry[2]) if transform else entry[2])
+                # One request rebuilds the entry; add() is atomic on memcached and locmem, best effort on files
+                if cache.add(f'{key}:lock', 1, lock_timeout):
+                    break
+                if current:
+                    observe_cache(view, 'stale')
+                    return Response(transform(entry[2]) if transform else entry[2])
+                if time.monotonic() > deadline:
+                    break
+                time.sleep(0.025)
+
+            observe_cache(view, 'miss')
+            try:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code == 200 and getattr(response, 'data', None) is not None:
+                    cache.set(key, (versions, time.time() + ttl, response.data), ttl + settings.RESPONSE_CACHE_STALE)
+            finally:
+                cache.delete(f'{key}:lock')
+            return response
+        return wrapper
+    return decorator
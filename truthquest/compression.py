@@ -0,0 +1,110 @@
+"""
+Negotiated response compression.
+
+``CompressionMiddleware`` compresses text-like responses of at least
+``COMPRESSION_MIN_SIZE`` bytes with the best coding the client accepts:
+brotli when the ``brotli`` package is installed, else gzip. Responses that
+already carry a Content-Encoding pass through untouched, which is how
+views serve ``precompress()``ed variants of cached payloads (see
+``encoded_response()``) without compressing them again on every request.
+"""
+import re
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'image/svg+xml',
+                      'application/x-ndjson')
+
+
+def accepted_encodings(request):
+    """Codings from Accept-Encoding, best first, as we can produce them (``'br'``, ``'gzip'``)."""
+    weights = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        match = re.search(r'q=([0-9.]+)', params)
+        try:
+            weights[coding.strip().lower()] = float(match.group(1)) if match else 1.0
+        except ValueError:
+            continue
+    available = ['br', 'gzip'] if brotli is not None else ['gzip']
+    ranked = [(weights.get(coding, weights.get('*', 0.0)), -i, coding) for i, coding in enumerate(available)]
+    return [coding for weight, _, coding in sorted(ranked, reverse=True) if weight > 0]
+
+
+def compress(content, coding, random_bytes=None):
+    if coding == 'br':
+        return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    # Random bytes in the gzip header, as Django's GZipMiddleware adds, blunt BREACH-style length attacks
+    return compress_string(content, max_random_bytes=random_bytes)
+
+
+def precompress(content):
+    """Variants of a cacheable payload by coding, including ``'identity'``; only the ones that pay off."""
+    variants = {'identity': content}
+    if len(content) >= settings.COMPRESSION_MIN_SIZE:
+        for coding in ('br', 'gzip') if brotli is not None else ('gzip',):
+            # Use the best brotli level: this runs once per cached payload, not per request
+            compressed = (brotli.compress(content, quality=11) if coding == 'br'
+                          else compress_string(content))
+            if len(compressed) < len(content):
+                variants[coding] = compressed
+    return variants
+
+
+def encoded_response(request, variants, content_type='application/json'):
+    """A response with the best of the ``precompress()`` variants the client accepts."""
+    coding = next((coding for coding in accepted_encodings(request) if coding in variants), 'identity')
+    response = HttpResponse(variants[coding], content_type=content_type)
+    if coding != 'identity':
+        response['Content-Encoding'] = coding
+    if len(variants) > 1:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    max_random_bytes = GZipMiddleware.max_random_bytes
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code in (204, 206, 304):
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        codings = accepted_encodings(request)
+        if response.streaming:
+            # Streams are gzipped chunk by chunk, as GZipMiddleware does
+            if 'gzip' not in codings or response.is_async:
+                return response
+            coding = 'gzip'
+            response.streaming_content = compress_sequence(response.streaming_content,
+                                                           max_random_bytes=self.max_random_bytes)
+            del response.headers['Content-Length']
+        else:
+            if not codings:
+                return response
+            coding = codings[0]
+            compressed = compress(response.content, coding, self.max_random_bytes)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = coding
+        return response
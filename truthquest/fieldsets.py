@@ -0,0 +1,149 @@
+"""
+Sparse fieldsets: ``?fields=a,b`` and ``?exclude=c`` on reads.
+
+``SparseFieldsSerializerMixin`` trims a ModelSerializer's output and, from
+the ``source`` of each remaining field, works out what the queryset has to
+load: the columns for ``only()``, forward and one-to-one relations to
+``select_related`` and to-many relations to ``prefetch_related``. Fields it
+can't see through (SerializerMethodFields, ``source='*'``, model properties)
+declare theirs in ``field_columns``/``field_prefetches``; an undeclared one
+keeps every column loaded. ``SparseFieldsMixin`` wires both into a viewset.
+"""
+import re
+from dataclasses import dataclass, field as dataclass_field
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+DISPLAY_METHOD = re.compile(r'^get_(\w+)_display$')
+
+
+@dataclass
+class QueryNeeds:
+    columns: set = dataclass_field(default_factory=set)
+    select: set = dataclass_field(default_factory=set)
+    prefetch: set = dataclass_field(default_factory=set)
+    # False once a field may read columns we can't name, so nothing is deferred
+    complete: bool = True
+
+
+def collect_needs(serializer, model, prefix, needs):
+    """Add what the fields of ``serializer``, reading instances of ``model`` at ``prefix``, need to ``needs``."""
+    field_columns = getattr(serializer, 'field_columns', {})
+    field_prefetches = getattr(serializer, 'field_prefetches', {})
+    for name, field in serializer.fields.items():
+        if name in field_columns or name in field_prefetches:
+            needs.columns.update(prefix + column for column in field_columns.get(name, []))
+            needs.prefetch.update(prefix + lookup for lookup in field_prefetches.get(name, []))
+            continue
+        if field.source == '*' or isinstance(field, serializers.SerializerMethodField):
+            needs.complete = False
+            continue
+
+        current, path = model, prefix
+        for i, attr in enumerate(field.source_attrs):
+            last = i == len(field.source_attrs) - 1
+            display = DISPLAY_METHOD.match(attr)
+            try:
+                model_field = current._meta.get_field(display[1] if display else attr)
+            except FieldDoesNotExist:
+                # A property or method may read anything; a missing attribute is skipped by DRF
+                if hasattr(current, attr):
+                    needs.complete = False
+                break
+            lookup = path + model_field.name
+            if not model_field.is_relation:
+                needs.columns.add(lookup)
+                break
+            if model_field.many_to_many or model_field.one_to_many:
+                needs.prefetch.add(lookup)
+                break
+            if model_field.concrete:
+                needs.columns.add(lookup)
+            if last and not isinstance(field, serializers.BaseSerializer):
+                # A primary key field reads the foreign key column alone
+                if not model_field.concrete:
+                    needs.select.add(lookup)
+                break
+            needs.select.add(lookup)
+            current, path = model_field.related_model, lookup + '__'
+            if last:
+                collect_needs(field, current, path, needs)
+
+
+class SparseFieldsSerializerMixin:
+    # Columns each field reads, for fields whose source doesn't say (SerializerMethodFields, ...).
+    field_columns = {}
+    # Lookups to prefetch_related for such fields.
+    field_prefetches = {}
+
+    def __init__(self, *args, fields=None, exclude=None, **kwargs):
+        # ``fields``/``exclude`` limit the output to a sparse fieldset
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in set(exclude or ()) & set(self.fields):
+            self.fields.pop(name)
+
+    @classmethod
+    def setup_queryset(cls, queryset, fields=None, exclude=None, columns=()):
+        """
+        Select only the columns and relations the fieldset (default: all
+        fields) needs, plus ``columns``.
+        """
+        needs = QueryNeeds()
+        needs.columns.update(columns)
+        collect_needs(cls(fields=fields, exclude=exclude), queryset.model, '', needs)
+        if needs.select:
+            queryset = queryset.select_related(*sorted(needs.select))
+        if needs.prefetch:
+            queryset = queryset.prefetch_related(*sorted(needs.prefetch))
+        if needs.complete:
+            queryset = queryset.only(queryset.model._meta.pk.name, *sorted(needs.columns))
+        return queryset
+
+
+class SparseFieldsMixin:
+    """
+    Viewset side of sparse fieldsets. Reads honour ``?fields=``/``?exclude=``
+    (comma-separated field names; unknown ones are a 400) and their querysets
+    go through the serializer's ``setup_queryset()``. Custom actions that
+    build their own queryset pass it through ``sparse_queryset()``.
+    """
+
+    def get_sparse_fields(self):
+        """``(fields, exclude)`` requested, each a list of names or None."""
+        if self.request.method not in SAFE_METHODS:
+            return None, None
+        if not hasattr(self, '_sparse_fields'):
+            known = set(self.get_serializer_class()().fields)
+            requested = []
+            for param in ('fields', 'exclude'):
+                value = self.request.query_params.get(param)
+                names = [name.strip() for name in value.split(',') if name.strip()] if value else None
+                unknown = set(names or ()) - known
+                if unknown:
+                    raise ValidationError({param: [f'Unknown field(s): {", ".join(sorted(unknown))}']})
+                requested.append(names)
+            self._sparse_fields = tuple(requested)
+        return self._sparse_fields
+
+    def sparse_queryset(self, queryset):
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        # A cursor paginator reads the columns it orders by from the last row of the page
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        columns = [name.lstrip('-') for name in ([ordering] if isinstance(ordering, str) else ordering)]
+        return self.get_serializer_class().setup_queryset(queryset, *self.get_sparse_fields(), columns=columns)
+
+    def filter_queryset(self, queryset):
+        return self.sparse_queryset(super().filter_queryset(queryset))
+
+    def get_serializer(self, *args, **kwargs):
+        fields, exclude = self.get_sparse_fields()
+        kwargs.setdefault('fields', fields)
+        kwargs.setdefault('exclude', exclude)
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,75 @@
+"""
+Import-time profiling.
+
+``profile(target)`` starts a fresh interpreter with ``python -X importtime``
+(this process has already imported everything), runs one of the startup
+paths in ``TARGETS`` and parses the report on stderr into per-module
+``ImportCost`` rows. Used by ``manage.py profile_imports`` and
+benchmarks/bench_startup.py.
+"""
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+
+# What a process does before serving, per kind of process
+TARGETS = {
+    'settings': 'import {settings}',
+    'setup': 'import django; django.setup()',
+    # A web worker: the application plus the URLconf (and so every view) its first request loads
+    'wsgi': 'import truthquest.wsgi; from django.urls import get_resolver; get_resolver().url_patterns',
+    'asgi': 'import truthquest.asgi; from django.urls import get_resolver; get_resolver().url_patterns',
+}
+
+
+@dataclass
+class ImportCost:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+    @property
+    def package(self):
+        return self.module.partition('.')[0]
+
+
+def target_code(target, command=None):
+    if command:
+        return ('import django; django.setup(); '
+                f'from django.core.management import call_command; call_command({command!r})')
+    return TARGETS[target].format(settings=settings.SETTINGS_MODULE)
+
+
+def parse(report):
+    """The ``ImportCost`` of every module in a ``-X importtime`` report, in import order."""
+    costs = []
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        costs.append(ImportCost(name.strip(), int(self_us), int(cumulative_us), depth))
+    return costs
+
+
+def by_package(costs):
+    """``{top-level package: microseconds}``, adding up the modules' own import times."""
+    totals = defaultdict(int)
+    for cost in costs:
+        totals[cost.package] += cost.self_us
+    return dict(totals)
+
+
+def profile(target='setup', command=None, env=None):
+    """Run ``target`` (or management ``command``) in a fresh interpreter and return its ``ImportCost`` rows."""
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE, **(env or {})}
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', target_code(target, command)],
+                            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+    if result.returncode:
+        lines = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+        raise RuntimeError('\n'.join(lines[-20:]))
+    return parse(result.stderr)
@@ -0,0 +1,41 @@
+"""
+Keep heavy optional dependencies out of process startup.
+
+django-imagekit registers a Celery task when it is imported if celery is
+installed, importing celery, kombu, amqp, click and yaml (~80 ms) into every
+web worker and management command, although our specs are generated by the
+synchronous cache file backend. ``ImageKitConfig`` (listed in
+INSTALLED_APPS instead of 'imagekit') imports imagekit with celery hidden
+unless IMAGEKIT_DEFAULT_CACHEFILE_BACKEND is imagekit's Celery backend.
+Celery itself is left to the first task sent (accounts.utils imports
+accounts.tasks when it dispatches one), and in a Celery worker it is already
+imported, so nothing is hidden there.
+"""
+import sys
+from contextlib import contextmanager
+
+from django.apps import AppConfig
+from django.conf import settings
+
+
+@contextmanager
+def hidden_modules(*names):
+    """Make ``import <name>`` raise ImportError inside the block, for modules not already imported."""
+    hidden = [name for name in names if name not in sys.modules]
+    for name in hidden:
+        sys.modules[name] = None
+    try:
+        yield
+    finally:
+        for name in hidden:
+            if sys.modules.get(name, False) is None:
+                del sys.modules[name]
+
+
+celery_backend = 'Celery' in getattr(settings, 'IMAGEKIT_DEFAULT_CACHEFILE_BACKEND', '')
+with hidden_modules(*([] if celery_backend else ['celery'])):
+    import imagekit  # noqa: F401  imagekit.cachefiles.backends looks for celery when imported
+
+
+class ImageKitConfig(AppConfig):
+    name = 'imagekit'
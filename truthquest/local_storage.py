@@ -0,0 +1,78 @@
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Local filesystem storage that names every file after a hash of its content.
+
+    ``level_images/gameback.webp`` is stored as ``level_images/3f/3fa9...c2.webp``,
+    so identical uploads share one file on disk and a stored name never changes
+    meaning, which lets the media view serve it with ``Cache-Control: immutable``.
+    """
+    hash_algorithm = 'sha256'
+    # 32 hex characters (128 bits) keeps names well inside FileField's
+    # default max_length of 100 while making collisions practically impossible.
+    digest_length = 32
+    # Fan files out into sub-directories so no single directory grows huge.
+    fanout_length = 2
+
+    def content_digest(self, content):
+        hasher = hashlib.new(self.hash_algorithm)
+        for chunk in content.chunks():
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            hasher.update(chunk)
+        content.seek(0)
+        return hasher.hexdigest()[:self.digest_length]
+
+    def hashed_name(self, name, digest):
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:self.fanout_length], digest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save(), so there is no
+        # point probing the filesystem for a free variant of the upload name.
+        return name
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, self.content_digest(content))
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            # Identical content is already stored: deduplicate.
+            return name
+
+        directory = os.path.dirname(full_path)
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+        # Write to a temporary file and atomically move it into place. Two
+        # workers racing on the same content produce the same bytes, so
+        # whichever rename lands last is harmless.
+        temp_path = os.path.join(directory, '.upload-%s' % uuid.uuid4().hex)
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    temp_file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
@@ -0,0 +1,265 @@
+"""
+Per-endpoint request metrics in Prometheus text format.
+
+``MetricsMiddleware`` records, per resolved URL name and method, a latency
+histogram, SQL query count and time, response bytes and status codes;
+``observe_cache()`` counts response cache lookups (truthquest.cache). Each
+worker process adds to its own memory-mapped file in ``settings.METRICS_DIR``
+(no locking between processes); ``render_metrics()`` sums every file in the
+directory, so /metrics reports the totals of all workers whichever one serves
+it. Clear the directory when the service is redeployed.
+"""
+import functools
+import glob
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Latency histogram upper bounds in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+# name: (type, help, label names); keys in the store are the name and the label values joined by SEP
+METRICS = {
+    'http_requests_total': ('counter', 'Requests by view, method and status code.', ('view', 'method', 'status')),
+    'http_request_duration_seconds': ('histogram', 'Request latency.', ('view', 'method')),
+    'http_request_db_queries_total': ('counter', 'SQL queries run while handling requests.', ('view', 'method')),
+    'http_request_db_duration_seconds_total': ('counter', 'Time spent in SQL queries.', ('view', 'method')),
+    'http_response_bytes_total': ('counter', 'Response body bytes sent.', ('view', 'method')),
+    'response_cache_requests_total': ('counter', 'Response cache lookups by view and result '
+                                      '(l1_hit, l2_hit, stale, miss).', ('view', 'result')),
+}
+SEP = '\t'
+
+
+class MmapStore:
+    """
+    Float counters in a memory-mapped file written by a single process.
+
+    Layout: an 8-byte header holding the number of bytes used, then entries of
+    ``[uint32 key length][key][padding to 8 bytes][float64 value]``. The header
+    is updated only after an entry is complete, so readers in other processes
+    never see a partial one.
+    """
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self.fd).st_size < self.INITIAL_SIZE:
+            os.ftruncate(self.fd, self.INITIAL_SIZE)
+        self.capacity = os.fstat(self.fd).st_size
+        self.mm = mmap.mmap(self.fd, self.capacity)
+        self.used = struct.unpack_from('q', self.mm, 0)[0] or 8
+        self.positions = {key: position for key, position, _ in read_entries(self.mm, self.used)}
+
+    def _add(self, key):
+        encoded = key.encode()
+        header = 4 + len(encoded)
+        header += -header % 8
+        while self.used + header + 8 > self.capacity:
+            self.capacity *= 2
+            self.mm.resize(self.capacity)
+        struct.pack_into(f'I{len(encoded)}s', self.mm, self.used, len(encoded), encoded)
+        position = self.used + header
+        struct.pack_into('d', self.mm, position, 0.0)
+        self.used = position + 8
+        struct.pack_into('q', self.mm, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def inc_many(self, increments):
+        """Add ``amount`` to each ``(key, amount)`` pair."""
+        with self.lock:
+            for key, amount in increments:
+                position = self.positions.get(key)
+                if position is None:
+                    position = self._add(key)
+                struct.pack_into('d', self.mm, position, struct.unpack_from('d', self.mm, position)[0] + amount)
+
+    def close(self):
+        self.mm.close()
+        os.close(self.fd)
+
+
+def read_entries(data, used=None):
+    """Yield ``(key, value position, value)`` for every complete entry in a store's bytes."""
+    if used is None:
+        used = struct.unpack_from('q', data, 0)[0] if len(data) >= 8 else 0
+    offset = 8
+    while offset < used:
+        length = struct.unpack_from('I', data, offset)[0]
+        key = bytes(data[offset + 4:offset + 4 + length]).decode()
+        header = 4 + length
+        position = offset + header + (-header % 8)
+        yield key, position, struct.unpack_from('d', data, position)[0]
+        offset = position + 8
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store():
+    """This process's store in METRICS_DIR. Keyed by pid as well so forked workers get their own file."""
+    key = (os.getpid(), settings.METRICS_DIR)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                os.makedirs(settings.METRICS_DIR, exist_ok=True)
+                store = _stores[key] = MmapStore(os.path.join(settings.METRICS_DIR, f'metrics-{os.getpid()}.db'))
+    return store
+
+
+def observe(view, method, status, duration, queries, db_time, size):
+    """Record one request."""
+    labels = f'{view}{SEP}{method}'
+    le = next(bound for bound in BUCKETS if duration <= bound)
+    get_store().inc_many((
+        (f'http_requests_total{SEP}{labels}{SEP}{status}', 1),
+        (f'http_request_duration_seconds_bucket{SEP}{labels}{SEP}{le}', 1),
+        (f'http_request_duration_seconds_sum{SEP}{labels}', duration),
+        (f'http_request_db_queries_total{SEP}{labels}', queries),
+        (f'http_request_db_duration_seconds_total{SEP}{labels}', db_time),
+        (f'http_response_bytes_total{SEP}{labels}', size),
+    ))
+
+
+def observe_cache(view, result):
+    """Record one response cache lookup (see truthquest.cache)."""
+    if settings.METRICS_ENABLED:
+        get_store().inc_many(((f'response_cache_requests_total{SEP}{view}{SEP}{result}', 1),))
+
+
+def collect(directory=None):
+    """Sum the counters of every process's store in ``directory``."""
+    totals = {}
+    for path in glob.glob(os.path.join(directory or settings.METRICS_DIR, 'metrics-*.db')):
+        with open(path, 'rb') as f:
+            data = f.read()
+        for key, _, value in read_entries(data):
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def format_labels(names, values):
+    def escape(value):
+        return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+def render_metrics(directory=None):
+    """All metrics in the Prometheus text exposition format."""
+    samples = {}
+    for key, value in collect(directory).items():
+        name, *labels = key.split(SEP)
+        samples.setdefault(name, {})[tuple(labels)] = value
+
+    lines = []
+    for name, (kind, help_text, label_names) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for labels, value in sorted(samples.get(name, {}).items()):
+                lines.append(f'{name}{format_labels(label_names, labels)} {value!r}')
+            continue
+        # Histograms are stored as per-bucket counts; the exposition format wants them cumulative.
+        buckets = {}
+        for (*labels, le), count in samples.get(f'{name}_bucket', {}).items():
+            buckets.setdefault(tuple(labels), {})[float(le)] = count
+        sums = samples.get(f'{name}_sum', {})
+        for labels in sorted(buckets):
+            cumulative = 0.0
+            for bound in BUCKETS:
+                cumulative += buckets[labels].get(bound, 0.0)
+                lines.append(f'{name}_bucket{format_labels(label_names + ("le",), labels + (format_bound(bound),))} '
+                             f'{cumulative!r}')
+            lines.append(f'{name}_sum{format_labels(label_names, labels)} {sums.get(labels, 0.0)!r}')
+            lines.append(f'{name}_count{format_labels(label_names, labels)} {cumulative!r}')
+    return '\n'.join(lines) + '\n'
+
+
+class QueryStats:
+    """Database execute wrapper counting queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.perf_counter() - start
+
+
+@functools.cache
+def warn_unscrapable():
+    logger.warning('Metrics are recorded but /metrics refuses every scrape: set METRICS_TOKEN or METRICS_ALLOWED_IPS')
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        if not (settings.METRICS_TOKEN or settings.METRICS_ALLOWED_IPS or settings.DEBUG):
+            warn_unscrapable()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = QueryStats()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(stats))
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        start = time.perf_counter()
+        # Connections are context-local, so the wrappers also see queries run in sync_to_async threads
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(stats))
+            response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, stats)
+        return response
+
+    def record(self, request, response, duration, stats):
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        if view != 'metrics':
+            if response.streaming:
+                size = int(response.get('Content-Length') or 0)
+            else:
+                size = len(response.content)
+            observe(view, request.method, response.status_code, duration, stats.count, stats.time, size)
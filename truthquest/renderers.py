@@ -0,0 +1,53 @@
+"""
+orjson-backed JSON renderer and parser for DRF.
+
+They produce and accept the same JSON as DRF's JSONRenderer/JSONParser
+(compact, UTF-8, U+2028/U+2029 escaped) several times faster. Types orjson
+doesn't know (Decimal, lazy translations, querysets, ...) go through DRF's
+own encoder. Without orjson installed both fall back to the stock classes.
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+def dumps(data, indent=False):
+    """``data`` as JSON bytes, the way ORJSONRenderer renders it."""
+    if orjson is None:
+        return JSONRenderer().render(data, renderer_context={'indent': 2} if indent else None)
+    # Datetimes go through DRF's encoder too, for its ISO 8601 format (milliseconds, "Z")
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | (orjson.OPT_INDENT_2 if indent else 0)
+    content = orjson.dumps(data, default=_encoder.default, option=option)
+    # Like DRF, escape the two characters that are valid JSON but not valid JavaScript
+    if b'\xe2\x80' in content:
+        content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return content
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        return dumps(data, indent=bool(self.get_indent(accepted_media_type, renderer_context or {})))
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,208 @@
+"""
+Read replica for the content endpoints.
+
+Views using ``ReplicaReadMixin`` run the queries of their safe requests on
+``settings.REPLICA_DATABASE``, so story content reads don't queue behind
+progress and leaderboard writes on the primary. Writes always go to the
+primary.
+
+Locally the replica is a second SQLite file (or a ``file:...?mode=ro`` URI)
+refreshed from the primary by ``sync_replica()`` / ``manage.py sync_replica``.
+Each snapshot's mtime is the time it was taken. A user who writes is pinned
+to the primary (``ReplicaPinMiddleware``) until a snapshot taken after that
+write is in place, or for at most ``REPLICA_PIN_SECONDS``, so they always
+read their own writes. Pins are kept in the default cache, so every worker
+sees them; settings refuse a replica with the process-local ``locmem``
+cache.
+"""
+import contextvars
+import os
+import sqlite3
+import time
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+
+def replica_path(name=None):
+    """Filesystem path of an SQLite database NAME, which may be a ``file:`` URI."""
+    name = str(name or settings.DATABASES[settings.REPLICA_DATABASE]['NAME'])
+    return urlsplit(name).path if name.startswith('file:') else name
+
+
+def replica_synced_at():
+    """When the replica's snapshot was taken, or None if there is no replica yet."""
+    try:
+        return os.stat(replica_path()).st_mtime
+    except OSError:
+        return None
+
+
+def _pin_key(user_id):
+    return f'replica:pinned:{user_id}'
+
+
+def pin_to_primary(user):
+    cache.set(_pin_key(user.pk), time.time(), settings.REPLICA_PIN_SECONDS)
+
+
+def should_use_replica(user):
+    """True if this user's reads can be served from the replica."""
+    if not settings.REPLICA_DATABASE:
+        return False
+    synced_at = replica_synced_at()
+    if synced_at is None:
+        return False
+    if user is not None and user.is_authenticated:
+        pinned_at = cache.get(_pin_key(user.pk))
+        if pinned_at is not None and pinned_at >= synced_at:
+            return False
+    return True
+
+
+async def ashould_use_replica(user):
+    """should_use_replica() for async views, through the async cache API."""
+    if not settings.REPLICA_DATABASE:
+        return False
+    synced_at = replica_synced_at()
+    if synced_at is None:
+        return False
+    if user is not None and user.is_authenticated:
+        pinned_at = await cache.aget(_pin_key(user.pk))
+        if pinned_at is not None and pinned_at >= synced_at:
+            return False
+    return True
+
+
+@contextmanager
+def replica_reads(user):
+    """Run the body's reads on the replica if ``user`` may use it (for views outside ReplicaReadMixin)."""
+    token = _use_replica.set(True) if should_use_replica(user) else None
+    try:
+        yield
+    finally:
+        if token is not None:
+            _use_replica.reset(token)
+
+
+@asynccontextmanager
+async def areplica_reads(user):
+    """replica_reads() for async views; the ORM's sync_to_async calls inherit the context."""
+    token = _use_replica.set(True) if await ashould_use_replica(user) else None
+    try:
+        yield
+    finally:
+        if token is not None:
+            _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    """Reads inside a ReplicaReadMixin view go to the replica; everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return settings.REPLICA_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, settings.REPLICA_DATABASE}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary, never migrated on its own
+        if settings.REPLICA_DATABASE and db == settings.REPLICA_DATABASE:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    For viewsets: run safe requests' queries on the replica. Authentication
+    happens first, on the primary, so new users and tokens are always found.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and should_use_replica(request.user):
+            self._replica_token = _use_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _use_replica.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaPinMiddleware:
+    """Pins users to the primary after a successful unsafe request."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.pin_writer(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            # request.user may still be the lazy session user, which loads synchronously
+            await sync_to_async(self.pin_writer)(request, response)
+        return response
+
+    def pin_writer(self, request, response):
+        # DRF sets request.user on the underlying request once it authenticates
+        user = getattr(request, 'user', None)
+        if (request.method not in SAFE_METHODS and response.status_code < 400
+                and user is not None and user.is_authenticated):
+            pin_to_primary(user)
+
+
+def sync_replica(source=None, target=None):
+    """
+    Replace the replica with a consistent snapshot of the primary and return
+    the snapshot time. The copy is written next to the replica and renamed
+    into place, so readers see either the old snapshot or the new one.
+    """
+    source = replica_path(source or settings.DATABASES[DEFAULT_DB_ALIAS]['NAME'])
+    target = replica_path(target)
+    temp = f'{target}.sync-{os.getpid()}'
+    started = time.time()
+    primary = sqlite3.connect(source)
+    try:
+        copy = sqlite3.connect(temp)
+        try:
+            primary.backup(copy)
+            # Readers open the replica read-only; give it a rollback journal rather than the primary's WAL
+            copy.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            copy.close()
+    finally:
+        primary.close()
+    os.utime(temp, (started, started))
+    os.replace(temp, target)
+    return started
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
+import tempfile
 from decouple import config
 from pathlib import Path
 
@@ -42,7 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
     'sorl.thumbnail',
-    'imagekit',
+    'truthquest.lazy.ImageKitConfig',  # imagekit, without importing celery (truthquest/lazy.py)
     'game',
     'settings',
     'corsheaders',
@@ -52,16 +53,30 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'accounts.User'
 
 MIDDLEWARE = [
+    'truthquest.metrics.MetricsMiddleware',
+    'truthquest.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'truthquest.replica.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-endpoint request metrics served at /metrics. Every worker process
+# writes to its own file in METRICS_DIR; clear it on deploy.
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_DIR = config('METRICS_DIR', default=os.path.join(tempfile.gettempdir(), 'truthquest-metrics'))
+# Outside DEBUG, scrapes must send "Authorization: Bearer <METRICS_TOKEN>" or
+# come from an address in METRICS_ALLOWED_IPS (comma-separated; empty by
+# default, as behind a local reverse proxy every request comes from 127.0.0.1).
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='',
+                             cast=lambda value: [ip.strip() for ip in value.split(',') if ip.strip()])
+
 ROOT_URLCONF = 'truthquest.urls'
 
 TEMPLATES = [
@@ -93,6 +108,53 @@ DATABASES = {
     }
 }
 
+# Production SQLite profile: WAL lets readers run alongside the writer, and
+# IMMEDIATE transactions take the write lock up front so concurrent writers
+# wait out the busy timeout instead of failing with "database is locked".
+SQLITE_TUNED = config('SQLITE_TUNED', default=True, cast=bool)
+if SQLITE_TUNED:
+    DATABASES['default']['OPTIONS'] = {
+        'timeout': config('SQLITE_BUSY_TIMEOUT', default=20, cast=int),  # seconds
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': ';'.join([
+            'PRAGMA journal_mode=WAL',
+            f"PRAGMA synchronous={config('SQLITE_SYNCHRONOUS', default='NORMAL')}",
+            f"PRAGMA mmap_size={config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int)}",
+            f"PRAGMA cache_size=-{config('SQLITE_CACHE_KB', default=64 * 1024, cast=int)}",  # negative: KiB
+            'PRAGMA temp_store=MEMORY',
+        ]),
+    }
+
+# Optional read replica for the content endpoints (truthquest/replica.py).
+# Locally a second SQLite file, or a "file:<path>?mode=ro" URI, refreshed from
+# the primary by "manage.py sync_replica --interval <seconds>".
+DATABASE_REPLICA = config('DATABASE_REPLICA', default='')
+REPLICA_DATABASE = 'replica' if DATABASE_REPLICA else None
+if DATABASE_REPLICA:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATABASE_REPLICA,
+        'OPTIONS': {
+            'init_command': ';'.join([
+                'PRAGMA query_only=ON',
+                f"PRAGMA mmap_size={config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int)}",
+                f"PRAGMA cache_size=-{config('SQLITE_CACHE_KB', default=64 * 1024, cast=int)}",
+            ]),
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['truthquest.replica.ReplicaRouter']
+# Needs CACHE_BACKEND 'file' or 'memcached' (see CACHES below), where the
+# workers share the pins keeping users who wrote on the primary. Upper bound
+# on how long a user who wrote reads from the primary; keep it above the
+# sync interval.
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=300, cast=int)
+
+# Run game writes on one writer thread per process, several requests' writes
+# committed together (see truthquest/sqlite.py)
+SQLITE_WRITE_QUEUE = config('SQLITE_WRITE_QUEUE', default=False, cast=bool)
+SQLITE_WRITE_BATCH = config('SQLITE_WRITE_BATCH', default=64, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -130,28 +192,58 @@ USE_TZ = True
 
 STATIC_URL = 'static/'  
 MEDIA_URL = 'media/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+MEDIA_ROOT = BASE_DIR / 'mediafiles'
 
+# 's3' keeps media and static on S3/CloudFront; 'local' stores them on disk
+# under MEDIA_ROOT/STATIC_ROOT for development, tests and offline schools.
+STORAGE_BACKEND = config('STORAGE_BACKEND', default='s3')
 
-AWS_ACCESS_KEY_ID = config('AWS_ACCESS_KEY_ID')
-AWS_SECRET_ACCESS_KEY = config('AWS_SECRET_ACCESS_KEY')
-AWS_STORAGE_BUCKET_NAME = config('AWS_STORAGE_BUCKET_NAME')
-CLOUDFRONT_DOMAIN = config('CLOUDFRONT_DOMAIN')
-AWS_S3_REGION_NAME = 'us-east-2' 
-AWS_S3_CUSTOM_DOMAIN = CLOUDFRONT_DOMAIN
-AWS_S3_FILE_OVERWRITE = False
+if STORAGE_BACKEND == 'local':
+    STORAGES = {
 
-STORAGES = {
+        # Media files are named by content hash and deduplicated
+        "default": {
+            "BACKEND": "truthquest.local_storage.ContentAddressedStorage",
+        },
 
-    # Media file (image) management  
-    "default": {
-        "BACKEND": "storages.backends.s3boto3.S3StaticStorage",
-    },
-   
-    # CSS and JS file management
-    "staticfiles": {
-        "BACKEND": "storages.backends.s3boto3.S3StaticStorage",
-    },
-}
+        # collectstatic writes hashed copies plus a manifest
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.ManifestStaticFilesStorage",
+        },
+    }
+
+    # Offload media transfers to the front-end server: 'X-Accel-Redirect'
+    # (nginx, paired with an internal location at MEDIA_ACCEL_REDIRECT_PREFIX
+    # aliased to MEDIA_ROOT) or 'X-Sendfile' (Apache/lighttpd). Empty serves
+    # from Django, which still uses sendfile(2) under gunicorn/uWSGI.
+    MEDIA_SENDFILE_HEADER = config('MEDIA_SENDFILE_HEADER', default='')
+    MEDIA_ACCEL_REDIRECT_PREFIX = config('MEDIA_ACCEL_REDIRECT_PREFIX', default='/protected-media/')
+else:
+    # Nothing here is read until media or static files are first used, so
+    # none of it is required to start: without keys boto3 falls back to its
+    # own credential chain (the pod's role, ~/.aws), and management commands
+    # and workers that never touch storage run without AWS configuration.
+    AWS_ACCESS_KEY_ID = config('AWS_ACCESS_KEY_ID', default=None)
+    AWS_SECRET_ACCESS_KEY = config('AWS_SECRET_ACCESS_KEY', default=None)
+    AWS_STORAGE_BUCKET_NAME = config('AWS_STORAGE_BUCKET_NAME', default=None)
+    CLOUDFRONT_DOMAIN = config('CLOUDFRONT_DOMAIN', default=None)
+    AWS_S3_REGION_NAME = 'us-east-2' 
+    AWS_S3_CUSTOM_DOMAIN = CLOUDFRONT_DOMAIN
+    AWS_S3_FILE_OVERWRITE = False
+
+    STORAGES = {
+
+        # Media file (image) management  
+        "default": {
+            "BACKEND": "storages.backends.s3boto3.S3StaticStorage",
+        },
+       
+        # CSS and JS file management
+        "staticfiles": {
+            "BACKEND": "storages.backends.s3boto3.S3StaticStorage",
+        },
+    }
 
 
 # USE_S3 = config('USE_S3') == 'TRUE'
@@ -187,9 +279,96 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
+    ),
+}
+
+# orjson-backed JSON for the API (truthquest/renderers.py); same output as DRF's
+if config('FAST_JSON', default=True, cast=bool):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = (
+        'truthquest.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    )
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] = (
+        'truthquest.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     )
+
+# truthquest.compression.CompressionMiddleware: brotli (if installed) or gzip
+# for text-like responses of at least COMPRESSION_MIN_SIZE bytes
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+COMPRESSION_BROTLI_QUALITY = config('COMPRESSION_BROTLI_QUALITY', default=5, cast=int)
+
+# Shared cache (L2): CACHE_BACKEND 'locmem' (this process only, the default;
+# for a single process, or per-user responses aren't cached, see below),
+# 'file' (a CACHE_LOCATION directory shared by the workers of a host) or
+# 'memcached' (CACHE_LOCATION "host:port,host:port"; needs pymemcache).
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+CACHE_LOCATION = config('CACHE_LOCATION', default='')
+SHARED_CACHES = {
+    'locmem': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'truthquest'},
+    'file': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+             'LOCATION': CACHE_LOCATION or os.path.join(tempfile.gettempdir(), 'truthquest-cache')},
+    'memcached': {'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+                  'LOCATION': CACHE_LOCATION.split(','), 'OPTIONS': {'no_delay': True}},
+}
+CACHES = {
+    'default': {**SHARED_CACHES[CACHE_BACKEND], 'TIMEOUT': 300},
+    # API responses (truthquest.cache): a per-process LRU (L1) in front of the shared cache
+    'responses': {
+        'BACKEND': 'truthquest.cache.TieredCache',
+        'LOCATION': 'default',
+        'OPTIONS': {'MAX_ENTRIES': config('RESPONSE_CACHE_L1_ENTRIES', default=2000, cast=int),
+                    'L1_TIMEOUT': config('RESPONSE_CACHE_L1_TIMEOUT', default=5, cast=int)},
+    },
 }
+# The replica's read-your-writes pins live in the default cache, which every
+# worker must see: a pin set by one worker has to keep the user's next
+# request, on any worker, off the replica.
+if DATABASE_REPLICA and CACHE_BACKEND == 'locmem':
+    from django.core.exceptions import ImproperlyConfigured
+    raise ImproperlyConfigured('DATABASE_REPLICA needs a shared cache: set CACHE_BACKEND to file or memcached')
+# truthquest.cache.cache_response(): seconds a response stays fresh (0
+# disables the cache), may then be served stale while one request rebuilds
+# it, and a rebuild may hold its lock.
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE_TTL = config('RESPONSE_CACHE_TTL', default=60, cast=int)
+RESPONSE_CACHE_STALE = config('RESPONSE_CACHE_STALE', default=30, cast=int)
+# Per-user entries (a player's progress, power-ups, session stats) are read
+# right after that player's own writes. Their invalidation must reach every
+# worker, so by default they are only cached when the L2 is file or memcached.
+RESPONSE_CACHE_PER_USER = config('RESPONSE_CACHE_PER_USER', default=CACHE_BACKEND != 'locmem', cast=bool)
+RESPONSE_CACHE_LOCK_TIMEOUT = 5
+
+# Seconds the async read endpoints (game/async_views.py) cache story content
+# payloads and the top scores.
+ASYNC_CONTENT_CACHE_TTL = config('ASYNC_CONTENT_CACHE_TTL', default=60, cast=int)
+TOP_SCORES_CACHE_TTL = config('TOP_SCORES_CACHE_TTL', default=5, cast=int)
+
+# Seconds an invite link's inviter score is cached, so a link shared with a
+# whole class is read from the database about once per this many seconds
+INVITE_SCORE_CACHE_TTL = config('INVITE_SCORE_CACHE_TTL', default=30, cast=int)
+# Most invites one challenge (game/invites.py) may create at once
+CHALLENGE_MAX_INVITES = config('CHALLENGE_MAX_INVITES', default=5000, cast=int)
+
+# Answer analytics (game/analytics.py): each worker adds answers up in memory
+# and writes them as batched F() increments every ANALYTICS_FLUSH_INTERVAL
+# seconds or ANALYTICS_FLUSH_SIZE answers, whichever comes first (0 writes
+# every answer at once). A killed worker loses at most one batch. The report
+# is cached for ANALYTICS_REPORT_TTL seconds.
+ANALYTICS_FLUSH_INTERVAL = config('ANALYTICS_FLUSH_INTERVAL', default=5.0, cast=float)
+ANALYTICS_FLUSH_SIZE = config('ANALYTICS_FLUSH_SIZE', default=500, cast=int)
+ANALYTICS_REPORT_TTL = config('ANALYTICS_REPORT_TTL', default=60, cast=int)
+
+# Player data exports (game/exports.py) read and stream EXPORT_CHUNK_SIZE
+# rows per query, which bounds their memory use however many rows there are
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# CachedJWTAuthentication keeps user records in process memory for a few
+# seconds and in the shared cache for up to a minute (invalidated on save).
+AUTH_USER_LOCAL_CACHE_TTL = 5
+AUTH_USER_CACHE_TTL = 60
 
 # JWT settings
 from datetime import timedelta
@@ -199,5 +378,26 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
 }
 
+# Outgoing SMS providers used by accounts.messaging. Each provider keeps its
+# own pooled HTTP session and rate limit per worker process.
+SMS_DEFAULT_GATEWAY = 'kirusa'
+SMS_GATEWAYS = {
+    'kirusa': {
+        'URL': config('SMS_GATEWAY_URL', default='https://konnect.kirusa.com/api/v1/Accounts/GW55n_YxMLKmuwJLWEigyA==/Messages'),
+        'AUTH_TOKEN': config('SMS_GATEWAY_AUTH_TOKEN', default=''),
+        'SENDER_MASK': config('SMS_SENDER_MASK', default='GHFootball'),
+        'BATCH_SIZE': 100,
+        'RATE_LIMIT': 10,
+        'TIMEOUT': 10,
+        'MAX_RETRIES': 3,
+        'BACKOFF': 0.5,
+    },
+}
+
+DEFAULT_FROM_EMAIL = 'info@penplusbytes.org'
+WEBSITE_BASE_URL = config('WEBSITE_BASE_URL', default='http://localhost:3000')
+EMAIL_BATCH_SIZE = 100
+EMAIL_RATE_LIMIT = 0  # SMTP sends per second per worker; 0 means unlimited
+
 CORS_ORIGIN_ALLOW_ALL = True
 CORS_ALLOW_CREDENTIALS = True
@@ -0,0 +1,133 @@
+"""
+Single-writer queue for SQLite.
+
+SQLite allows one writer at a time, so under load request threads mostly
+wait on each other's write locks, and every transaction pays for its own
+commit. With ``settings.SQLITE_WRITE_QUEUE`` on, ``run_write()`` hands the
+write to one writer thread per process instead. The writer takes whatever
+writes are waiting (up to ``SQLITE_WRITE_BATCH``), runs each in its own
+savepoint inside one transaction and commits them together (group commit).
+A caller gets its result or exception only after the commit, so a response
+never reports a write that could still be rolled back.
+
+Writes run on the writer's connection: pass them only what they need
+(ids, model instances, plain values), not querysets evaluated lazily on the
+request's connection.
+"""
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteQueue:
+    def __init__(self, using=DEFAULT_DB_ALIAS, max_batch=64):
+        self.using = using
+        self.max_batch = max_batch
+        self.jobs = queue.SimpleQueue()
+        self.transactions = 0
+        self.writes = 0
+        self.thread = threading.Thread(target=self._run, name=f'sqlite-writer-{using}', daemon=True)
+        self.thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        """Run ``func(*args, **kwargs)`` on the writer thread and return its result once committed."""
+        if threading.current_thread() is self.thread:
+            return func(*args, **kwargs)
+        future = Future()
+        self.jobs.put((future, func, args, kwargs))
+        return future.result()
+
+    def close(self):
+        self.jobs.put(_STOP)
+        self.thread.join()
+
+    def _run(self):
+        try:
+            while True:
+                job = self.jobs.get()
+                if job is _STOP:
+                    return
+                batch = [job]
+                while len(batch) < self.max_batch:
+                    try:
+                        job = self.jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is _STOP:
+                        self.jobs.put(_STOP)
+                        break
+                    batch.append(job)
+                self._commit(batch)
+        finally:
+            connections[self.using].close()
+
+    def _commit(self, batch):
+        outcomes = []
+        try:
+            with transaction.atomic(using=self.using):
+                for future, func, args, kwargs in batch:
+                    try:
+                        # A failing write rolls back to its savepoint; the rest of the batch still commits
+                        with transaction.atomic(using=self.using):
+                            outcomes.append((future, func(*args, **kwargs), None))
+                    except Exception as exc:
+                        outcomes.append((future, None, exc))
+        except Exception as exc:
+            # The commit failed, so none of the batch was saved
+            logger.exception('Group commit of %d writes failed', len(batch))
+            connections[self.using].close_if_unusable_or_obsolete()
+            for future, *_ in batch:
+                future.set_exception(exc)
+            return
+        self.transactions += 1
+        self.writes += len(batch)
+        for future, result, exc in outcomes:
+            if exc is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exc)
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_write_queue(using=DEFAULT_DB_ALIAS):
+    """This process's writer for ``using``. Keyed by pid as well so forked workers start their own thread."""
+    key = (os.getpid(), using)
+    write_queue = _queues.get(key)
+    if write_queue is None:
+        with _queues_lock:
+            write_queue = _queues.get(key)
+            if write_queue is None:
+                write_queue = _queues[key] = WriteQueue(using, settings.SQLITE_WRITE_BATCH)
+    return write_queue
+
+
+def close_write_queues():
+    """Stop this process's writer threads, e.g. before switching databases."""
+    with _queues_lock:
+        for key in [key for key in _queues if key[0] == os.getpid()]:
+            _queues.pop(key).close()
+
+
+def run_write(func, *args, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Run the write ``func(*args, **kwargs)`` in a transaction and return its
+    result: on the writer thread when the queue is enabled, otherwise inline.
+    Inside an enclosing atomic block it always runs inline, as part of that
+    transaction (a writer waiting on a lock the caller holds would deadlock).
+    """
+    if settings.SQLITE_WRITE_QUEUE and not connections[using].in_atomic_block:
+        return get_write_queue(using).submit(func, *args, **kwargs)
+    with transaction.atomic(using=using):
+        return func(*args, **kwargs)
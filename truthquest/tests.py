@@ -0,0 +1,468 @@
+import datetime
+import decimal
+import gzip
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from .cache import LRU, MISSING
+from .compression import CompressionMiddleware, accepted_encodings, encoded_response, precompress
+from .importtime import profile
+from .local_storage import ContentAddressedStorage
+from .metrics import MmapStore, collect, observe
+from .renderers import ORJSONParser, ORJSONRenderer
+from .replica import ReplicaRouter, should_use_replica, sync_replica
+from .sqlite import WriteQueue, run_write
+from accounts.models import User
+from game.models import Story
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import RefreshToken
+from .views import serve_media
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.root, base_url='/media/')
+
+    def test_names_files_by_content_hash(self):
+        name = self.storage.save('level_images/Cover.WEBP', ContentFile(b'image bytes'))
+        digest = self.storage.content_digest(ContentFile(b'image bytes'))
+        self.assertEqual(name, f'level_images/{digest[:2]}/{digest}.webp')
+        self.assertEqual(self.storage.url(name), f'/media/{name}')
+
+    def test_identical_uploads_are_deduplicated(self):
+        first = self.storage.save('animations/mp4/a.mp4', ContentFile(b'same'))
+        second = self.storage.save('animations/mp4/b.mp4', ContentFile(b'same'))
+        third = self.storage.save('animations/mp4/a.mp4', ContentFile(b'different'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+
+
+class ServeMediaTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.override = override_settings(
+            MEDIA_ROOT=self.root,
+            STORAGES={
+                'default': {'BACKEND': 'truthquest.local_storage.ContentAddressedStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            },
+        )
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+        from django.core.files.storage import default_storage
+        self.name = default_storage.save('game_music/theme.mp3', ContentFile(b'0123456789'))
+        self.factory = RequestFactory()
+
+    def get(self, **headers):
+        return serve_media(self.factory.get('/media/' + self.name, headers=headers), self.name)
+
+    def test_full_response_is_immutable(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_range_request(self):
+        response = self.get(Range='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Content-Length'], '4')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+
+    def test_suffix_and_open_ended_ranges(self):
+        self.assertEqual(b''.join(self.get(Range='bytes=-3').streaming_content), b'789')
+        self.assertEqual(b''.join(self.get(Range='bytes=7-').streaming_content), b'789')
+
+    def test_unsatisfiable_range(self):
+        response = self.get(Range='bytes=20-30')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_missing_file_and_traversal_are_404(self):
+        from django.http import Http404
+        request = self.factory.get('/media/missing.mp3')
+        with self.assertRaises(Http404):
+            serve_media(request, 'missing.mp3')
+        with self.assertRaises(Http404):
+            serve_media(request, '../../etc/passwd')
+
+    def test_if_none_match_returns_304(self):
+        etag = self.get()['ETag']
+        response = self.get(If_None_Match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_if_range_resumes_only_unchanged_file(self):
+        etag = self.get()['ETag']
+        resumed = self.get(Range='bytes=4-', If_Range=etag)
+        self.assertEqual(resumed.status_code, 206)
+        self.assertEqual(b''.join(resumed.streaming_content), b'456789')
+        stale = self.get(Range='bytes=4-', If_Range='"0-0"')
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(b''.join(stale.streaming_content), b'0123456789')
+
+    def test_range_file_exposes_fileno_for_sendfile(self):
+        response = self.get(Range='bytes=3-4')
+        self.assertEqual(response.file_to_stream.fileno(), response.file_to_stream.file.fileno())
+        self.assertEqual(response.file_to_stream.file.tell(), 3)
+        response.close()
+
+    def test_x_accel_redirect_offload(self):
+        with self.settings(MEDIA_SENDFILE_HEADER='X-Accel-Redirect', MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/'):
+            response = self.get(Range='bytes=0-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.name)
+        self.assertEqual(response.content, b'')
+        self.assertIn('immutable', response['Cache-Control'])
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        overrides = override_settings(METRICS_DIR=self.directory, METRICS_TOKEN='', METRICS_ALLOWED_IPS=['127.0.0.1'])
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        caches['responses'].clear()
+
+    def test_records_per_view_metrics(self):
+        self.client.get('/api/game/stories/')
+        self.client.get('/api/game/stories/')
+        self.client.get('/api/game/no-such-endpoint/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        lines = response.content.decode().splitlines()
+        self.assertIn('http_requests_total{view="story-list",method="GET",status="200"} 2.0', lines)
+        self.assertIn('http_requests_total{view="<unresolved>",method="GET",status="404"} 1.0', lines)
+        self.assertIn('http_request_duration_seconds_bucket{view="story-list",method="GET",le="+Inf"} 2.0', lines)
+        self.assertIn('http_request_duration_seconds_count{view="story-list",method="GET"} 2.0', lines)
+        # The second request is served by the response cache
+        self.assertIn('http_request_db_queries_total{view="story-list",method="GET"} 1.0', lines)
+        self.assertIn('response_cache_requests_total{view="story-list",result="miss"} 1.0', lines)
+        self.assertIn('response_cache_requests_total{view="story-list",result="l1_hit"} 1.0', lines)
+        self.assertIn('http_response_bytes_total{view="story-list",method="GET"} 4.0', lines)
+        # The scrape itself is not recorded.
+        self.assertFalse([line for line in lines if 'view="metrics"' in line])
+
+    def test_aggregates_across_processes(self):
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=observe, args=('story-list', 'GET', 200, 0.02, 3, 0.001, 100))
+                   for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        observe('story-list', 'GET', 200, 0.02, 3, 0.001, 100)
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+        totals = collect()
+        self.assertEqual(totals['http_requests_total\tstory-list\tGET\t200'], 4)
+        self.assertEqual(totals['http_request_db_queries_total\tstory-list\tGET'], 12)
+
+    def test_store_grows_and_reopens(self):
+        path = os.path.join(self.directory, 'metrics-test.db')
+        store = MmapStore(path)
+        store.inc_many((f'key{i}', i) for i in range(5000))
+        store.inc_many([('key7', 1)])
+        store.close()
+        reopened = MmapStore(path)
+        reopened.inc_many([('key7', 1)])
+        totals = collect()
+        self.assertEqual(totals['key4999'], 4999)
+        self.assertEqual(totals['key7'], 9)
+        reopened.close()
+
+    @override_settings(METRICS_TOKEN='secret', METRICS_ALLOWED_IPS=[])
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    @override_settings(METRICS_ALLOWED_IPS=[])
+    def test_private_by_default(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.5']):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 200)
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.6').status_code, 403)
+
+
+class WriteQueueTests(TransactionTestCase):
+    def setUp(self):
+        self.queue = WriteQueue(max_batch=16)
+        self.addCleanup(self.queue.close)
+
+    def create(self, name):
+        return Story.objects.create(title=name, description='x').pk
+
+    def test_concurrent_writes_are_group_committed(self):
+        # Hold the writer until all the other writes are queued behind it
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait()
+
+        with ThreadPoolExecutor(8) as pool:
+            first = pool.submit(self.queue.submit, block)
+            started.wait()
+            futures = [pool.submit(self.queue.submit, self.create, f'Story {i}') for i in range(7)]
+            while self.queue.jobs.qsize() < 7:
+                threading.Event().wait(0.001)
+            release.set()
+            first.result()
+            ids = [future.result() for future in futures]
+        self.assertEqual(Story.objects.filter(pk__in=ids).count(), 7)
+        self.assertEqual(self.queue.writes, 8)
+        self.assertEqual(self.queue.transactions, 2)
+
+    def test_failed_write_does_not_affect_the_batch(self):
+        def fail():
+            Story.objects.create(title='lost', description='x')
+            raise IntegrityError('boom')
+
+        with ThreadPoolExecutor(2) as pool:
+            failed = pool.submit(self.queue.submit, fail)
+            created = pool.submit(self.queue.submit, self.create, 'kept')
+            with self.assertRaises(IntegrityError):
+                failed.result()
+            created.result()
+        self.assertEqual(list(Story.objects.values_list('title', flat=True)), ['kept'])
+
+    @override_settings(SQLITE_WRITE_QUEUE=True)
+    def test_run_write_inside_atomic_runs_inline(self):
+        with transaction.atomic():
+            run_write(self.create, 'inline')
+            self.assertTrue(connection.in_atomic_block)
+        self.assertTrue(Story.objects.filter(title='inline').exists())
+
+
+@override_settings(REPLICA_DATABASE='default')
+class ReplicaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.story = Story.objects.create(title='Truth Quest', description='x')
+        cls.user = User.objects.create_user(username='ama', email='ama@example.com', password=None)
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        synced_at = mock.patch('truthquest.replica.replica_synced_at', return_value=time.time() - 60)
+        self.synced_at = synced_at.start()
+        self.addCleanup(synced_at.stop)
+
+    def routed_reads(self, method, path, **kwargs):
+        # The read aliases the router picked while handling the request
+        seen = []
+        real = ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            seen.append(real(router, model, **hints))
+            return seen[-1]
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', record):
+            response = getattr(self.client, method)(path, **kwargs)
+        return response, set(seen)
+
+    def test_content_reads_use_replica(self):
+        response, aliases = self.routed_reads('get', f'/api/game/stories/{self.story.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(aliases, {'default'})
+        # Other endpoints are not routed
+        _, aliases = self.routed_reads('get', f'/api/game/user-progress/get-progress/?story_id={self.story.pk}',
+                                       **self.auth)
+        self.assertNotIn('default', aliases)
+
+    def test_writer_is_pinned_until_next_snapshot(self):
+        response = self.client.post('/api/game/user-progress/save-progress/', {'story_id': self.story.pk},
+                                    content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(should_use_replica(self.user))
+        _, aliases = self.routed_reads('get', f'/api/game/stories/{self.story.pk}/', **self.auth)
+        self.assertEqual(aliases, {None})
+        # A snapshot taken after the write serves the user again
+        self.synced_at.return_value = time.time() + 1
+        self.assertTrue(should_use_replica(self.user))
+
+    def test_no_snapshot_no_replica(self):
+        self.synced_at.return_value = None
+        self.assertFalse(should_use_replica(self.user))
+        with override_settings(REPLICA_DATABASE=None):
+            self.assertFalse(should_use_replica(None))
+
+    def test_sync_replica_snapshots_primary(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        primary, replica = os.path.join(directory, 'primary.db'), os.path.join(directory, 'replica.db')
+        db = sqlite3.connect(primary)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('CREATE TABLE t (x)')
+        db.execute('INSERT INTO t VALUES (1)')
+        db.commit()
+        synced_at = sync_replica(primary, f'file:{replica}?mode=ro')
+        db.execute('INSERT INTO t VALUES (2)')
+        db.commit()
+        db.close()
+
+        copy = sqlite3.connect(f'file:{replica}?mode=ro', uri=True)
+        self.assertEqual(copy.execute('SELECT x FROM t').fetchall(), [(1,)])
+        self.assertEqual(copy.execute('PRAGMA journal_mode').fetchone(), ('delete',))
+        copy.close()
+        self.assertAlmostEqual(os.stat(replica).st_mtime, synced_at, places=3)
+        self.assertEqual(os.listdir(directory).count('replica.db'), 1)
+
+
+
+class ORJSONTests(SimpleTestCase):
+    def test_renders_like_drf(self):
+        data = {
+            'title': 'Truth\u2028Quest \u00e9', 'score': decimal.Decimal('12.5'), 'ids': (1, 2),
+            'at': datetime.datetime(2024, 5, 1, 9, 30, 0, 123456, tzinfo=datetime.timezone.utc),
+            'day': datetime.date(2024, 5, 1), 'nested': [{'ok': True, 'none': None}], 1: 'one',
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+        self.assertEqual(ORJSONRenderer().render({'a': 1}, renderer_context={'indent': 2}), b'{\n  "a": 1\n}')
+
+    def test_parses_json(self):
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(b'{"story_id": 1, "score": [1.5]}')),
+                         {'story_id': 1, 'score': [1.5]})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"story_id": '))
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionTests(SimpleTestCase):
+    body = b'{"scenarios": [%s]}' % b','.join(b'{"text": "spot the fake headline"}' for _ in range(20))
+
+    def process(self, response, accept='gzip, deflate, br'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_accepted_encodings(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip;q=0.5, identity, br;q=0')
+        self.assertEqual(accepted_encodings(request), ['gzip'])
+        self.assertEqual(accepted_encodings(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip;q=0')), [])
+        self.assertEqual(accepted_encodings(RequestFactory().get('/')), [])
+        self.assertIn('gzip', accepted_encodings(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='*')))
+
+    @mock.patch('truthquest.compression.brotli', None)
+    def test_compresses_large_responses(self):
+        response = self.process(HttpResponse(self.body, content_type='application/json'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_leaves_other_responses_alone(self):
+        for response, accept in [
+            (HttpResponse(self.body[:50], content_type='application/json'), 'gzip'),
+            (HttpResponse(self.body, content_type='image/png'), 'gzip'),
+            (HttpResponse(self.body, content_type='application/json'), ''),
+            (HttpResponse(self.body, content_type='application/json', headers={'Content-Encoding': 'br'}), 'gzip'),
+        ]:
+            with self.subTest(response=response, accept=accept):
+                content = response.content
+                self.assertEqual(self.process(response, accept).content, content)
+
+    @mock.patch('truthquest.compression.brotli', None)
+    def test_precompressed_variants(self):
+        variants = precompress(self.body)
+        self.assertEqual(set(variants), {'identity', 'gzip'})
+        self.assertEqual(precompress(b'{}'), {'identity': b'{}'})
+
+        response = self.process(encoded_response(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'), variants))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response.content, variants['gzip'])
+        response = encoded_response(RequestFactory().get('/'), variants)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, self.body)
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches['responses']
+        self.cache.clear()
+
+    def test_tiers(self):
+        self.cache.set('k', {'a': 1})
+        self.assertEqual(self.cache.get_with_tier('k'), ({'a': 1}, 'l1'))
+        # Another process only finds it in the shared cache, then keeps it locally
+        self.cache.l1.clear()
+        self.assertEqual(self.cache.get_with_tier('k'), ({'a': 1}, 'l2'))
+        self.assertEqual(self.cache.get_with_tier('k'), ({'a': 1}, 'l1'))
+        self.assertEqual(caches['default'].get('k'), {'a': 1})
+
+        # Values are copies, so callers can't change what the next one gets
+        self.cache.get('k')['a'] = 2
+        self.assertEqual(self.cache.get('k'), {'a': 1})
+        self.cache.delete('k')
+        self.assertEqual(self.cache.get_with_tier('k', 'gone'), ('gone', None))
+        self.assertTrue(self.cache.add('k', 1))
+        self.assertFalse(self.cache.add('k', 2))
+
+    def test_local_copies_expire(self):
+        self.cache.set('k', 1)
+        caches['default'].set('k', 2)  # changed by another worker
+        self.assertEqual(self.cache.get('k'), 1)
+        later = time.monotonic() + self.cache.l1_timeout + 1
+        with mock.patch('truthquest.cache.time.monotonic', return_value=later):
+            self.assertEqual(self.cache.get('k'), 2)
+
+    def test_lru_evicts_least_recently_used(self):
+        lru = LRU(2)
+        expires = time.monotonic() + 60
+        lru.set('a', 1, expires)
+        lru.set('b', 2, expires)
+        lru.get('a', time.monotonic())
+        lru.set('c', 3, expires)
+        self.assertEqual(lru.get('b', time.monotonic()), MISSING)
+        self.assertEqual(lru.get('a', time.monotonic()), 1)
+
+
+class StartupTests(SimpleTestCase):
+    def test_heavy_dependencies_not_imported(self):
+        # A web worker on S3 storage, without any AWS configuration, up to its first request
+        env = {key: value for key, value in os.environ.items() if not key.startswith('AWS_')}
+        env.update(DJANGO_SETTINGS_MODULE='truthquest.settings', STORAGE_BACKEND='s3')
+        loaded = subprocess.run([sys.executable, '-c', (
+            'import sys, truthquest.wsgi; from django.urls import get_resolver; get_resolver().url_patterns; '
+            "print(*[name for name in ('boto3', 'celery', 'kombu') if name in sys.modules])"
+        )], env=env, capture_output=True, text=True, check=True).stdout
+        self.assertEqual(loaded.strip(), '')
+
+    def test_replica_requires_shared_cache(self):
+        # Replica pins in a per-process cache would not reach the user's next worker
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'truthquest.settings', 'STORAGE_BACKEND': 'local',
+               'DATABASE_REPLICA': 'replica.sqlite3', 'CACHE_BACKEND': 'locmem'}
+        result = subprocess.run([sys.executable, '-c', 'import django; django.setup()'],
+                                env=env, capture_output=True, text=True)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('DATABASE_REPLICA needs a shared cache', result.stderr)
+        env['CACHE_BACKEND'] = 'file'
+        subprocess.run([sys.executable, '-c', 'import django; django.setup()'], env=env, check=True)
+
+    def test_profile(self):
+        costs = profile('settings')
+        self.assertIn('decouple', [cost.module for cost in costs])
+        self.assertTrue(all(cost.cumulative_us >= cost.self_us for cost in costs))
@@ -14,11 +14,21 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from .views import metrics, serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/accounts/', include('accounts.urls')),  # Include accounts app under /api/accounts/
     path('api/game/', include('game.urls')),         # Include game app URLs under /api/game/
-]
\ No newline at end of file
+    path('metrics', metrics, name='metrics'),        # Prometheus scrape endpoint
+]
+
+if settings.STORAGE_BACKEND == 'local':
+    # Media stored on local disk is served with immutable caching and Range support
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), serve_media, name='media'),
+    ]
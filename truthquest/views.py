@@ -0,0 +1,197 @@
+import hmac
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+from .metrics import render_metrics
+
+# Content-addressed names never change meaning, so browsers and proxies may
+# keep them for a year without revalidating.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """
+    Read-only view of ``length`` bytes of ``file`` starting at ``start``.
+
+    ``fileno()`` is passed through and the underlying file is left positioned
+    at ``start``, so a WSGI server's ``wsgi.file_wrapper`` (gunicorn, uWSGI)
+    can hand the slice to ``sendfile(2)`` using the response Content-Length
+    instead of copying it through Python.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Parse a single ``bytes=`` range against a file of ``size`` bytes.
+
+    Returns ``(start, end)`` inclusive, ``None`` when the header should be
+    ignored (absent, malformed or multi-range) and raises ValueError when the
+    range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0:
+            raise ValueError('Empty suffix range')
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or (last and end < start):
+        raise ValueError('Range not satisfiable')
+    return start, min(end, size - 1)
+
+
+def make_etag(stat):
+    return '"%x-%x"' % (stat.st_size, int(stat.st_mtime))
+
+
+def if_range_matches(header, etag, mtime):
+    """An If-Range validator is either a strong ETag or an HTTP date."""
+    if header.startswith('"'):
+        return header == etag
+    header_mtime = parse_http_date_safe(header)
+    return header_mtime is not None and header_mtime == int(mtime)
+
+
+def offload_response(name, full_path, content_type):
+    """
+    Hand the transfer to the front-end server (nginx X-Accel-Redirect,
+    Apache/lighttpd X-Sendfile). The server then does its own Range handling.
+    """
+    response = HttpResponse(content_type=content_type)
+    header = settings.MEDIA_SENDFILE_HEADER
+    if header == 'X-Accel-Redirect':
+        prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+        response[header] = prefix.rstrip('/') + '/' + name
+    else:
+        response[header] = full_path
+    # Let Django's length header go; the front-end computes the real one.
+    del response['Content-Length']
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve a file from local media storage with long-lived caching, conditional
+    requests and single-range support, so video and music can be seeked and
+    interrupted downloads resumed instead of restarted.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = default_storage.path(path)
+    except (NotImplementedError, SuspiciousFileOperation):
+        raise Http404('File not found')
+    try:
+        file = open(full_path, 'rb')
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        raise Http404('File not found')
+
+    stat = os.fstat(file.fileno())
+    size = stat.st_size
+    etag = make_etag(stat)
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2).
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        etags = parse_etags(if_none_match)
+        not_modified = etags == ['*'] or etag in (e.removeprefix('W/') for e in etags)
+    else:
+        not_modified = not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime)
+    if not_modified:
+        file.close()
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    if getattr(settings, 'MEDIA_SENDFILE_HEADER', ''):
+        file.close()
+        response = offload_response(path, full_path, content_type)
+    else:
+        range_header = request.META.get('HTTP_RANGE')
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if range_header and if_range and not if_range_matches(if_range, etag, stat.st_mtime):
+            # The client's partial copy is stale: send the whole file instead.
+            range_header = None
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            file.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            response['Accept-Ranges'] = 'bytes'
+            return response
+
+        if byte_range is None:
+            response = FileResponse(file, content_type=content_type)
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            response = FileResponse(RangeFile(file, start, length), content_type=content_type, status=206)
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def metrics(request):
+    """
+    Request metrics of all worker processes in the Prometheus text format,
+    for scrapers with METRICS_TOKEN or from METRICS_ALLOWED_IPS (anyone
+    under DEBUG when no token is set).
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        allowed = hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else:
+        allowed = settings.DEBUG
+    if not (allowed or request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')